@@ -1,12 +1,23 @@
 import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from .extensions import db, bcrypt, jwt, migrate, ma, mail, oauth, cors # <-- Import cors
+from .database import configure_database, init_database
+from .metrics import init_metrics
+from .profiling import init_profiling
+from .query_budget import init_query_budget
+from .rate_limit import init_rate_limit
+from .cli import register_cli
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    if app.config['PROXY_FIX_X_FOR']:
+        # Take the client IP (used for rate limits) from the trusted proxies' X-Forwarded-For
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
     # Ensure the instance folder exists
     try:
         os.makedirs(app.instance_path)
@@ -14,7 +25,10 @@ def create_app(config_class=Config):
         pass
 
     # Initialize extensions
+    # Engine options per database (SQLite pragmas, Postgres pool) and the read replica bind
+    configure_database(app)
     db.init_app(app)
+    init_database(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
@@ -44,6 +58,26 @@ def create_app(config_class=Config):
         }
     )
 
+    # Log shoe writes so per-worker catalog structures can follow them
+    from . import catalog  # noqa: F401
+    # Publish committed order status changes to the order status streams
+    from . import order_events  # noqa: F401
+
+    # Prometheus request latencies, pool usage and business counters at /metrics
+    init_metrics(app, db)
+
+    # Per-request phase timings as Server-Timing headers and JSON logs (opt-in)
+    init_profiling(app, db)
+
+    # Fail requests that exceed their view's SQL statement budget (tests only by default)
+    init_query_budget(app)
+
+    # Token-bucket limits on the auth, checkout, PayPal and newsletter endpoints
+    init_rate_limit(app)
+
+    # Maintenance commands (reservation sweeper, ...)
+    register_cli(app)
+
     # --- REGISTER BLUEPRINTS ---
     from .api.auth import auth_bp
     from .api.products import products_bp
@@ -1,13 +1,21 @@
 from flask import Blueprint, request, jsonify, redirect, url_for, current_app
 from app.models import User
-from app.extensions import db, bcrypt, oauth
+from app.extensions import db, oauth
 from app.schemas import UserSchema
 from flask_jwt_extended import create_access_token
 from sqlalchemy.exc import IntegrityError
+from app.passwords import HashingOverloaded, hash_password, verify_password
 
 auth_bp = Blueprint('auth_bp', __name__)
 user_schema = UserSchema()
 
+@auth_bp.errorhandler(HashingOverloaded)
+def hashing_overloaded(e):
+    response = jsonify({'error': 'The server is busy, please try again shortly'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Handles new user registration with email and password."""
@@ -18,7 +26,7 @@ def register():
     email = data.get('email')
     password = data.get('password')
 
-    hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed_password = hash_password(password)
     new_user = User(email=email, password=hashed_password)
 
     try:
@@ -46,7 +54,9 @@ def login():
     user = User.query.filter_by(email=email).first()
 
     # Check if user exists and has a password set (i.e., didn't sign up with Google)
-    if user and user.password and bcrypt.check_password_hash(user.password, password):
+    if user and verify_password(user, password):
+        # Saves the hash if verify_password upgraded it to the current cost
+        db.session.commit()
         access_token = create_access_token(identity=str(user.id))
         return jsonify(access_token=access_token)
     else:
@@ -2,11 +2,14 @@ from flask import Blueprint, request, jsonify
 from app.models import Cart, Shoe
 from app.extensions import db
 from app.schemas import CartItemSchema
+from app.serializers import compile_schema, json_response
+from app.loaders import cart_for_display
+from app.query_budget import query_budget
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 cart_bp = Blueprint('cart_bp', __name__)
-cart_item_schema = CartItemSchema()
-cart_items_schema = CartItemSchema(many=True)
+cart_item_schema = compile_schema(CartItemSchema())
+cart_items_schema = compile_schema(CartItemSchema(many=True))
 
 # This decorator ensures a valid JWT is required for all routes in this blueprint
 @cart_bp.before_request
@@ -15,10 +18,11 @@ def require_jwt():
     pass
 
 @cart_bp.route('/', methods=['GET'])
+@query_budget(1)
 def get_cart():
     user_id = get_jwt_identity() # Get user ID from the JWT token
-    cart_items = Cart.query.filter_by(user_id=user_id, paid=False).all()
-    return jsonify(cart_items_schema.dump(cart_items))
+    cart_items = Cart.query.options(cart_for_display()).filter_by(user_id=user_id, paid=False).all()
+    return json_response(cart_items_schema.dump(cart_items))
 
 @cart_bp.route('/', methods=['POST'])
 def add_to_cart():
@@ -35,7 +39,10 @@ def add_to_cart():
     shoe = Shoe.query.get(shoe_id)
     if not shoe:
         return jsonify({'error': 'Shoe not found'}), 404
-    if shoe.stock < quantity:
+    size_entry = shoe.size_entry(size)
+    if not size_entry:
+        return jsonify({'error': 'Size not available'}), 400
+    if size_entry.stock < quantity:
         return jsonify({'error': 'Not enough stock available'}), 400
 
     # Check if the same item (shoe + size) is already in the user's cart
@@ -61,7 +68,8 @@ def update_cart_item(cart_item_id):
     if not isinstance(quantity, int) or quantity < 1:
         return jsonify({'error': 'Invalid quantity'}), 400
     
-    if cart_item.shoe.stock < quantity:
+    size_entry = cart_item.shoe.size_entry(cart_item.size)
+    if not size_entry or size_entry.stock < quantity:
         return jsonify({'error': 'Not enough stock available'}), 400
 
     cart_item.quantity = quantity
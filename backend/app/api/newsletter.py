@@ -1,7 +1,9 @@
 import re
 from flask import Blueprint, request, jsonify, current_app
-from app.extensions import mail
-from flask_mail import Message
+from app.extensions import db
+from app.models import Subscriber
+from app.mailer import queue_email
+from sqlalchemy.exc import IntegrityError
 
 newsletter_bp = Blueprint('newsletter_bp', __name__)
 
@@ -13,30 +15,30 @@ def is_valid_email(email):
 @newsletter_bp.route('/subscribe', methods=['POST'])
 def subscribe():
     data = request.get_json()
-    email = data.get('email')
+    # One subscriber per address, however it was typed
+    email = (data.get('email') or '').strip().lower()
 
     if not email or not is_valid_email(email):
         return jsonify({'error': 'A valid email is required'}), 400
 
     try:
-        recipient_email = current_app.config.get('NEWSLETTER_RECIPIENT')
-        if not recipient_email:
-             # Log an error on the server
-            current_app.logger.error("NEWSLETTER_RECIPIENT is not configured.")
-            return jsonify({'error': 'Server configuration error'}), 500
+        db.session.add(Subscriber(email=email))
+        db.session.flush()
+    except IntegrityError:
+        # Already subscribed: same answer, no second notification
+        db.session.rollback()
+        return jsonify({'message': 'Subscribed successfully!'}), 200
 
-        msg = Message(
+    # Let the owner know; the mail worker sends it (see app/mailer.py)
+    recipient_email = current_app.config.get('NEWSLETTER_RECIPIENT')
+    if recipient_email:
+        queue_email(
             subject="New Newsletter Subscription!",
-            sender=current_app.config.get('MAIL_DEFAULT_SENDER'),
-            recipients=[recipient_email] # Send to the owner
+            recipients=[recipient_email],  # Send to the owner
+            body=f"The following email has subscribed to the newsletter:\n\n{email}",
         )
-        msg.body = f"The following email has subscribed to the newsletter:\n\n{email}"
-        
-        mail.send(msg)
-        
-        return jsonify({'message': 'Subscribed successfully!'}), 200
+    else:
+        current_app.logger.error("NEWSLETTER_RECIPIENT is not configured.")
+    db.session.commit()
 
-    except Exception as e:
-        # Log the actual error for debugging
-        current_app.logger.error(f"Failed to send subscription email: {e}")
-        return jsonify({'error': 'Failed to subscribe. Please try again later.'}), 500
\ No newline at end of file
+    return jsonify({'message': 'Subscribed successfully!'}), 200
@@ -1,17 +1,32 @@
 import os
 import re
-from flask import Blueprint, request, jsonify, Response
-from app.models import Cart, Shoe, Order, OrderItem, Payment
+import json
+import time
+from flask import Blueprint, request, jsonify, current_app, send_file, abort, stream_with_context
+from app.models import Cart, Order, OrderItem
 from app.extensions import db
 from app.schemas import OrderSchema
+from app.serializers import compile_schema, json_response
+from app.loaders import cart_for_display, cart_for_checkout, order_details
+from app.inventory import InsufficientStock, reserve_stock, release_reservations, commit_reservations
+from app.outbox import enqueue, outbox_handler, RetryLater
+from app.mpesa_callbacks import store_callback
+from app.receipts import ensure_receipt, receipt_cache_headers, queue_receipt
+from app.query_budget import query_budget
+from app.metrics import CHECKOUTS, MPESA_CALLBACKS, metrics_authorized
+from app.database import use_replica_for_reads, primary_only
+from app.order_events import get_order_events, get_stream_slots
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.mpesa_handler import MpesaHandler
-from fpdf import FPDF
-from datetime import datetime
+from app.pagination import PaginationError, parse_sort, keyset_page, count_total
+from sqlalchemy import insert, select, update
+import requests
 
 orders_bp = Blueprint('orders_bp', __name__)
-order_schema = OrderSchema()
-orders_schema = OrderSchema(many=True)
+# GETs read from the read replica when one is configured
+use_replica_for_reads(orders_bp)
+order_schema = compile_schema(OrderSchema())
+orders_schema = compile_schema(OrderSchema(many=True))
 mpesa = MpesaHandler()
 
 def normalize_phone_number(phone):
@@ -29,6 +44,7 @@ def normalize_phone_number(phone):
 
 @orders_bp.route('/checkout', methods=['POST'])
 @jwt_required()
+@query_budget(9)
 def checkout():
     user_id = get_jwt_identity()
     data = request.get_json()
@@ -39,18 +55,12 @@ def checkout():
     if not phone_number:
         return jsonify({'error': 'Invalid phone number. Use 07xx, 01xx, or 254xx format.'}), 400
 
-    # Retrieve all unpaid cart items for the user
-    cart_items = Cart.query.filter_by(user_id=user_id, paid=False).all()
+    # Retrieve all unpaid cart items for the user, with their shoes and size stock
+    cart_items = Cart.query.options(cart_for_checkout()).filter_by(user_id=user_id, paid=False).all()
     if not cart_items:
         return jsonify({'error': 'Your cart is empty'}), 400
 
-    total_amount = 0
-    # --- Check stock before proceeding ---
-    for item in cart_items:
-        if item.shoe.stock < item.quantity:
-            return jsonify({'error': f"Not enough stock for {item.shoe.name}. Available: {item.shoe.stock}"}), 400
-        total_amount += item.shoe.price * item.quantity
-
+    total_amount = sum(item.shoe.price * item.quantity for item in cart_items)
     new_order = Order(user_id=user_id, total_amount=total_amount, status='pending')
     
     # --- Use a transaction to ensure data integrity ---
@@ -58,178 +68,248 @@ def checkout():
         db.session.add(new_order)
         db.session.flush()  # Assigns an ID to new_order without committing
 
+        # Create all order items in a single INSERT
+        db.session.execute(insert(OrderItem), [
+            {'order_id': new_order.id, 'cart_id': item.id} for item in cart_items
+        ])
+
+        # Hold the stock for this order; released again if payment fails or expires
+        reserve_stock(new_order, cart_items)
+
         for item in cart_items:
-            # Create order item
-            order_item = OrderItem(order_id=new_order.id, cart_id=item.id)
-            db.session.add(order_item)
-            
-            # Reduce stock
-            shoe = Shoe.query.get(item.shoe_id)
-            shoe.stock -= item.quantity
-            
             # Mark cart item as paid
             item.paid = True
         
-        # Initiate M-Pesa STK Push
-        callback_url = os.getenv('CALLBACK_URL')
-        response = mpesa.initiate_stk_push(phone_number, int(total_amount), new_order.id, callback_url)
-
-        if response.get('ResponseCode') == '0':
-            new_order.checkout_request_id = response['CheckoutRequestID']
-            db.session.commit() # Commit all changes only if STK push is successful
-            return jsonify({
-                'message': 'Checkout process initiated. Please complete the payment on your phone.',
-                'order_id': new_order.id,
-                'CheckoutRequestID': response['CheckoutRequestID']
-            })
-        else:
-            db.session.rollback() # Rollback if STK push fails
-            return jsonify({'error': 'Failed to initiate M-Pesa payment', 'details': response.get('ResponseDescription', 'Unknown error')}), 500
+        # The STK push is sent by the outbox dispatcher once this commits, so the
+        # request doesn't wait on Safaricom (see send_stk_push below)
+        enqueue('mpesa_stk_push', {
+            'order_id': new_order.id,
+            'phone_number': phone_number,
+            'amount': int(total_amount),
+        })
 
+        order_id = new_order.id
+        db.session.commit()
+        CHECKOUTS.labels('mpesa', 'accepted').inc()
+        return jsonify({
+            'message': 'Checkout process initiated. Please complete the payment on your phone.',
+            'order_id': order_id,
+            'status': 'pending'
+        }), 202
+
+    except InsufficientStock as e:
+        db.session.rollback()
+        CHECKOUTS.labels('mpesa', 'insufficient_stock').inc()
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         db.session.rollback()
+        CHECKOUTS.labels('mpesa', 'error').inc()
         return jsonify({'error': 'An error occurred during checkout', 'details': str(e)}), 500
 
+def cancel_unpaid_order(payload, error):
+    """The STK push could not be sent: cancel the order and put its stock back."""
+    order = db.session.get(Order, payload['order_id'])
+    if isinstance(error, requests.RequestException):
+        # It may have reached Safaricom and prompted the customer, so the order
+        # stays pending until its reservation expires (see send_stk_push)
+        current_app.logger.warning(f"STK push for order {payload['order_id']} may have been sent: {error}")
+        return
+    if order is not None and order.status == 'pending':
+        order.status = 'cancelled'
+        release_reservations([order.id])
+
+@outbox_handler('mpesa_stk_push', on_failure=cancel_unpaid_order)
+def send_stk_push(payload):
+    """Sends the STK push for a checked-out order and stores its CheckoutRequestID."""
+    order = db.session.get(Order, payload['order_id'])
+    if order is None or order.status != 'pending' or order.checkout_request_id:
+        return  # Cancelled (e.g. expired) in the meantime, or already sent
+
+    try:
+        callback_url = os.getenv('CALLBACK_URL')
+        response = mpesa.initiate_stk_push(payload['phone_number'], payload['amount'], order.id, callback_url)
+    except requests.RequestException as e:
+        if never_sent(e):
+            raise RetryLater(str(e))
+        # Anything else (a read timeout, a connection dropped after the POST)
+        # may have prompted the customer, so it is neither repeated nor
+        # cancelled: the order stays pending and the sweeper releases the
+        # stock if it's never paid
+        raise
+
+    if response.get('ResponseCode') != '0':
+        raise RuntimeError(f"STK push rejected: {response.get('ResponseDescription', 'Unknown error')}")
+    order.checkout_request_id = response['CheckoutRequestID']
+
 @orders_bp.route('/callback', methods=['POST'])
+@query_budget(3)
 def mpesa_callback():
-    data = request.get_json()
-    # Add logging in a real app: current_app.logger.info(f"Callback received: {data}")
-    
-    try:
-        stk_callback = data['Body']['stkCallback']
-        result_code = stk_callback['ResultCode']
-        checkout_request_id = stk_callback['CheckoutRequestID']
-        order = Order.query.filter_by(checkout_request_id=checkout_request_id).first()
-
-        if not order:
-            return jsonify({'error': 'Order not found'}), 404
-
-        if result_code == 0:
-            # Payment was successful
-            metadata = stk_callback['CallbackMetadata']['Item']
-            mpesa_code = next((item['Value'] for item in metadata if item['Name'] == 'MpesaReceiptNumber'), None)
-            amount = float(next((item['Value'] for item in metadata if item['Name'] == 'Amount'), 0))
-            phone = str(next((item['Value'] for item in metadata if item['Name'] == 'PhoneNumber'), ''))
-            tx_date_str = str(next((item['Value'] for item in metadata if item['Name'] == 'TransactionDate')), '')
-            tx_date = datetime.strptime(tx_date_str, '%Y%m%d%H%M%S')
-
-            new_payment = Payment(
-                order_id=order.id,
-                mpesa_code=str(mpesa_code),
-                amount=amount,
-                phone_number=phone,
-                transaction_date=tx_date
-            )
-            order.status = 'completed'
-            db.session.add(new_payment)
-        else:
-            # Payment failed or was cancelled, revert stock
-            order.status = 'cancelled'
-            for item in order.items:
-                shoe = item.cart.shoe
-                shoe.stock += item.cart.quantity
+    # Store and acknowledge only; the outbox dispatcher applies it to the order
+    # (see app/mpesa_callbacks.py). Duplicate deliveries are acknowledged too.
+    stored = store_callback(request.get_data(as_text=True))
+    MPESA_CALLBACKS.labels('received' if stored is not None else 'duplicate').inc()
+    return jsonify({'ResultCode': 0, 'ResultDesc': 'Accepted'}), 200
 
-        db.session.commit()
-        return jsonify({'message': 'Callback received successfully'}), 200
+ORDER_SORT_KEYS = {'created_at': Order.created_at, 'id': Order.id}
 
-    except Exception as e:
-        # Add logging: current_app.logger.error(f"Callback processing failed: {e}")
-        return jsonify({'error': 'Callback processing failed', 'details': str(e)}), 500
+@orders_bp.errorhandler(PaginationError)
+def handle_pagination_error(e):
+    return jsonify({'error': str(e)}), 400
 
 @orders_bp.route('/', methods=['GET'])
 @jwt_required()
+@query_budget(4)
 def get_orders():
     user_id = get_jwt_identity()
-    orders = Order.query.filter_by(user_id=user_id).order_by(Order.created_at.desc()).all()
-    return jsonify(orders_schema.dump(orders))
+    query = Order.query.options(*order_details()).filter_by(user_id=user_id)
+
+    # Keyset pagination when a `cursor` parameter is given (empty for the first page)
+    if 'cursor' in request.args:
+        sort, sort_column, descending = parse_sort(request.args.get('sort', type=str), ORDER_SORT_KEYS, '-created_at')
+        orders, next_cursor = keyset_page(
+            query, Order.id, sort_column, descending, sort,
+            cursor=request.args.get('cursor'), limit=request.args.get('per_page', 10, type=int)
+        )
+        result = {'orders': orders_schema.dump(orders), 'next_cursor': next_cursor}
+        total, exact = count_total(query, Order.id, request.args.get('total', 'none'),
+                                   cap=current_app.config['APPROX_COUNT_CAP'])
+        if total is not None:
+            result['total'] = total
+            result['total_exact'] = exact
+        return json_response(result)
+
+    orders = query.order_by(Order.created_at.desc()).all()
+    return json_response(orders_schema.dump(orders))
 
 @orders_bp.route('/<int:order_id>', methods=['GET'])
 @jwt_required()
+@query_budget(3)
+@primary_only  # Polled right after checkout creates the order
 def get_order_status(order_id):
     user_id = get_jwt_identity()
-    order = Order.query.filter_by(id=order_id, user_id=user_id).first_or_404()
-    return jsonify(order_schema.dump(order))
+    order = Order.query.options(*order_details()).filter_by(id=order_id, user_id=user_id).first_or_404()
+    return json_response(order_schema.dump(order))
 
 
-# --- PDF RECEIPT GENERATION ---
+# --- ORDER STATUS STREAM ---
 
-class PDF(FPDF):
-    def header(self):
-        self.set_font('helvetica', 'B', 16)
-        self.cell(0, 10, 'Shoe Haven Receipt', 0, 1, 'C')
-        self.ln(10)
+FINAL_STATUSES = {'completed', 'cancelled'}
 
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('helvetica', 'I', 8)
-        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+def _status_event(order_id, status):
+    return f"event: status\ndata: {json.dumps({'id': order_id, 'status': status})}\n\n"
 
-def generate_receipt_pdf(order):
-    pdf = PDF()
-    pdf.add_page()
-    pdf.set_font('helvetica', '', 12)
-    
-    # Order Details
-    pdf.cell(0, 8, f"Order ID: {order.id}", 0, 1)
-    pdf.cell(0, 8, f"Order Date: {order.created_at.strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
-    if order.payment:
-        pdf.cell(0, 8, f"Paid Via: M-Pesa ({order.payment.phone_number})", 0, 1)
-        pdf.cell(0, 8, f"M-Pesa Code: {order.payment.mpesa_code}", 0, 1)
-    pdf.ln(10)
-
-    # Table Header
-    pdf.set_font('helvetica', 'B', 12)
-    pdf.cell(100, 10, 'Item', 1, 0, 'C')
-    pdf.cell(20, 10, 'Size', 1, 0, 'C')
-    pdf.cell(20, 10, 'Qty', 1, 0, 'C')
-    pdf.cell(30, 10, 'Price', 1, 1, 'C')
-    pdf.set_font('helvetica', '', 12)
-
-    # Table Rows
-    for item in order.items:
-        pdf.cell(100, 10, item.cart.shoe.name, 1)
-        pdf.cell(20, 10, str(item.cart.size), 1, 0, 'C')
-        pdf.cell(20, 10, str(item.cart.quantity), 1, 0, 'C')
-        pdf.cell(30, 10, f"KES {item.cart.shoe.price * item.cart.quantity}", 1, 1, 'R')
-    
-    # Total
-    pdf.set_font('helvetica', 'B', 12)
-    pdf.cell(140, 10, 'Total', 1, 0, 'R')
-    pdf.cell(30, 10, f"KES {order.total_amount}", 1, 1, 'R')
-    
-    return pdf.output(dest='S').encode('latin-1')
+@orders_bp.route('/<int:order_id>/events', methods=['GET'])
+@jwt_required()
+@query_budget(1)
+@primary_only  # Opened right after checkout; a lagging replica would 404 or replay 'pending'
+def order_status_events(order_id):
+    """
+    Server-Sent Events stream of an order's status: the current status first,
+    then every change, ending once the order is completed or cancelled (or
+    after ORDER_EVENTS_STREAM_SECONDS; clients reconnect). Waits on the order
+    status broker instead of the database; see app/order_events.py. Answers
+    503 when this worker already has ORDER_EVENTS_MAX_STREAMS streams open.
+    """
+    user_id = get_jwt_identity()
+    status_query = select(Order.status).where(Order.id == order_id, Order.user_id == user_id)
+    config = current_app.config
+    # Each stream holds a server thread; past ORDER_EVENTS_MAX_STREAMS the client fetches the order instead
+    slots = get_stream_slots()
+    if not slots.acquire(blocking=False):
+        retry_after = int(config['ORDER_EVENTS_RECHECK_SECONDS'])
+        response = jsonify({'error': 'Too many open status streams', 'retry_after': retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 503
+    # Subscribe before reading the status so a change in between isn't missed
+    subscription = get_order_events().subscribe(order_id)
+    status = db.session.execute(status_query).scalar()
+    # Don't hold a pooled connection for the life of the stream
+    db.session.close()
+    if status is None:
+        subscription.close()
+        slots.release()
+        abort(404)
+
+    @stream_with_context
+    def stream():
+        with subscription:
+            yield f"retry: {int(config['ORDER_EVENTS_RECHECK_SECONDS'] * 1000)}\n"
+            yield _status_event(order_id, status)
+            current = status
+            deadline = time.monotonic() + config['ORDER_EVENTS_STREAM_SECONDS']
+            while current not in FINAL_STATUSES and time.monotonic() < deadline:
+                update = subscription.get(timeout=config['ORDER_EVENTS_RECHECK_SECONDS'])
+                if update is None:
+                    # Safety net for a notification that was lost or not shared across processes
+                    update = db.session.execute(status_query).scalar()
+                    db.session.close()
+                if update != current:
+                    current = update
+                    yield _status_event(order_id, current)
+                else:
+                    yield ": keep-alive\n\n"
+
+    response = current_app.response_class(stream(), mimetype='text/event-stream')
+    # Runs however the stream ends, even if the client goes away before it starts
+    response.call_on_close(slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# --- PDF RECEIPTS ---
 
 @orders_bp.route('/<int:order_id>/receipt', methods=['GET'])
 @jwt_required()
+@query_budget(5)
+@primary_only  # Records the receipt hash, and is fetched right after payment
 def download_receipt(order_id):
     user_id = get_jwt_identity()
     order = Order.query.filter_by(id=order_id, user_id=user_id).first()
 
     if not order:
         return jsonify({'error': 'Order not found'}), 404
-    if order.status != 'completed' or not order.payment:
+    if order.status != 'completed':
         return jsonify({'error': 'Receipt is only available for completed payments'}), 400
 
-    pdf_data = generate_receipt_pdf(order)
+    # Stored receipts are immutable, so a cached copy is always current
+    if order.receipt_sha256 and request.if_none_match.contains(order.receipt_sha256):
+        return receipt_cache_headers(current_app.response_class(status=304))
 
-    return Response(
-        pdf_data,
+    path = ensure_receipt(order)  # Renders it now if it was never stored or has gone missing
+    sha256 = order.receipt_sha256
+    db.session.commit()
+    response = send_file(
+        path,
         mimetype='application/pdf',
-        headers={'Content-Disposition': f'attachment;filename=receipt_order_{order.id}.pdf'}
+        as_attachment=True,
+        download_name=f'receipt_order_{order_id}.pdf',
+        etag=sha256,
+        conditional=True,
     )
+    return receipt_cache_headers(response)
 
 # ... (at the top with other imports)
-from app.paypal_service import PayPalService
+from app.paypal_service import get_paypal_service
+from app.http_clients import CircuitOpenError, never_sent
 
 # ... (inside the file, after the checkout function)
 
 # --- NEW PAYPAL ROUTES ---
 
+def paypal_unavailable(e):
+    """Fast failure while the PayPal circuit is open."""
+    response = jsonify({'error': 'PayPal is temporarily unavailable. Please try again shortly.'})
+    response.headers['Retry-After'] = str(int(e.retry_after))
+    return response, 503
+
 @orders_bp.route('/paypal/create', methods=['POST'])
 @jwt_required()
+@query_budget(1)
 def create_paypal_order():
     user_id = get_jwt_identity()
-    cart_items = Cart.query.filter_by(user_id=user_id, paid=False).all()
+    cart_items = Cart.query.options(cart_for_display()).filter_by(user_id=user_id, paid=False).all()
     if not cart_items:
         return jsonify({'error': 'Your cart is empty'}), 400
 
@@ -238,54 +318,179 @@ def create_paypal_order():
     total_amount = sum(item.shoe.price * item.quantity for item in cart_items)
 
     try:
-        paypal = PayPalService()
-        paypal_order = paypal.create_order(round(total_amount, 2))
+        paypal_order = get_paypal_service().create_order(round(total_amount, 2))
         return jsonify({'orderID': paypal_order['id']})
+    except CircuitOpenError as e:
+        return paypal_unavailable(e)
     except Exception as e:
         return jsonify({'error': 'Failed to create PayPal order', 'details': str(e)}), 500
 
 
 @orders_bp.route('/paypal/<paypal_order_id>/capture', methods=['POST'])
 @jwt_required()
+@query_budget(16)
 def capture_paypal_payment(paypal_order_id):
     user_id = get_jwt_identity()
-    
-    try:
-        paypal = PayPalService()
-        capture_data = paypal.capture_payment(paypal_order_id)
 
-        # Security Check: Ensure payment is 'COMPLETED'
-        if capture_data.get('status') != 'COMPLETED':
-            return jsonify({'error': 'Payment not completed by PayPal'}), 400
-
-        # If payment is successful, finalize the order in our database
-        cart_items = Cart.query.filter_by(user_id=user_id, paid=False).all()
+    # Hold the stock first, so we never charge for shoes we can't ship. The hold
+    # is committed before calling PayPal: no rows stay locked during the call.
+    try:
+        cart_items = Cart.query.options(cart_for_checkout()).filter_by(user_id=user_id, paid=False).all()
+        if not cart_items:
+            return jsonify({'error': 'Your cart is empty'}), 400
         total_amount = sum(item.shoe.price * item.quantity for item in cart_items)
 
         new_order = Order(
             user_id=user_id, 
             total_amount=total_amount, 
-            status='completed', 
+            status='pending', 
             paypal_order_id=paypal_order_id
         )
         
         db.session.add(new_order)
         db.session.flush()
 
+        db.session.execute(insert(OrderItem), [
+            {'order_id': new_order.id, 'cart_id': item.id} for item in cart_items
+        ])
+        reserve_stock(new_order, cart_items)
+
         for item in cart_items:
-            order_item = OrderItem(order_id=new_order.id, cart_id=item.id)
-            db.session.add(order_item)
-            item.shoe.stock -= item.quantity
             item.paid = True
-        
-        # We don't need a separate Payment model entry for this, as the order itself is the record.
-        
+
+        order_id = new_order.id
         db.session.commit()
-        return jsonify({
-            'message': 'Payment successful!', 
-            'order_id': new_order.id
-        })
+    except InsufficientStock as e:
+        db.session.rollback()
+        CHECKOUTS.labels('paypal', 'insufficient_stock').inc()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        CHECKOUTS.labels('paypal', 'error').inc()
+        return jsonify({'error': 'Failed to capture payment', 'details': str(e)}), 500
 
+    try:
+        capture_data = get_paypal_service().capture_payment(paypal_order_id)
+    except CircuitOpenError as e:
+        cancel_paypal_order(order_id)
+        db.session.commit()
+        CHECKOUTS.labels('paypal', 'unavailable').inc()
+        return paypal_unavailable(e)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code >= 500:
+            return confirm_paypal_capture_later(order_id, paypal_order_id, e)
+        # PayPal refused the capture
+        cancel_paypal_order(order_id)
+        db.session.commit()
+        CHECKOUTS.labels('paypal', 'error').inc()
+        return jsonify({'error': 'Failed to capture payment', 'details': str(e)}), 500
+    except requests.RequestException as e:
+        return confirm_paypal_capture_later(order_id, paypal_order_id, e)
+
+    # Security Check: Ensure payment is 'COMPLETED'
+    if capture_data.get('status') != 'COMPLETED':
+        cancel_paypal_order(order_id)
+        db.session.commit()
+        CHECKOUTS.labels('paypal', 'not_completed').inc()
+        return jsonify({'error': 'Payment not completed by PayPal'}), 400
+
+    try:
+        complete_paypal_order(order_id)
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'Failed to capture payment', 'details': str(e)}), 500
\ No newline at end of file
+        current_app.logger.exception(f"Could not record the PayPal capture of order {order_id}")
+        return confirm_paypal_capture_later(order_id, paypal_order_id, e)
+
+    CHECKOUTS.labels('paypal', 'completed').inc()
+    return jsonify({
+        'message': 'Payment successful!', 
+        'order_id': order_id
+    })
+
+
+def complete_paypal_order(order_id):
+    """Marks a captured order paid and sells its held stock. Doesn't commit."""
+    order = db.session.get(Order, order_id)
+    if order.status == 'completed':
+        return
+    # Also after the sweeper cancelled it: the customer has paid, so the sale stands
+    order.status = 'completed'
+    commit_reservations(order_id)
+    queue_receipt(order_id)
+
+
+def cancel_paypal_order(order_id):
+    """The capture failed: cancel the order, put its stock back and its items back in the cart."""
+    order = db.session.get(Order, order_id)
+    if order.status != 'pending':
+        return
+    order.status = 'cancelled'
+    release_reservations([order_id])
+    db.session.execute(
+        update(Cart).where(Cart.id.in_(select(OrderItem.cart_id).where(OrderItem.order_id == order_id)))
+        .values(paid=False)
+    )
+
+
+def confirm_paypal_capture_later(order_id, paypal_order_id, error):
+    """
+    The capture may have gone through without being recorded. The outbox
+    worker repeats it (a no-op on PayPal's side if it did) and settles the
+    order; the stock stays held meanwhile.
+    """
+    current_app.logger.warning(f"PayPal capture of order {order_id} unconfirmed ({error}); retrying from the outbox")
+    try:
+        enqueue('paypal_capture', {'order_id': order_id, 'paypal_order_id': paypal_order_id})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception(
+            f"Could not queue the PayPal capture of order {order_id} ({paypal_order_id}); "
+            "check it in PayPal and complete or refund it by hand"
+        )
+        CHECKOUTS.labels('paypal', 'error').inc()
+        return jsonify({'error': 'Failed to capture payment', 'details': str(error)}), 500
+    CHECKOUTS.labels('paypal', 'unconfirmed').inc()
+    return jsonify({
+        'message': 'Your payment is being confirmed.',
+        'order_id': order_id,
+        'status': 'pending'
+    }), 202
+
+
+def give_up_paypal_capture(payload, error):
+    """The capture couldn't be confirmed after every retry; it needs checking by hand."""
+    current_app.logger.error(
+        f"PayPal capture of order {payload['order_id']} ({payload['paypal_order_id']}) still unconfirmed: "
+        f"{error}. Check it in PayPal and complete or refund it by hand."
+    )
+
+
+@outbox_handler('paypal_capture', on_failure=give_up_paypal_capture)
+def retry_paypal_capture(payload):
+    """Repeats an unconfirmed capture (same PayPal-Request-Id, so it's idempotent) and settles the order."""
+    try:
+        capture_data = get_paypal_service().capture_payment(payload['paypal_order_id'])
+    except CircuitOpenError as e:
+        raise RetryLater(str(e))
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code >= 500:
+            raise RetryLater(str(e))
+        capture_data = {}
+    except requests.RequestException as e:
+        raise RetryLater(str(e))
+
+    if capture_data.get('status') == 'COMPLETED':
+        complete_paypal_order(payload['order_id'])
+    else:
+        cancel_paypal_order(payload['order_id'])
+
+
+@orders_bp.route('/paypal/metrics', methods=['GET'])
+def paypal_metrics():
+    """Circuit state plus call counts, errors and latency percentiles per PayPal operation."""
+    # Operational data: behind the same bearer token as /metrics
+    if not metrics_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(get_paypal_service().stats())
\ No newline at end of file
@@ -1,28 +1,100 @@
-from flask import Blueprint, request, jsonify
-from app.models import Shoe
+from flask import Blueprint, request, jsonify, current_app
+from app.models import Shoe, ShoeSize
+from app.extensions import db
 from app.schemas import ShoeSchema
-from sqlalchemy import or_ # Import 'or_' for searching multiple fields
+from app.serializers import compile_schema, json_response
+from app.search import apply_search, matching_ids
+from app.facets import get_facet_index
+from app.cache import cached_catalog_response
+from app.query_budget import query_budget
+from app.database import use_replica_for_reads
+from app.pagination import PaginationError, parse_sort, keyset_page, count_total
 
 products_bp = Blueprint('products_bp', __name__)
-shoe_schema = ShoeSchema()
-shoes_schema = ShoeSchema(many=True)
+# GETs read from the read replica when one is configured
+use_replica_for_reads(products_bp)
+# Compiled once from the marshmallow schemas; output is identical to schema.dump()
+shoe_schema = compile_schema(ShoeSchema())
+shoes_schema = compile_schema(ShoeSchema(many=True))
 
-@products_bp.route('/shoes', methods=['GET'])
-def get_shoes():
-    page = request.args.get('page', 1, type=int)
+SHOE_SORT_KEYS = {'id': Shoe.id, 'price': Shoe.price, 'rating': Shoe.rating}
+
+@products_bp.errorhandler(PaginationError)
+def handle_pagination_error(e):
+    return jsonify({'error': str(e)}), 400
+
+def paginate_shoes(query):
+    """
+    Pages a Shoe query. Passing a `cursor` parameter (empty for the first page)
+    switches to keyset pagination; otherwise the classic page/per_page mode is used.
+    """
     per_page = request.args.get('per_page', 8, type=int)
-    
-    paginated_shoes = Shoe.query.paginate(page=page, per_page=per_page, error_out=False)
-    
-    return jsonify({
-        'shoes': shoes_schema.dump(paginated_shoes.items),
-        'total': paginated_shoes.total,
-        'pages': paginated_shoes.pages,
+
+    if 'cursor' in request.args:
+        sort, sort_column, descending = parse_sort(request.args.get('sort', type=str), SHOE_SORT_KEYS, 'id')
+        shoes, next_cursor = keyset_page(
+            query, Shoe.id, sort_column, descending, sort,
+            cursor=request.args.get('cursor'), limit=per_page
+        )
+        result = {'shoes': shoes_schema.dump(shoes), 'next_cursor': next_cursor}
+        total, exact = count_total(query, Shoe.id, request.args.get('total', 'none'),
+                                   cap=current_app.config['APPROX_COUNT_CAP'])
+        if total is not None:
+            result['total'] = total
+            result['total_exact'] = exact
+        return result
+
+    page = request.args.get('page', 1, type=int)
+    paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+    return {
+        'shoes': shoes_schema.dump(paginated.items),
+        'total': paginated.total,
+        'pages': paginated.pages,
         'current_page': page
-    })
+    }
+
+# Ids are bound as 64-bit integers; anything outside this range can't exist
+MAX_ID = 2 ** 63 - 1
+
+def parse_id(part):
+    shoe_id = int(part)
+    if not 1 <= shoe_id <= MAX_ID:
+        raise ValueError(f"id out of range: {part}")
+    return shoe_id
+
+def parse_ids(parts):
+    """Parses id strings, dropping blanks and duplicates but keeping the requested order."""
+    return list(dict.fromkeys(parse_id(part) for part in parts if part.strip()))
+
+@products_bp.route('/shoes', methods=['GET'])
+@cached_catalog_response
+@query_budget(5)
+def get_shoes():
+    # --- Batch lookup: /api/shoes?ids=3,1,2 resolves many shoes with one IN query ---
+    if 'ids' in request.args:
+        raw_ids = request.args.get('ids', '')
+        max_ids = current_app.config['BATCH_LOOKUP_MAX_IDS']
+        # Checked on the raw string, before any parsing work
+        if raw_ids.count(',') + 1 > max_ids:
+            return jsonify({'error': f'At most {max_ids} ids can be requested at once'}), 400
+        try:
+            ids = parse_ids(raw_ids.split(','))
+        except ValueError:
+            return jsonify({'error': 'ids must be a comma-separated list of integers'}), 400
+
+        found = {shoe.id: shoe for shoe in Shoe.query.filter(Shoe.id.in_(ids)).all()} if ids else {}
+        return json_response({
+            'shoes': shoes_schema.dump([found[shoe_id] for shoe_id in ids if shoe_id in found]),
+            'missing': [shoe_id for shoe_id in ids if shoe_id not in found]
+        })
+
+    return json_response(paginate_shoes(Shoe.query))
 
 # --- NEW ADVANCED FILTERING & SEARCH ROUTE ---
 @products_bp.route('/shoes/search', methods=['GET'])
+@cached_catalog_response
+# Count, page, sizes and search ids, plus at most two for the facet index sync
+@query_budget(6)
 def search_and_filter_shoes():
     # Get query parameters
     query_str = request.args.get('q', '', type=str)
@@ -30,18 +102,15 @@ def search_and_filter_shoes():
     min_price = request.args.get('min_price', type=float)
     max_price = request.args.get('max_price', type=float)
     size = request.args.get('size', '', type=str)
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 8, type=int)
+    min_rating = request.args.get('min_rating', type=float)
+    with_facets = request.args.get('facets', '').lower() in ['true', 'on', '1']
 
     # Start with a base query
     query = Shoe.query
 
-    # Apply search term filter (for name or description)
+    # Apply full-text search on name/description, ranked by relevance
     if query_str:
-        query = query.filter(or_(
-            Shoe.name.ilike(f'%{query_str}%'),
-            Shoe.description.ilike(f'%{query_str}%')
-        ))
+        query = apply_search(query, query_str)
 
     # Apply filters
     if brand:
@@ -51,20 +120,34 @@ def search_and_filter_shoes():
     if max_price is not None:
         query = query.filter(Shoe.price <= max_price)
     if size:
-        # Using LIKE to find the size in the comma-separated string
-        query = query.filter(Shoe.sizes.like(f'%{size}%'))
+        # Exact match on the indexed size inventory (size "1" no longer matches
+        # "10"), in stock as the size facet counts it
+        query = query.filter(Shoe.id.in_(
+            db.select(ShoeSize.shoe_id).where(ShoeSize.size == size, ShoeSize.stock > 0)
+        ))
+    if min_rating is not None:
+        query = query.filter(Shoe.rating >= min_rating)
 
-    paginated_results = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Keyset mode orders by the requested sort key instead of search relevance
+    response = paginate_shoes(query)
 
-    return jsonify({
-        'shoes': shoes_schema.dump(paginated_results.items),
-        'total': paginated_results.total,
-        'pages': paginated_results.pages,
-        'current_page': page
-    })
+    # Facet counts come from the in-memory facet index, not extra GROUP BY queries
+    if with_facets:
+        response['facets'] = get_facet_index().counts(
+            base_ids=matching_ids(query_str),
+            brand=brand,
+            size=size,
+            min_price=min_price,
+            max_price=max_price,
+            min_rating=min_rating
+        )
+
+    return json_response(response)
 
 
 @products_bp.route('/shoes/<int:shoe_id>', methods=['GET'])
+@cached_catalog_response
+@query_budget(3)
 def get_shoe(shoe_id):
     shoe = Shoe.query.get_or_404(shoe_id)
-    return jsonify(shoe_schema.dump(shoe))
\ No newline at end of file
+    return json_response(shoe_schema.dump(shoe))
\ No newline at end of file
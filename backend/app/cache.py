@@ -0,0 +1,165 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from urllib.parse import urlencode
+from flask import current_app, request, make_response
+from sqlalchemy import select, func
+from .extensions import db
+from .models import CatalogChange
+from .metrics import CATALOG_CACHE_EVENTS
+from . import catalog
+
+# --- CATALOG RESPONSE CACHE ---
+# Serialized product responses are cached per worker, keyed by the catalog
+# version: the id of the newest catalog_change row. Any Shoe/ShoeSize write
+# (including stock decrements at checkout) adds a row, so a new version makes
+# every older entry unreachable and they simply age out of the LRU.
+#
+# The version is re-read from the database at most every poll interval, or
+# right after this worker commits a catalog change. In between, conditional
+# requests are answered with 304 without touching the database.
+#
+# Hits, misses, evictions, expirations and 304 revalidations are exported as
+# catalog_cache_events_total{event=...}, so the hit rate shows on /metrics.
+
+CachedResponse = namedtuple('CachedResponse', ['body', 'mimetype', 'stored_at'])
+
+# Bound once; label lookups take a lock
+_events = {event: CATALOG_CACHE_EVENTS.labels(event)
+           for event in ('hit', 'miss', 'eviction', 'expiration', 'revalidated')}
+
+
+class CatalogCache:
+    """A thread-safe LRU cache with a per-entry TTL and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                _events['miss'].inc()
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                _events['expiration'].inc()
+                _events['miss'].inc()
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _events['hit'].inc()
+            return entry
+
+    def set(self, key, body, mimetype):
+        with self._lock:
+            self._entries[key] = CachedResponse(body, mimetype, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+                _events['eviction'].inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class CatalogVersion:
+    """Tracks the latest catalog_change id without querying it on every request."""
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+        self._value = None
+        self._checked_at = 0.0
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def current(self):
+        with self._lock:
+            generation = catalog.commit_generation()
+            now = time.monotonic()
+            if self._value is None or generation != self._generation or now - self._checked_at >= self.poll_interval:
+                self._value = db.session.execute(select(func.max(CatalogChange.id))).scalar() or 0
+                self._checked_at = now
+                self._generation = generation
+            return self._value
+
+
+def get_catalog_cache():
+    """Returns this worker's (CatalogCache, CatalogVersion) pair for the current app."""
+    state = current_app.extensions.get('catalog_cache')
+    if state is None:
+        state = (
+            CatalogCache(current_app.config['CATALOG_CACHE_SIZE'], current_app.config['CATALOG_CACHE_TTL']),
+            CatalogVersion(current_app.config['CATALOG_VERSION_POLL_INTERVAL']),
+        )
+        current_app.extensions['catalog_cache'] = state
+    return state
+
+
+def _request_key():
+    args = urlencode(sorted(request.args.items(multi=True)))
+    return f"{request.path}?{args}"
+
+
+def cached_catalog_response(view):
+    """
+    Serves a catalog GET view from the response cache, with a strong ETag
+    derived from the catalog version and the request, so If-None-Match can be
+    answered with 304 before the view (and the database) is touched.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config['CATALOG_CACHE_ENABLED']:
+            return view(*args, **kwargs)
+
+        cache, version = get_catalog_cache()
+        current_version = version.current()
+        key = _request_key()
+        etag = f"c{current_version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}"
+
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+            cache_state = 'REVALIDATED'
+            _events['revalidated'].inc()
+        else:
+            entry = cache.get((current_version, key))
+            if entry is not None:
+                response = current_app.response_class(entry.body, mimetype=entry.mimetype)
+                cache_state = 'HIT'
+            else:
+                response = make_response(view(*args, **kwargs))
+                cache_state = 'MISS'
+                if response.status_code != 200:
+                    return response
+                cache.set((current_version, key), response.get_data(), response.mimetype)
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = cache_state
+        return response
+
+    return wrapper
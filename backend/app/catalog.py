@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import Shoe, ShoeSize, CatalogChange
+
+# --- CATALOG CHANGE TRACKING ---
+# Every flush that touches a Shoe or ShoeSize appends the affected shoe ids to
+# the catalog_change table in the same transaction, so a change is visible to
+# other workers exactly when it commits.
+
+# How long change rows are kept, and how often (in recorded flushes) old ones are pruned
+CHANGE_RETENTION = timedelta(days=1)
+PRUNE_EVERY = 500
+
+_flushes_since_prune = 0
+_commit_generation = 0
+
+
+def commit_generation():
+    """A process-wide counter bumped whenever a transaction with catalog changes commits."""
+    return _commit_generation
+
+
+def record_catalog_changes(session, shoe_ids):
+    """
+    Logs a change for each shoe id. Needed for writes that bypass the ORM unit
+    of work (e.g. Core UPDATE statements); ORM flushes are tracked automatically.
+    """
+    global _flushes_since_prune
+    shoe_ids = {shoe_id for shoe_id in shoe_ids if shoe_id is not None}
+    if not shoe_ids:
+        return
+
+    table = CatalogChange.__table__
+    connection = session.connection()
+    connection.execute(table.insert(), [{'shoe_id': shoe_id} for shoe_id in sorted(shoe_ids)])
+    session.info['catalog_changed'] = True
+
+    _flushes_since_prune += 1
+    if _flushes_since_prune >= PRUNE_EVERY:
+        _flushes_since_prune = 0
+        connection.execute(table.delete().where(table.c.created_at < datetime.utcnow() - CHANGE_RETENTION))
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_catalog_changes(session, flush_context):
+    shoe_ids = set()
+    modified = (obj for obj in session.dirty if session.is_modified(obj, include_collections=False))
+    for obj in chain(session.new, modified, session.deleted):
+        if isinstance(obj, Shoe):
+            shoe_ids.add(obj.id)
+        elif isinstance(obj, ShoeSize):
+            shoe_ids.add(obj.shoe_id if obj.shoe_id is not None else getattr(obj.shoe, 'id', None))
+    if shoe_ids:
+        record_catalog_changes(session, shoe_ids)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_commit_generation(session):
+    global _commit_generation
+    if session.info.pop('catalog_changed', False):
+        _commit_generation += 1
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_catalog_changes(session):
+    session.info.pop('catalog_changed', None)
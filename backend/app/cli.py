@@ -0,0 +1,149 @@
+import json
+import click
+from flask.cli import AppGroup
+
+# --- MAINTENANCE COMMANDS ---
+# Run with `flask --app run <group> <command>` from the backend directory.
+
+inventory_cli = AppGroup('inventory', help='Stock reservation maintenance.')
+
+
+@inventory_cli.command('sweep')
+@click.option('--loop', is_flag=True, help='Keep sweeping instead of running once.')
+@click.option('--interval', default=30.0, show_default=True, help='Seconds between sweeps with --loop.')
+def sweep_reservations(loop, interval):
+    """Cancels pending orders with expired reservations and releases their stock."""
+    from .inventory import sweep_expired_reservations, run_sweeper
+    if loop:
+        run_sweeper(interval)
+    else:
+        click.echo(f"Cancelled {sweep_expired_reservations()} expired orders")
+
+
+outbox_cli = AppGroup('outbox', help='Transactional outbox dispatcher.')
+
+
+@outbox_cli.command('dispatch')
+@click.option('--loop', is_flag=True, help='Keep polling instead of running once.')
+@click.option('--interval', default=1.0, show_default=True, help='Seconds between polls with --loop.')
+@click.option('--batch-size', default=50, show_default=True, help='Messages claimed per round trip.')
+def dispatch_outbox(loop, interval, batch_size):
+    """Sends due outbox messages (STK pushes, ...) and records the results."""
+    from .outbox import dispatch_pending, run_dispatcher
+    if loop:
+        run_dispatcher(interval, batch_size)
+    else:
+        click.echo(f"Dispatched: {dispatch_pending(batch_size)}")
+
+
+mpesa_cli = AppGroup('mpesa', help='M-Pesa callback maintenance.')
+
+
+@mpesa_cli.command('replay')
+@click.option('--status', default='failed', show_default=True,
+              type=click.Choice(['failed', 'received', 'processed', 'all']),
+              help='Which stored callbacks to replay.')
+@click.option('--since', type=click.DateTime(), default=None, help='Only callbacks received at or after this time.')
+@click.option('--id', 'callback_ids', type=int, multiple=True, help='Replay these callback ids (repeatable).')
+@click.option('--dry-run', is_flag=True, help='Only list what would be replayed.')
+def replay_mpesa_callbacks(status, since, callback_ids, dry_run):
+    """Re-applies stored M-Pesa callbacks to their orders. Effects already applied are not repeated."""
+    from .extensions import db
+    from .models import MpesaCallback
+    from .mpesa_callbacks import replay_callbacks
+    query = db.select(MpesaCallback.id).order_by(MpesaCallback.id)
+    if callback_ids:
+        query = query.where(MpesaCallback.id.in_(callback_ids))
+    elif status != 'all':
+        query = query.where(MpesaCallback.status == status)
+    if since:
+        query = query.where(MpesaCallback.received_at >= since)
+    ids = db.session.execute(query).scalars().all()
+    if dry_run:
+        click.echo(f"Would replay {len(ids)} callbacks: {ids}")
+        return
+    click.echo(f"Replayed {len(ids)} callbacks: {replay_callbacks(ids)}")
+
+
+@mpesa_cli.command('reconcile')
+@click.option('--loop', is_flag=True, help='Keep reconciling instead of running once.')
+@click.option('--interval', default=60.0, show_default=True, help='Seconds between runs with --loop.')
+def reconcile_mpesa_orders(loop, interval):
+    """Settles or cancels stale pending M-Pesa orders by querying their STK push status."""
+    from .reconciliation import reconcile_pending_orders, run_reconciler
+    if loop:
+        run_reconciler(interval)
+    else:
+        click.echo(json.dumps(reconcile_pending_orders()))
+
+
+receipts_cli = AppGroup('receipts', help='Receipt and statement exports.')
+
+
+@receipts_cli.command('export')
+@click.option('--month', default=None, help='Calendar month to export, as YYYY-MM.')
+@click.option('--since', type=click.DateTime(), default=None, help='Start of the period (inclusive).')
+@click.option('--until', type=click.DateTime(), default=None, help='End of the period (exclusive).')
+@click.option('--out', 'out_path', required=True, type=click.Path(dir_okay=False), help='ZIP file to write.')
+@click.option('--workers', type=int, default=None, help='Render processes (default: CPU count; 0 renders inline).')
+@click.option('--statements/--no-statements', default=True, show_default=True, help='Also write per-customer statements.')
+@click.option('--batch-size', default=500, show_default=True, help='Orders fetched from the database per batch.')
+def export_receipts_command(month, since, until, out_path, workers, statements, batch_size):
+    """Renders the receipts of all orders completed in a period into a ZIP archive."""
+    from datetime import datetime
+    from .exports import export_receipts
+    if month:
+        since = datetime.strptime(month, '%Y-%m')
+        until = since.replace(year=since.year + since.month // 12, month=since.month % 12 + 1)
+    if not since or not until:
+        raise click.UsageError('Give --month, or both --since and --until.')
+    report = export_receipts(out_path, since, until, workers=workers, statements=statements, batch_size=batch_size)
+    click.echo(f"Wrote {report['orders']} receipts and {report['statements']} statements "
+               f"({report['bytes'] / 1e6:.1f} MB) to {out_path} in {report['seconds']}s: "
+               f"{report['orders_per_second']} orders/s")
+
+
+mail_cli = AppGroup('mail', help='Outbound mail queue.')
+
+
+@mail_cli.command('send')
+@click.option('--loop', is_flag=True, help='Keep polling instead of running once.')
+@click.option('--interval', default=5.0, show_default=True, help='Seconds between polls with --loop.')
+@click.option('--batch-size', default=50, show_default=True, help='Messages claimed per round trip.')
+def send_mail(loop, interval, batch_size):
+    """Sends queued email over one SMTP connection per drain."""
+    from .mailer import send_pending, run_mailer
+    if loop:
+        run_mailer(interval, batch_size)
+    else:
+        click.echo(f"Mail: {send_pending(batch_size)}")
+
+
+queries_cli = AppGroup('queries', help='SQL query checks.')
+
+
+@queries_cli.command('check-plans')
+@click.option('--database-url', default=None,
+              help='Empty scratch database to run against (default: a temporary SQLite file). Its tables are dropped afterwards.')
+def check_query_plans_command(database_url):
+    """Fails if a hot endpoint's query reads a whole table instead of using an index, or exceeds its query budget."""
+    from .query_plans import check_query_plans
+    results, problems, failures = check_query_plans(database_url)
+    for name, count in results:
+        click.echo(f"{name:<32} {count:>3} statements")
+    for name, table, statement in problems:
+        click.echo(f"\nFull scan of '{table}' in {name}:\n  {' '.join(statement.split())}", err=True)
+    for name, error in failures:
+        click.echo(f"\nScenario '{name}' failed: {error}", err=True)
+    if problems or failures:
+        raise SystemExit(1)
+    click.echo('No unexpected full table scans.')
+
+
+def register_cli(app):
+    app.cli.add_command(inventory_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(mpesa_cli)
+    app.cli.add_command(receipts_cli)
+    app.cli.add_command(mail_cli)
+    app.cli.add_command(queries_cli)
@@ -0,0 +1,124 @@
+from flask import current_app, g, has_app_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# --- DATABASE ENGINES ---
+# Engine options follow the database in use:
+# - SQLite: every connection switches to WAL (readers don't block the writer
+#   and vice versa), waits up to SQLITE_BUSY_TIMEOUT_MS for a lock instead of
+#   failing with "database is locked", syncs less often (NORMAL is safe with
+#   WAL) and memory-maps the file.
+# - Postgres: a sized connection pool with pre-ping and recycling, and a
+#   server-side statement timeout.
+#
+# With DATABASE_REPLICA_URL set, a 'replica' bind is added and GET requests
+# of the blueprints passed to use_replica_for_reads() read from it. Anything
+# that writes (flushes, Core INSERT/UPDATE/DELETE) goes to the primary, and
+# so does every statement after the first write in a session.
+
+REPLICA = 'replica'
+
+
+def normalize_url(url):
+    # Heroku/Render style URLs use the scheme SQLAlchemy dropped
+    if url and url.startswith('postgres://'):
+        return 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def engine_options(url, config, read_only=False):
+    """SQLAlchemy engine options for the database at url."""
+    backend = make_url(url).get_backend_name()
+    if backend == 'postgresql':
+        options = [f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"]
+        if read_only:
+            options.append('-c default_transaction_read_only=on')
+        return {
+            'pool_size': config['DB_POOL_SIZE'],
+            'max_overflow': config['DB_MAX_OVERFLOW'],
+            'pool_timeout': config['DB_POOL_TIMEOUT'],
+            'pool_recycle': config['DB_POOL_RECYCLE'],
+            'pool_pre_ping': config['DB_POOL_PRE_PING'],
+            'connect_args': {'options': ' '.join(options)},
+        }
+    if backend == 'sqlite':
+        # pysqlite's own lock wait, in seconds (the pragma below covers the rest)
+        return {'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000}}
+    return {}
+
+
+def configure_database(app):
+    """Fills in engine options and the replica bind; call before db.init_app."""
+    config = app.config
+    url = config['SQLALCHEMY_DATABASE_URI'] = normalize_url(config['SQLALCHEMY_DATABASE_URI'])
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {**engine_options(url, config), **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+    replica_url = normalize_url(config.get('DATABASE_REPLICA_URL'))
+    if replica_url:
+        config['SQLALCHEMY_BINDS'] = {
+            **config.get('SQLALCHEMY_BINDS', {}),
+            REPLICA: {'url': replica_url, **engine_options(replica_url, config, read_only=True)},
+        }
+
+
+def _sqlite_pragmas(config):
+    pragmas = [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+    return set_pragmas
+
+
+def init_database(app, db):
+    """Installs the SQLite pragmas on the app's SQLite engines; call after db.init_app."""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _sqlite_pragmas(app.config))
+
+
+# --- READ REPLICA ROUTING ---
+
+def _reads_from_replica():
+    return has_app_context() and g.get('db_role') == REPLICA
+
+
+class RoutingSession(Session):
+    """Sends reads to the replica bind in replica-role requests; writes always go to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and _reads_from_replica():
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['wrote'] = True
+            elif not self.info.get('wrote'):
+                replica = self._db.engines.get(REPLICA)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _route_reads():
+    view = current_app.view_functions.get(request.endpoint)
+    if request.method in ('GET', 'HEAD') and not getattr(view, '_primary_only', False):
+        g.db_role = REPLICA
+
+
+def use_replica_for_reads(blueprint):
+    """Routes the blueprint's GET requests to the read replica (when one is configured)."""
+    blueprint.before_request(_route_reads)
+
+
+def primary_only(view):
+    """Keeps a GET view on the primary, e.g. when it must see the request's own or very recent writes."""
+    view._primary_only = True
+    return view
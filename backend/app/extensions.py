@@ -7,9 +7,10 @@ from flask_mail import Mail
 from authlib.integrations.flask_client import OAuth
 
 from flask_cors import CORS
+from .database import RoutingSession
 
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 jwt = JWTManager()
 migrate = Migrate()
@@ -0,0 +1,194 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+from flask import current_app
+from sqlalchemy import select, func
+from .extensions import db
+from .models import Shoe, ShoeSize, CatalogChange
+
+# --- FACET INDEX ---
+# A per-worker, in-memory inverted index of facet value -> shoe ids. It is
+# built once from the catalog and then kept current by replaying the
+# catalog_change log (see app/catalog.py), so facet counts for a search are
+# plain set intersections instead of GROUP BY queries over the shoe table.
+
+FACETS = ('brand', 'size', 'price', 'rating')
+
+# Change ids can commit out of order on Postgres; re-reading a small window
+# below the high-water mark makes sure a late commit is never skipped.
+CHANGE_LOOKBACK = 50
+
+
+class FacetIndex:
+    def __init__(self, price_buckets, rating_bands):
+        self.price_buckets = sorted(price_buckets)
+        self.rating_bands = sorted(rating_bands, reverse=True)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_change_id = 0
+        self._applied = deque(maxlen=CHANGE_LOOKBACK * 4)
+        self._docs = {}
+        self._postings = {facet: defaultdict(set) for facet in FACETS}
+        self._sorted = {}
+
+    # --- Labels ---
+
+    def price_label(self, price):
+        lower = 0
+        for upper in self.price_buckets:
+            if price < upper:
+                return f"{lower:g}-{upper:g}"
+            lower = upper
+        return f"{lower:g}+"
+
+    def rating_labels(self, rating):
+        return [f"{band:g}+" for band in self.rating_bands if rating >= band]
+
+    # --- Maintenance ---
+
+    def sync(self):
+        """
+        Brings the index up to date with the catalog_change log. Costs at most
+        two statements however many changes are pending: one read of the log
+        and one load of the shoes it names.
+        """
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+                return
+
+            table = CatalogChange.__table__
+            oldest = select(func.min(table.c.id)).scalar_subquery()
+            changes = db.session.execute(
+                select(table.c.id, table.c.shoe_id, oldest)
+                .where(table.c.id > self._last_change_id - CHANGE_LOOKBACK)
+                .order_by(table.c.id)
+            ).all()
+            if changes and changes[0][2] > self._last_change_id + 1:
+                # Changes we never saw were pruned; start over
+                self._rebuild(last_change_id=changes[-1][0])
+                return
+
+            applied = set(self._applied)
+            shoe_ids = set()
+            for change_id, shoe_id, _ in changes:
+                if change_id in applied:
+                    continue
+                self._applied.append(change_id)
+                self._last_change_id = max(self._last_change_id, change_id)
+                shoe_ids.add(shoe_id)
+            if shoe_ids:
+                self._reindex(shoe_ids)
+
+    def _rebuild(self, last_change_id=None):
+        if last_change_id is None:
+            last_change_id = db.session.execute(select(func.max(CatalogChange.id))).scalar() or 0
+        self._last_change_id = last_change_id
+        self._applied.clear()
+        self._docs = {}
+        self._postings = {facet: defaultdict(set) for facet in FACETS}
+        self._load()
+        self._loaded = True
+
+    def _reindex(self, shoe_ids):
+        for shoe_id in shoe_ids:
+            self._remove(shoe_id)
+        self._load(shoe_ids)
+
+    def _load(self, shoe_ids=None):
+        # One statement: each shoe with its in-stock sizes (or a single NULL
+        # size). Stock changes are logged too, so a sold-out size drops out.
+        rows = (
+            select(Shoe.id, Shoe.brand, Shoe.price, Shoe.rating, ShoeSize.size)
+            .outerjoin(ShoeSize, (ShoeSize.shoe_id == Shoe.id) & (ShoeSize.stock > 0))
+        )
+        if shoe_ids is not None:
+            rows = rows.where(Shoe.id.in_(shoe_ids))
+
+        for shoe_id, brand, price, rating, size in db.session.execute(rows):
+            doc = self._docs.get(shoe_id)
+            if doc is None:
+                doc = {
+                    'brand': [brand],
+                    'size': [],
+                    'price': [self.price_label(price)],
+                    'rating': self.rating_labels(rating),
+                    '_price': price,
+                    '_rating': rating,
+                }
+                self._docs[shoe_id] = doc
+                for facet in ('brand', 'price', 'rating'):
+                    for value in doc[facet]:
+                        self._postings[facet][value].add(shoe_id)
+            if size is not None:
+                doc['size'].append(size)
+                self._postings['size'][size].add(shoe_id)
+        self._sorted = {}
+
+    def _remove(self, shoe_id):
+        doc = self._docs.pop(shoe_id, None)
+        if not doc:
+            return
+        for facet in FACETS:
+            for value in doc[facet]:
+                postings = self._postings[facet][value]
+                postings.discard(shoe_id)
+                if not postings:
+                    del self._postings[facet][value]
+        self._sorted = {}
+
+    # --- Queries ---
+
+    def _range(self, field, low, high):
+        """Ids whose numeric field lies in [low, high], via a lazily sorted array."""
+        if field not in self._sorted:
+            pairs = sorted((doc[field], shoe_id) for shoe_id, doc in self._docs.items())
+            self._sorted[field] = ([value for value, _ in pairs], [shoe_id for _, shoe_id in pairs])
+        values, ids = self._sorted[field]
+        start = 0 if low is None else bisect_left(values, low)
+        end = len(values) if high is None else bisect_right(values, high)
+        return set(ids[start:end])
+
+    def counts(self, base_ids=None, brand=None, size=None, min_price=None, max_price=None, min_rating=None):
+        """
+        Returns {facet: {value: count}} for shoes matching base_ids (None means
+        the whole catalog) and the given filters. Each facet ignores its own
+        filter, so the counts show what selecting another value would return.
+        """
+        with self._lock:
+            filters = {}
+            if brand:
+                filters['brand'] = self._postings['brand'].get(brand, set())
+            if size:
+                filters['size'] = self._postings['size'].get(str(size), set())
+            if min_price is not None or max_price is not None:
+                filters['price'] = self._range('_price', min_price, max_price)
+            if min_rating is not None:
+                filters['rating'] = self._range('_rating', min_rating, None)
+
+            result = {}
+            for facet in FACETS:
+                candidates = base_ids
+                for other, ids in filters.items():
+                    if other != facet:
+                        candidates = ids if candidates is None else candidates & ids
+                values = {}
+                for value, postings in self._postings[facet].items():
+                    count = len(postings) if candidates is None else len(postings & candidates)
+                    if count:
+                        values[value] = count
+                result[facet] = values
+            return result
+
+
+def get_facet_index():
+    """Returns this worker's facet index for the current app, synced with the catalog."""
+    index = current_app.extensions.get('facet_index')
+    if index is None:
+        index = FacetIndex(
+            current_app.config['FACET_PRICE_BUCKETS'],
+            current_app.config['FACET_RATING_BANDS'],
+        )
+        current_app.extensions['facet_index'] = index
+    index.sync()
+    return index
@@ -0,0 +1,233 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# --- ACCESS TOKEN CACHE ---
+# Gateway OAuth tokens are valid for roughly an hour (M-Pesa) to nine hours
+# (PayPal), so one token is reused until shortly before it expires instead of
+# fetching a new one for every call. With a file path, the token is also
+# shared through that file so all gunicorn workers on a host use the same one.
+
+class TokenCache:
+    """Thread-safe cache for one access token, optionally backed by a file."""
+
+    def __init__(self, refresh_margin=60, path=None):
+        self.refresh_margin = refresh_margin
+        self.path = path
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _fresh(self, expires_at):
+        return expires_at - self.refresh_margin > time.time()
+
+    def _read_file(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data['access_token'], float(data['expires_at'])
+        except (OSError, ValueError, KeyError):
+            return None, 0.0
+
+    def _write_file(self, token, expires_at):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'access_token': token, 'expires_at': expires_at}, f)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write token cache file {self.path}: {e}")
+
+    def get(self, fetch):
+        """
+        Returns a cached token, calling fetch() -> (token, expires_in seconds)
+        when there is none that stays valid for refresh_margin seconds.
+        """
+        if self._token and self._fresh(self._expires_at):
+            return self._token
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._token and self._fresh(self._expires_at):
+                return self._token
+            if self.path:
+                token, expires_at = self._read_file()
+                if token and self._fresh(expires_at):
+                    self._token, self._expires_at = token, expires_at
+                    return token
+            token, expires_in = fetch()
+            self._token, self._expires_at = token, time.time() + expires_in
+            if self.path:
+                self._write_file(token, self._expires_at)
+            return token
+
+    def invalidate(self):
+        with self._lock:
+            self._token, self._expires_at = None, 0.0
+            if self.path:
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+
+def build_session(pool_size=10, retries=3):
+    """
+    A requests.Session with a keep-alive connection pool, so calls after the
+    first skip the TCP and TLS handshakes. Connection failures are retried for
+    every method (nothing was sent); read errors and 5xx only for GET, since
+    repeating a payment POST could charge or prompt the customer twice.
+    """
+    retry = Retry(
+        total=retries, connect=retries, read=retries, status=retries,
+        backoff_factor=0.3,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def never_sent(error):
+    """
+    Whether a failed request certainly never reached the server: the
+    connection couldn't be made (timeout, refused, DNS). A ConnectionError can
+    also mean the connection dropped after the body was sent (e.g. "Connection
+    aborted"), which is not safe to repeat for a payment POST.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    # NameResolutionError is a NewConnectionError too
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+# --- CIRCUIT BREAKER ---
+# After `failure_threshold` consecutive failures the circuit opens and calls
+# fail immediately with CircuitOpenError for `reset_timeout` seconds, instead
+# of each one waiting out its timeout. Then a single trial call is let through
+# (half-open): success closes the circuit, failure opens it again.
+
+class CircuitOpenError(Exception):
+    def __init__(self, name, retry_after):
+        self.retry_after = retry_after
+        super().__init__(f"{name} is unavailable (circuit open); retry in {retry_after:.0f}s")
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def before_call(self):
+        """Raises CircuitOpenError unless a call may go ahead."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            waited = time.monotonic() - self.opened_at
+            if waited < self.reset_timeout or self._trial_in_flight:
+                raise CircuitOpenError(self.name, max(self.reset_timeout - waited, 1))
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+# --- PER-OPERATION METRICS ---
+
+class OperationMetrics:
+    """Call counts, errors and latency percentiles (over the last `window` calls) per operation."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def record(self, operation, elapsed, outcome):
+        """outcome is 'ok', 'error' or 'rejected' (short-circuited)."""
+        with self._lock:
+            stats = self._operations.get(operation)
+            if stats is None:
+                stats = self._operations[operation] = {
+                    'calls': 0, 'errors': 0, 'rejected': 0, 'latencies': deque(maxlen=self.window)
+                }
+            stats['calls'] += 1
+            if outcome == 'error':
+                stats['errors'] += 1
+            elif outcome == 'rejected':
+                stats['rejected'] += 1
+            if outcome != 'rejected':
+                stats['latencies'].append(elapsed)
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for operation, stats in self._operations.items():
+                latencies = sorted(stats['latencies'])
+
+                def percentile(q):
+                    return round(latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000, 1) if latencies else None
+
+                result[operation] = {
+                    'calls': stats['calls'],
+                    'errors': stats['errors'],
+                    'rejected': stats['rejected'],
+                    'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99)},
+                }
+            return result
+
+
+# --- OUTBOUND RATE LIMIT ---
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads (blocking)."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
@@ -0,0 +1,184 @@
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, insert, select, update
+from .extensions import db
+from .models import Order, ShoeSize, StockReservation
+from .order_events import record_status_change
+from .catalog import record_catalog_changes
+
+# --- STOCK RESERVATIONS ---
+# Stock is taken with a single conditional UPDATE (... SET stock = stock - qty
+# WHERE stock >= qty), so concurrent checkouts can never oversell or lose each
+# other's decrements, and no row is read into Python and written back. The
+# units are then held by StockReservation rows until the order is paid
+# (commit_reservations) or fails/expires (release_reservations), which puts
+# them back with the mirror-image UPDATE.
+#
+# Reservation status changes are conditional too (WHERE status = 'held'), so a
+# late payment callback racing the expiry sweeper releases the units once.
+#
+# RETURNING is used to learn which rows an UPDATE touched; SQLite >= 3.35 and
+# PostgreSQL both support it.
+
+
+class InsufficientStock(Exception):
+    def __init__(self, cart_item, available):
+        self.cart_item = cart_item
+        self.available = available
+        super().__init__(
+            f"Not enough stock for {cart_item.shoe.name} (size {cart_item.size}). Available: {available}"
+        )
+
+
+def _per_size_quantities(cart_items):
+    """Maps each cart item to its ShoeSize row and sums quantities per row."""
+    quantities = Counter()
+    for item in cart_items:
+        size_entry = item.shoe.size_entry(item.size)
+        if size_entry is None:
+            raise InsufficientStock(item, 0)
+        quantities[size_entry.id] += item.quantity
+    return quantities
+
+
+def _adjust_stock(quantities, sign, conditional=True):
+    """
+    Adds (sign=1) or takes (sign=-1) the given units per ShoeSize id and
+    returns the ids updated. Units are only taken where enough stock is left,
+    unless `conditional` is off.
+    """
+    table = ShoeSize.__table__
+    amount = case(dict(quantities), value=table.c.id)
+    stmt = (
+        update(table)
+        .where(table.c.id.in_(list(quantities)))
+        .values(stock=table.c.stock + sign * amount)
+        .returning(table.c.id, table.c.shoe_id)
+    )
+    if sign < 0 and conditional:
+        stmt = stmt.where(table.c.stock >= amount)
+    rows = db.session.execute(stmt).all()
+    record_catalog_changes(db.session, {row.shoe_id for row in rows})
+
+    # Loaded ShoeSize objects no longer match the database
+    for row in rows:
+        entry = db.session.identity_map.get(db.session.identity_key(ShoeSize, row.id))
+        if entry is not None:
+            db.session.expire(entry, ['stock'])
+    return {row.id for row in rows}
+
+
+def reserve_stock(order, cart_items, ttl=None, status='held'):
+    """
+    Takes the cart's units off stock and holds them for the order until
+    `ttl` seconds from now (STOCK_RESERVATION_TTL by default). Pass
+    status='committed' when payment is settled in the same transaction.
+    Raises InsufficientStock if any size can't cover its quantity; the caller
+    must roll back, as the other sizes may already have been decremented.
+    """
+    ttl = current_app.config['STOCK_RESERVATION_TTL'] if ttl is None else ttl
+    quantities = _per_size_quantities(cart_items)
+    taken = _adjust_stock(quantities, -1)
+
+    if len(taken) < len(quantities):
+        short = set(quantities) - taken
+        item = next(item for item in cart_items if item.shoe.size_entry(item.size).id in short)
+        available = db.session.execute(
+            select(ShoeSize.stock).where(ShoeSize.id == item.shoe.size_entry(item.size).id)
+        ).scalar()
+        raise InsufficientStock(item, available)
+
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    db.session.execute(insert(StockReservation), [
+        {'order_id': order.id, 'shoe_size_id': shoe_size_id, 'quantity': quantity,
+         'status': status, 'expires_at': expires_at}
+        for shoe_size_id, quantity in quantities.items()
+    ])
+
+
+def _transition(order_ids, to_status):
+    """Moves the orders' held reservations to `to_status`; returns the ones this call moved."""
+    table = StockReservation.__table__
+    return db.session.execute(
+        update(table)
+        .where(table.c.order_id.in_(order_ids), table.c.status == 'held')
+        .values(status=to_status)
+        .returning(table.c.shoe_size_id, table.c.quantity)
+    ).all()
+
+
+def release_reservations(order_ids):
+    """Puts the held units of the given orders back on stock. Safe to call more than once."""
+    released = _transition(order_ids, 'released')
+    quantities = Counter()
+    for row in released:
+        quantities[row.shoe_size_id] += row.quantity
+    if quantities:
+        _adjust_stock(quantities, 1)
+    return sum(quantities.values())
+
+
+def commit_reservations(order_id):
+    """
+    Marks the order's held units as sold. If the sweeper already released them
+    (payment arrived after expiry) they are taken again unconditionally: the
+    customer has paid, so the sale stands even if that oversells.
+    """
+    _transition([order_id], 'committed')
+
+    table = StockReservation.__table__
+    late = db.session.execute(
+        update(table)
+        .where(table.c.order_id == order_id, table.c.status == 'released')
+        .values(status='committed')
+        .returning(table.c.shoe_size_id, table.c.quantity)
+    ).all()
+    if late:
+        current_app.logger.warning(f"Order {order_id} was paid after its reservation expired; retaking stock")
+        quantities = Counter()
+        for row in late:
+            quantities[row.shoe_size_id] += row.quantity
+        _adjust_stock(quantities, -1, conditional=False)
+
+
+# --- EXPIRY SWEEPER ---
+
+def sweep_expired_reservations(now=None, batch_size=100):
+    """
+    Cancels pending orders whose reservations have expired and puts their
+    stock back. Returns the number of orders cancelled.
+    """
+    now = now or datetime.utcnow()
+    cancelled = 0
+    while True:
+        order_ids = db.session.execute(
+            select(StockReservation.order_id)
+            .where(StockReservation.status == 'held', StockReservation.expires_at < now)
+            .distinct()
+            .limit(batch_size)
+        ).scalars().all()
+        if not order_ids:
+            return cancelled
+
+        release_reservations(order_ids)
+        expired = db.session.execute(
+            update(Order)
+            .where(Order.id.in_(order_ids), Order.status == 'pending')
+            .values(status='cancelled')
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        record_status_change(db.session, expired, 'cancelled')
+        db.session.commit()
+        cancelled += len(expired)
+
+
+def run_sweeper(interval):
+    """Sweeps every `interval` seconds until interrupted."""
+    while True:
+        cancelled = sweep_expired_reservations()
+        if cancelled:
+            current_app.logger.info(f"Released stock for {cancelled} expired orders")
+        time.sleep(interval)
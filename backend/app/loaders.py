@@ -0,0 +1,25 @@
+from sqlalchemy.orm import joinedload, selectinload
+from .models import Shoe, Cart, Order, OrderItem
+
+# --- EAGER LOADING STRATEGIES ---
+# Loader options for the read paths that walk relationships. Without them each
+# cart row lazily loads its shoe, and each order lazily loads its items, their
+# carts, their shoes and its payment, one query per object.
+
+
+def cart_for_display():
+    """Cart rows with their shoe joined in; the size inventory isn't serialized."""
+    return joinedload(Cart.shoe).lazyload(Shoe.size_inventory)
+
+
+def cart_for_checkout():
+    """Cart rows with their shoe joined in and its size inventory in one extra query."""
+    return joinedload(Cart.shoe).selectinload(Shoe.size_inventory)
+
+
+def order_details():
+    """An order's items -> cart -> shoe and its payment, in two extra queries."""
+    return (
+        selectinload(Order.items).joinedload(OrderItem.cart).joinedload(Cart.shoe).lazyload(Shoe.size_inventory),
+        selectinload(Order.payment),
+    )
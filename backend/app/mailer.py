@@ -0,0 +1,143 @@
+import json
+import smtplib
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message, BadHeaderError
+from sqlalchemy import select, update
+from .extensions import db, mail
+from .models import EmailMessage
+
+# --- OUTBOUND MAIL QUEUE ---
+# Requests queue mail with queue_email() in their own transaction and return;
+# nothing talks SMTP inside a request. The mail worker (`flask mail send
+# --loop`) claims due messages in batches, like the outbox dispatcher, and
+# sends a whole drain over one SMTP connection (one TCP + TLS handshake and
+# login instead of one per message).
+#
+# Temporary failures (connection problems, 4xx replies) are retried with
+# exponential backoff up to MAIL_MAX_ATTEMPTS; permanent ones (5xx replies,
+# refused recipients, bad headers) fail the message at once.
+
+
+class _ConnectionLost(Exception):
+    pass
+
+
+def queue_email(subject, recipients, body):
+    """Adds a message to the current transaction; the mail worker sends it once that commits."""
+    message = EmailMessage(subject=subject, recipients=json.dumps(recipients), body=body)
+    db.session.add(message)
+    return message
+
+
+def _claim(batch_size, now):
+    """Leases up to batch_size due messages to this worker."""
+    lease = timedelta(seconds=current_app.config['MAIL_LEASE_SECONDS'])
+    due = (EmailMessage.status.in_(['pending', 'sending'])) & (EmailMessage.available_at <= now)
+    candidates = select(EmailMessage.id).where(due).order_by(EmailMessage.id).limit(batch_size)
+    rows = db.session.execute(
+        update(EmailMessage)
+        .where(EmailMessage.id.in_(candidates.scalar_subquery()), due)
+        .values(status='sending', available_at=now + lease, attempts=EmailMessage.attempts + 1)
+        .returning(EmailMessage.id, EmailMessage.subject, EmailMessage.recipients,
+                   EmailMessage.body, EmailMessage.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _finish(updates):
+    """Records a batch's outcomes in one transaction: {message id: column values}."""
+    for message_id, values in updates.items():
+        db.session.execute(
+            update(EmailMessage).where(EmailMessage.id == message_id).values(**values)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+
+
+def _retry_or_fail(row, error, now):
+    config = current_app.config
+    if row.attempts < config['MAIL_MAX_ATTEMPTS']:
+        delay = config['MAIL_RETRY_BACKOFF'] * 2 ** (row.attempts - 1)
+        return 'retry', {'status': 'pending', 'available_at': now + timedelta(seconds=delay), 'last_error': str(error)}
+    current_app.logger.error(f"Email {row.id} failed after {row.attempts} attempts: {error}")
+    return 'failed', {'status': 'failed', 'last_error': str(error)}
+
+
+def _is_permanent(error):
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, BadHeaderError, AssertionError)):
+        return True
+    code = getattr(error, 'smtp_code', None)
+    return code is not None and 500 <= code < 600
+
+
+def _send_batch(connection, rows, outcomes):
+    now = datetime.utcnow()
+    updates = {}
+    for i, row in enumerate(rows):
+        message = Message(subject=row.subject, recipients=json.loads(row.recipients), body=row.body,
+                          sender=current_app.config.get('MAIL_DEFAULT_SENDER'))
+        try:
+            connection.send(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused, BadHeaderError, AssertionError) as e:
+            if _is_permanent(e):
+                current_app.logger.error(f"Email {row.id} rejected: {e}")
+                outcome, updates[row.id] = 'failed', {'status': 'failed', 'last_error': str(e)}
+            else:
+                outcome, updates[row.id] = _retry_or_fail(row, e, now)
+        except OSError as e:
+            # The connection is gone (SMTPServerDisconnected, reset, timeout):
+            # this and the rest of the batch go back in the queue
+            for pending in rows[i:]:
+                outcome, updates[pending.id] = _retry_or_fail(pending, e, now)
+                outcomes[outcome] += 1
+            _finish(updates)
+            if connection.host is not None:
+                # Drop it without the QUIT that closing the connection would send
+                connection.host.close()
+                connection.host = None
+            raise _ConnectionLost(str(e))
+        else:
+            outcome, updates[row.id] = 'sent', {'status': 'sent', 'sent_at': now, 'last_error': None}
+        outcomes[outcome] += 1
+    _finish(updates)
+
+
+def send_pending(batch_size=50):
+    """Sends every due message over one SMTP connection. Returns a dict of outcome -> count."""
+    outcomes = {'sent': 0, 'retry': 0, 'failed': 0}
+    rows = _claim(batch_size, datetime.utcnow())
+    if not rows:
+        return outcomes
+
+    try:
+        with mail.connect() as connection:
+            while rows:
+                _send_batch(connection, rows, outcomes)
+                rows = _claim(batch_size, datetime.utcnow())
+    except _ConnectionLost:
+        pass
+    except OSError as e:
+        # Couldn't connect, start TLS or log in (smtplib errors are
+        # OSErrors): nothing in this batch was sent
+        current_app.logger.warning(f"SMTP connection failed: {e}")
+        now = datetime.utcnow()
+        updates = {}
+        for row in rows:
+            outcome, updates[row.id] = _retry_or_fail(row, e, now)
+            outcomes[outcome] += 1
+        _finish(updates)
+    return outcomes
+
+
+def run_mailer(interval, batch_size=50):
+    """Sends due mail, then polls every `interval` seconds until interrupted."""
+    while True:
+        outcomes = send_pending(batch_size)
+        if any(outcomes.values()):
+            current_app.logger.info(f"Mail: {outcomes}")
+        db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,149 @@
+import atexit
+import hmac
+import os
+import time
+from flask import Response, current_app, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+
+# --- PROMETHEUS METRICS ---
+# Served at /metrics in the Prometheus text format. Each gunicorn worker (and
+# each worker command) only sees its own numbers, so in production set
+# PROMETHEUS_MULTIPROC_DIR to an empty directory shared by every process on
+# the host, before they start: metric values then live in memory-mapped
+# files there, and /metrics adds them up across processes (gunicorn.conf.py
+# cleans up after exited workers). Empty the directory on each deploy.
+#
+# Outside debug/testing, and whenever PROMETHEUS_MULTIPROC_DIR is set (i.e.
+# production), /metrics requires METRICS_TOKEN as a bearer token and answers
+# 401 until one is configured: it lists every endpoint and business counter.
+#
+# On the request path the cost is a dict lookup for the cached label set plus
+# one histogram update; its _count doubles as the response counter per status
+# (benchmarks/metrics_overhead.py).
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response (a streamed body is not included)',
+    ['blueprint', 'endpoint', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out_connections', 'Connections currently checked out of the pool',
+    ['bind'], multiprocess_mode='livesum',
+)
+DB_POOL_OPEN = Gauge(
+    'db_pool_open_connections', 'Connections currently open (checked out or idle in the pool)',
+    ['bind'], multiprocess_mode='livesum',
+)
+
+GATEWAY_LATENCY = Histogram(
+    'gateway_request_duration_seconds', 'Latency of M-Pesa and PayPal API calls (including failed ones)',
+    ['gateway', 'operation'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+CHECKOUTS = Counter('checkouts', 'Checkout attempts by payment method and outcome', ['method', 'outcome'])
+MPESA_CALLBACKS = Counter('mpesa_callbacks', 'M-Pesa callbacks received, by whether they were new', ['result'])
+MPESA_CALLBACKS_APPLIED = Counter('mpesa_callbacks_applied', 'Stored M-Pesa callbacks applied to orders', ['result'])
+RECEIPT_RENDERS = Counter('receipt_renders', 'Receipt PDFs rendered')
+RATE_LIMIT_REJECTIONS = Counter('rate_limit_rejections', 'Requests refused with 429, by limit and client kind (ip/user)',
+                                ['limit', 'client'])
+PASSWORD_HASHES_SHED = Counter('password_hashes_shed', 'Password hashes/checks refused because the hashing pool was full')
+CATALOG_CACHE_EVENTS = Counter('catalog_cache_events', 'Catalog response cache lookups and removals, by event '
+                               '(hit, miss, eviction, expiration, revalidated)', ['event'])
+
+RECONCILE_BACKLOG = Gauge(
+    'mpesa_reconcile_backlog_orders', 'Stale pending orders awaiting reconciliation, as of the last reconciler run',
+    multiprocess_mode='mostrecent',
+)
+RECONCILE_BATCH_DURATION = Histogram(
+    'mpesa_reconcile_batch_duration_seconds', 'Time to query and settle one reconciliation batch',
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+RECONCILED_ORDERS = Counter('mpesa_reconciled_orders', 'Stale pending orders queried by the reconciler, by outcome',
+                            ['outcome'])
+
+# Label lookups take a lock; the request path reuses the children instead
+_request_children = {}
+_gateway_children = {}
+
+
+def gateway_timer(gateway, operation):
+    """Context manager observing the block's duration as one call to the gateway."""
+    child = _gateway_children.get((gateway, operation))
+    if child is None:
+        child = _gateway_children[(gateway, operation)] = GATEWAY_LATENCY.labels(gateway, operation)
+    return child.time()
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+
+
+def _observe_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    # One proxy lookup instead of one per attribute
+    req = request._get_current_object()
+    key = (req.endpoint, req.method, response.status_code)
+    child = _request_children.get(key)
+    if child is None:
+        # Unmatched URLs share one label so scanners can't blow up the series count
+        child = _request_children[key] = REQUEST_LATENCY.labels(
+            req.blueprint or '', req.endpoint or 'unmatched', req.method, str(response.status_code),
+        )
+    child.observe(time.perf_counter() - started)
+    return response
+
+
+def metrics_authorized():
+    """Whether the request may read metrics (see the METRICS_TOKEN note above)."""
+    token = current_app.config['METRICS_TOKEN']
+    if not token:
+        return (current_app.debug or current_app.testing) and not os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+
+
+def metrics_view():
+    if not metrics_authorized():
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def _track_pool(engine, bind):
+    checked_out = DB_POOL_CHECKED_OUT.labels(bind)
+    open_connections = DB_POOL_OPEN.labels(bind)
+    event.listen(engine, 'connect', lambda *args: open_connections.inc())
+    event.listen(engine, 'close', lambda *args: open_connections.dec())
+    event.listen(engine, 'close_detached', lambda *args: open_connections.dec())
+    event.listen(engine, 'checkout', lambda *args: checked_out.inc())
+    event.listen(engine, 'checkin', lambda *args: checked_out.dec())
+
+
+def _mark_process_dead():
+    multiprocess.mark_process_dead(os.getpid())
+
+
+def init_metrics(app, db):
+    if not app.config['METRICS_ENABLED']:
+        return
+    with app.app_context():
+        for bind, engine in db.engines.items():
+            _track_pool(engine, bind or 'default')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        # Drop this process's live gauges (pool usage) when it exits
+        atexit.unregister(_mark_process_dead)
+        atexit.register(_mark_process_dead)
+    app.before_request(_start_timer)
+    app.after_request(_observe_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
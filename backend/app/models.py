@@ -1,5 +1,7 @@
 from .extensions import db
 from datetime import datetime
+from sqlalchemy import func, select
+from sqlalchemy.orm import column_property
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -14,10 +16,50 @@ class Shoe(db.Model):
     description = db.Column(db.Text, nullable=False)
     price = db.Column(db.Float, nullable=False)
     details = db.Column(db.Text, nullable=False)
-    sizes = db.Column(db.String(100), nullable=False)
     image = db.Column(db.String(200), nullable=False)
     rating = db.Column(db.Float, nullable=False)
-    stock = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        # Keyset pagination sorts on (key, id)
+        db.Index('ix_shoe_price_id', 'price', 'id'),
+        db.Index('ix_shoe_rating_id', 'rating', 'id'),
+        # Brand filter, optionally with a price range or price sort
+        db.Index('ix_shoe_brand_price', 'brand', 'price'),
+    )
+
+    def size_entry(self, size):
+        """Returns the ShoeSize row for the given size, or None if the shoe doesn't come in it."""
+        return next((entry for entry in self.size_inventory if entry.size == str(size)), None)
+
+class ShoeSize(db.Model):
+    # Stock is tracked per size; Shoe.stock is the sum across all sizes.
+    id = db.Column(db.Integer, primary_key=True)
+    shoe_id = db.Column(db.Integer, db.ForeignKey('shoe.id'), nullable=False)
+    size = db.Column(db.String(10), nullable=False)
+    stock = db.Column(db.Integer, nullable=False, default=0)
+    shoe = db.relationship('Shoe', backref=db.backref(
+        'size_inventory', lazy='selectin', order_by='ShoeSize.id', cascade='all, delete-orphan'
+    ))
+
+    __table_args__ = (
+        db.UniqueConstraint('shoe_id', 'size', name='uq_shoe_size_shoe_id_size'),
+        # Serves the size filter: size -> matching shoe ids without touching the table
+        db.Index('ix_shoe_size_size_shoe_id', 'size', 'shoe_id'),
+    )
+
+Shoe.stock = column_property(
+    select(func.coalesce(func.sum(ShoeSize.stock), 0))
+    .where(ShoeSize.shoe_id == Shoe.id)
+    .correlate_except(ShoeSize)
+    .scalar_subquery()
+)
+
+class CatalogChange(db.Model):
+    # Append-only log of shoe ids touched by a write. Workers replay it to keep
+    # their in-memory catalog structures (e.g. the facet index) up to date.
+    id = db.Column(db.Integer, primary_key=True)
+    shoe_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
 class Cart(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -29,6 +71,13 @@ class Cart(db.Model):
     shoe = db.relationship('Shoe', backref=db.backref('carts', lazy=True))
     user = db.relationship('User', backref=db.backref('cart_items', lazy=True))
 
+    __table_args__ = (
+        # Cart view and checkout: a user's unpaid items
+        db.Index('ix_cart_user_id_paid', 'user_id', 'paid'),
+        # Add to cart: the user's unpaid row for this shoe and size
+        db.Index('ix_cart_user_id_shoe_id_size_paid', 'user_id', 'shoe_id', 'size', 'paid'),
+    )
+
 class Order(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -37,25 +86,116 @@ class Order(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # --- M-PESA RELATED ---
-    checkout_request_id = db.Column(db.String(100), nullable=True)
+    checkout_request_id = db.Column(db.String(100), nullable=True, unique=True, index=True)
 
     # --- PAYPAL FIELD ---
-    paypal_order_id = db.Column(db.String(100), nullable=True)
+    paypal_order_id = db.Column(db.String(100), nullable=True, index=True)
+
+    # --- RECEIPT ---
+    # SHA-256 of the stored receipt PDF (see app/receipts.py)
+    receipt_sha256 = db.Column(db.String(64), nullable=True)
 
     user = db.relationship('User', backref=db.backref('orders', lazy=True))
 
+    __table_args__ = (
+        # Order history: a user's orders, newest first
+        db.Index('ix_order_user_id_created_at', 'user_id', 'created_at'),
+        # Reconciler: stale pending orders
+        db.Index('ix_order_status_created_at', 'status', 'created_at'),
+    )
+
+class OrderEvent(db.Model):
+    # Committed order status changes, written in the same transaction. Each
+    # web process polls it to pass changes made elsewhere to its status streams.
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     cart_id = db.Column(db.Integer, db.ForeignKey('cart.id'), nullable=False)
     order = db.relationship('Order', backref=db.backref('items', lazy=True))
     cart = db.relationship('Cart', backref=db.backref('order_items', lazy=True))
 
 class Payment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     mpesa_code = db.Column(db.String(50), nullable=False)
     amount = db.Column(db.Float, nullable=False)
     phone_number = db.Column(db.String(20), nullable=False)
     transaction_date = db.Column(db.DateTime, nullable=False)
-    order = db.relationship('Order', backref=db.backref('payment', uselist=False))
\ No newline at end of file
+    order = db.relationship('Order', backref=db.backref('payment', uselist=False))
+class StockReservation(db.Model):
+    # Units held for a pending order. They are taken off ShoeSize.stock when the
+    # reservation is made; the reservation is then either committed (payment
+    # received) or released (payment failed or it expired), which puts them back.
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
+    shoe_size_id = db.Column(db.Integer, db.ForeignKey('shoe_size.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='held')
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    order = db.relationship('Order', backref=db.backref('reservations', lazy=True))
+
+    __table_args__ = (
+        # Serves the sweeper: held reservations past their expiry
+        db.Index('ix_stock_reservation_status_expires_at', 'status', 'expires_at'),
+    )
+
+class OutboxMessage(db.Model):
+    # Side effects (e.g. gateway calls) written in the same transaction as the
+    # change that causes them, and carried out afterwards by the dispatcher.
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Serves the dispatcher: due pending messages in id order
+        db.Index('ix_outbox_message_status_available_at', 'status', 'available_at'),
+    )
+
+class MpesaCallback(db.Model):
+    # Raw STK callbacks as received, acknowledged at once and applied to their
+    # order afterwards. One row per CheckoutRequestID: Safaricom's retries of
+    # the same callback are dropped on insert.
+    id = db.Column(db.Integer, primary_key=True)
+    checkout_request_id = db.Column(db.String(100), nullable=True, unique=True, index=True)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='received')
+    error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+class Subscriber(db.Model):
+    # Newsletter subscribers
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    subscribed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class EmailMessage(db.Model):
+    # Outbound mail, queued by requests and sent in batches by the mail worker
+    # over one SMTP connection.
+    id = db.Column(db.Integer, primary_key=True)
+    recipients = db.Column(db.Text, nullable=False)  # JSON list
+    subject = db.Column(db.String(255), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        # Serves the mail worker: due pending messages in id order
+        db.Index('ix_email_message_status_available_at', 'status', 'available_at'),
+    )
@@ -0,0 +1,137 @@
+import json
+from datetime import datetime
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from .extensions import db
+from .models import Order, Payment, MpesaCallback
+from .inventory import commit_reservations, release_reservations
+from .outbox import enqueue, outbox_handler, RetryLater
+from .receipts import queue_receipt
+from .metrics import MPESA_CALLBACKS_APPLIED
+
+# --- M-PESA CALLBACK INGESTION ---
+# The callback endpoint only stores the raw body (plus an outbox message) and
+# acknowledges, so Safaricom never waits on our order processing. The outbox
+# dispatcher then applies each stored callback to its order exactly once:
+# the callback row is claimed with a conditional UPDATE (received ->
+# processed) in the same transaction as the order changes, and the unique
+# CheckoutRequestID index drops duplicate deliveries at insert time.
+
+
+class UnmatchedCallback(Exception):
+    """No order has the callback's CheckoutRequestID (yet)."""
+
+
+def _checkout_request_id(raw):
+    try:
+        return json.loads(raw)['Body']['stkCallback']['CheckoutRequestID']
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+def store_callback(raw):
+    """
+    Durably records a callback body and queues it for processing. Returns the
+    stored MpesaCallback, or None if this CheckoutRequestID was already received.
+    """
+    callback = MpesaCallback(checkout_request_id=_checkout_request_id(raw), payload=raw)
+    db.session.add(callback)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    enqueue('mpesa_callback', {'callback_id': callback.id})
+    db.session.commit()
+    return callback
+
+
+def _metadata_value(metadata, name, default=None):
+    return next((item['Value'] for item in metadata if item['Name'] == name), default)
+
+
+def apply_callback(callback_id):
+    """
+    Applies a stored callback to its order unless it has already been applied.
+    Doesn't commit. Returns 'completed', 'cancelled' or 'skipped'; raises
+    UnmatchedCallback if no order matches.
+    """
+    claimed = db.session.execute(
+        update(MpesaCallback)
+        .where(MpesaCallback.id == callback_id, MpesaCallback.status == 'received')
+        .values(status='processed', processed_at=datetime.utcnow(), error=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if not claimed:
+        return 'skipped'
+
+    callback = db.session.get(MpesaCallback, callback_id)
+    stk_callback = json.loads(callback.payload)['Body']['stkCallback']
+    order = Order.query.filter_by(checkout_request_id=stk_callback['CheckoutRequestID']).first()
+    if not order:
+        raise UnmatchedCallback(f"No order for CheckoutRequestID {stk_callback['CheckoutRequestID']}")
+
+    if stk_callback['ResultCode'] == 0:
+        # Payment was successful (also after the sweeper cancelled the order:
+        # the customer has paid, so the sale stands)
+        if order.payment is None:
+            metadata = stk_callback['CallbackMetadata']['Item']
+            tx_date_str = str(_metadata_value(metadata, 'TransactionDate', ''))
+            db.session.add(Payment(
+                order_id=order.id,
+                mpesa_code=str(_metadata_value(metadata, 'MpesaReceiptNumber')),
+                amount=float(_metadata_value(metadata, 'Amount', 0)),
+                phone_number=str(_metadata_value(metadata, 'PhoneNumber', '')),
+                transaction_date=datetime.strptime(tx_date_str, '%Y%m%d%H%M%S'),
+            ))
+        order.status = 'completed'
+        commit_reservations(order.id)
+        queue_receipt(order.id)
+        return 'completed'
+
+    # Payment failed or was cancelled, put the reserved stock back
+    if order.status == 'pending':
+        order.status = 'cancelled'
+        release_reservations([order.id])
+    return 'cancelled'
+
+
+def mark_callback_failed(payload, error):
+    db.session.execute(
+        update(MpesaCallback)
+        .where(MpesaCallback.id == payload['callback_id'])
+        .values(status='failed', error=str(error), processed_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+@outbox_handler('mpesa_callback', on_failure=mark_callback_failed)
+def process_callback(payload):
+    try:
+        MPESA_CALLBACKS_APPLIED.labels(apply_callback(payload['callback_id'])).inc()
+    except UnmatchedCallback as e:
+        # The dispatcher may not have stored the CheckoutRequestID yet
+        raise RetryLater(str(e))
+
+
+def replay_callbacks(callbacks):
+    """
+    Re-applies stored callbacks one transaction each, e.g. after a fix or for
+    ones that failed. Already-applied effects are not repeated. Returns a dict
+    of outcome -> count.
+    """
+    outcomes = {'completed': 0, 'cancelled': 0, 'skipped': 0, 'failed': 0}
+    for callback_id in callbacks:
+        db.session.execute(
+            update(MpesaCallback).where(MpesaCallback.id == callback_id).values(status='received')
+            .execution_options(synchronize_session=False)
+        )
+        try:
+            outcomes[apply_callback(callback_id)] += 1
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            mark_callback_failed({'callback_id': callback_id}, e)
+            db.session.commit()
+            outcomes['failed'] += 1
+    return outcomes
@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 import logging
 import logging.handlers
 import re
+from app.http_clients import TokenCache, build_session
+from app.metrics import gateway_timer
+from app.profiling import phase
 
 # Set up logging
 log_dir = 'logs'
@@ -55,18 +58,45 @@ class MpesaHandler:
             logger.error(f"Invalid CALLBACK_URL: {self.callback_url}. Must be HTTPS.")
             raise ValueError("CALLBACK_URL must be a valid HTTPS URL")
 
-    def get_access_token(self):
+        # One pooled session and one token per process, shared by all threads
+        self.session = build_session(pool_size=int(os.getenv('MPESA_POOL_SIZE', 10)))
+        self.token_cache = TokenCache(
+            refresh_margin=int(os.getenv('MPESA_TOKEN_REFRESH_MARGIN', 60)),
+            path=os.getenv('MPESA_TOKEN_CACHE_FILE') or None,
+        )
+
+    def fetch_access_token(self):
+        """Requests a new token; returns (token, seconds until it expires)."""
         url = f'{self.api_url}/oauth/v1/generate?grant_type=client_credentials'
         credentials = base64.b64encode(f"{self.consumer_key}:{self.consumer_secret}".encode()).decode()
         headers = {'Authorization': f'Basic {credentials}'}
         try:
-            response = requests.get(url, headers=headers, timeout=10)
+            with phase('mpesa'), gateway_timer('mpesa', 'oauth'):
+                response = self.session.get(url, headers=headers, timeout=10)
             response.raise_for_status()
-            return response.json()['access_token']
+            data = response.json()
+            return data['access_token'], int(data.get('expires_in', 3599))
         except requests.RequestException as e:
             logger.error(f"Failed to get access token: {e}")
             raise
 
+    def get_access_token(self):
+        return self.token_cache.get(self.fetch_access_token)
+
+    def _post(self, path, payload, timeout):
+        """POSTs with the cached token, fetching a new one once if it was rejected."""
+        for attempt in range(2):
+            headers = {'Authorization': f'Bearer {self.get_access_token()}', 'Content-Type': 'application/json'}
+            # e.g. /mpesa/stkpush/v1/processrequest -> stkpush
+            with phase('mpesa'), gateway_timer('mpesa', path.split('/')[2]):
+                response = self.session.post(f'{self.api_url}{path}', json=payload, headers=headers, timeout=timeout)
+            if response.status_code == 401 and attempt == 0:
+                logger.info("Access token rejected; fetching a new one")
+                self.token_cache.invalidate()
+                continue
+            response.raise_for_status()
+            return response.json()
+
     def generate_password(self):
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         data = f'{self.short_code}{self.pass_key}{timestamp}'
@@ -74,9 +104,7 @@ class MpesaHandler:
 
     def initiate_stk_push(self, phone_number, amount, order_id, callback_url):
         try:
-            access_token = self.get_access_token()
             password, timestamp = self.generate_password()
-            headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
             payload = {
                 'BusinessShortCode': self.short_code,
                 'Password': password,
@@ -91,22 +119,13 @@ class MpesaHandler:
                 'TransactionDesc': 'Shoe Purchase'
             }
             logger.debug(f"Sending STK Push request: {payload}")
-            response = requests.post(
-                f'{self.api_url}/mpesa/stkpush/v1/processrequest',
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post('/mpesa/stkpush/v1/processrequest', payload, timeout=30)
         except requests.RequestException as e:
             logger.error(f"STK Push request failed: {e}")
             raise
 
     def register_c2b_urls(self):
         try:
-            access_token = self.get_access_token()
-            headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
             payload = {
                 'ShortCode': self.short_code,
                 'ValidationURL': self.callback_url.replace('callback', 'validation'),
@@ -114,22 +133,13 @@ class MpesaHandler:
                 'ResponseType': 'Completed'
             }
             logger.debug(f"Registering C2B URLs: {payload}")
-            response = requests.post(
-                f'{self.api_url}/mpesa/c2b/v1/registerurl',
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post('/mpesa/c2b/v1/registerurl', payload, timeout=10)
         except requests.RequestException as e:
             logger.error(f"C2B URL registration failed: {e}")
             raise
 
     def query_transaction_status(self, checkout_request_id):
         try:
-            access_token = self.get_access_token()
-            headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             password = base64.b64encode(f"{self.short_code}{self.pass_key}{timestamp}".encode()).decode()
             payload = {
@@ -145,22 +155,34 @@ class MpesaHandler:
                 'Occasion': 'Order Status'
             }
             logger.debug(f"Querying transaction status: {payload}")
-            response = requests.post(
-                f'{self.api_url}/mpesa/transactionstatus/v1/query',
-                json=payload,
-                headers=headers,
-                timeout=10
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post('/mpesa/transactionstatus/v1/query', payload, timeout=10)
         except requests.RequestException as e:
             logger.error(f"Transaction status query failed: {e}")
             raise
 
+    def query_stk_status(self, checkout_request_id):
+        """
+        Asks for the outcome of an STK push (STK Push Query API). Unlike the
+        transaction status API the result comes back in the response: ResultCode
+        '0' means paid. While the customer hasn't answered, Safaricom replies
+        with an HTTP error ("The transaction is being processed").
+        """
+        try:
+            password, timestamp = self.generate_password()
+            payload = {
+                'BusinessShortCode': self.short_code,
+                'Password': password,
+                'Timestamp': timestamp,
+                'CheckoutRequestID': checkout_request_id
+            }
+            logger.debug(f"Querying STK push status: {checkout_request_id}")
+            return self._post('/mpesa/stkpushquery/v1/query', payload, timeout=10)
+        except requests.RequestException as e:
+            logger.error(f"STK push query failed: {e}")
+            raise
+
     def initiate_b2c_refund(self, phone_number, amount, transaction_id, reason):
         try:
-            access_token = self.get_access_token()
-            headers = {'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json'}
             timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
             payload = {
                 'Initiator': self.initiator_name,
@@ -175,14 +197,7 @@ class MpesaHandler:
                 'Occasion': f'Refund for {transaction_id}'
             }
             logger.debug(f"Sending B2C refund request: {payload}")
-            response = requests.post(
-                f'{self.api_url}/mpesa/b2c/v1/paymentrequest',
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            return response.json()
+            return self._post('/mpesa/b2c/v1/paymentrequest', payload, timeout=30)
         except requests.RequestException as e:
             logger.error(f"B2C refund request failed: {e}")
             raise
\ No newline at end of file
@@ -0,0 +1,266 @@
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect, select
+from sqlalchemy.orm import Session
+from .extensions import db
+from .models import Order, OrderEvent
+
+# --- ORDER STATUS NOTIFICATIONS ---
+# Every committed change of an order's status is published on a broker, so
+# the order status stream (GET /api/orders/<id>/events) can wait for it
+# instead of the client polling the order. ORM changes are picked up from the
+# flush; Core UPDATEs (sweeper, reconciler) report theirs with
+# record_status_change(). Nothing is published for transactions that roll back.
+#
+# Brokers: DatabaseBroker (the default) writes each change to the order_event
+# table in the committing transaction, and one listener thread per web process
+# polls it every ORDER_EVENTS_POLL_SECONDS, so changes made by the outbox
+# dispatcher, sweeper and reconciler reach the streams without extra
+# infrastructure. RedisBroker (ORDER_EVENTS_URL=redis://...) pushes them
+# instead. LocalBroker (ORDER_EVENTS_URL=local) delivers within this process
+# only; changes made elsewhere are then found by the stream's periodic status
+# re-check, just later.
+#
+# Every open stream holds a server thread, so each process serves at most
+# ORDER_EVENTS_MAX_STREAMS at once and answers 503 beyond that (the client
+# then falls back to fetching the order).
+
+# Event rows are kept this long, and old ones are pruned every PRUNE_EVERY writes
+EVENT_RETENTION = timedelta(hours=1)
+PRUNE_EVERY = 500
+# Ids can commit out of order on Postgres; each poll re-reads this many below the high-water mark
+EVENT_LOOKBACK = 50
+
+
+class Subscription:
+    """Status updates for one order, in publish order."""
+
+    def __init__(self, close):
+        self._updates = queue.SimpleQueue()
+        self._close = close
+
+    def put(self, status):
+        self._updates.put(status)
+
+    def get(self, timeout):
+        """The next status, or None if none arrived within `timeout` seconds."""
+        try:
+            return self._updates.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class LocalBroker:
+    """In-process pub/sub: publishes reach subscribers in the same worker only."""
+
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, order_id):
+        subscription = Subscription(lambda s: self._unsubscribe(order_id, s))
+        with self._lock:
+            self._subscribers[order_id].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, order_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(order_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[order_id]
+
+    def publish(self, order_id, status):
+        with self._lock:
+            subscribers = list(self._subscribers.get(order_id, ()))
+        for subscription in subscribers:
+            subscription.put(status)
+
+
+class DatabaseBroker:
+    """Cross-process pub/sub over the order_event table, polled by one listener thread per process."""
+
+    def __init__(self, app, interval):
+        self._app = app
+        self._interval = interval
+        self._local = LocalBroker()
+        self._lock = threading.Lock()
+        self._listener = None
+        self._last_id = None
+        self._applied = deque(maxlen=EVENT_LOOKBACK * 4)
+
+    def subscribe(self, order_id):
+        self._start_listener()
+        return self._local.subscribe(order_id)
+
+    def publish(self, order_id, status):
+        # The committed order_event row reaches other processes through their listeners
+        self._local.publish(order_id, status)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='order-events', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        while True:
+            with self._app.app_context():
+                try:
+                    self.poll()
+                except Exception as e:
+                    # Streams still re-check the status themselves
+                    self._app.logger.warning(f"Could not poll order events: {e}")
+                finally:
+                    db.session.remove()
+            time.sleep(self._interval)
+
+    def poll(self):
+        """Hands order_event rows committed since the last poll to this process's subscribers."""
+        table = OrderEvent.__table__
+        if self._last_id is None:
+            self._last_id = db.session.execute(select(func.max(table.c.id))).scalar() or 0
+            return
+
+        events = db.session.execute(
+            select(table.c.id, table.c.order_id, table.c.status)
+            .where(table.c.id > self._last_id - EVENT_LOOKBACK)
+            .order_by(table.c.id)
+        ).all()
+        applied = set(self._applied)
+        for event_id, order_id, status in events:
+            if event_id in applied:
+                continue
+            self._applied.append(event_id)
+            self._last_id = max(self._last_id, event_id)
+            self._local.publish(order_id, status)
+
+
+class RedisBroker:
+    """Cross-worker pub/sub over Redis channels (needs the `redis` package)."""
+
+    CHANNEL = 'order-status:{}'
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("ORDER_EVENTS_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+
+    def subscribe(self, order_id):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.CHANNEL.format(order_id))
+        return _RedisSubscription(pubsub)
+
+    def publish(self, order_id, status):
+        self.client.publish(self.CHANNEL.format(order_id), status)
+
+
+class _RedisSubscription(Subscription):
+
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        return message['data'].decode() if message else None
+
+    def close(self):
+        self._pubsub.close()
+
+
+_create_lock = threading.Lock()
+_events_written = 0
+
+
+def get_order_events():
+    """Returns this worker's order status broker for the current app, creating it on first use."""
+    broker = current_app.extensions.get('order_events')
+    if broker is None:
+        with _create_lock:
+            broker = current_app.extensions.get('order_events')
+            if broker is None:
+                url = current_app.config['ORDER_EVENTS_URL']
+                if url == 'local':
+                    broker = LocalBroker()
+                elif url:
+                    broker = RedisBroker(url)
+                else:
+                    broker = DatabaseBroker(current_app._get_current_object(),
+                                            current_app.config['ORDER_EVENTS_POLL_SECONDS'])
+                current_app.extensions['order_events'] = broker
+    return broker
+
+
+def get_stream_slots():
+    """Returns the semaphore limiting this worker's open order status streams."""
+    slots = current_app.extensions.get('order_event_streams')
+    if slots is None:
+        with _create_lock:
+            slots = current_app.extensions.get('order_event_streams')
+            if slots is None:
+                slots = threading.BoundedSemaphore(current_app.config['ORDER_EVENTS_MAX_STREAMS'])
+                current_app.extensions['order_event_streams'] = slots
+    return slots
+
+
+def record_status_change(session, order_ids, status):
+    """Notes status changes made outside the ORM; they're published when the session commits."""
+    changes = session.info.setdefault('order_status_changes', {})
+    for order_id in order_ids:
+        changes[order_id] = status
+    if order_ids and has_app_context() and isinstance(get_order_events(), DatabaseBroker):
+        _write_events(session, order_ids, status)
+
+
+def _write_events(session, order_ids, status):
+    global _events_written
+    table = OrderEvent.__table__
+    connection = session.connection()
+    connection.execute(table.insert(), [{'order_id': order_id, 'status': status} for order_id in order_ids])
+
+    _events_written += 1
+    if _events_written >= PRUNE_EVERY:
+        _events_written = 0
+        connection.execute(table.delete().where(table.c.created_at < datetime.utcnow() - EVENT_RETENTION))
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_status_changes(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, Order) and inspect(obj).attrs.status.history.has_changes():
+            record_status_change(session, [obj.id], obj.status)
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_status_changes(session):
+    changes = session.info.pop('order_status_changes', None)
+    if not changes or not has_app_context():
+        return
+    broker = get_order_events()
+    for order_id, status in changes.items():
+        try:
+            broker.publish(order_id, status)
+        except Exception as e:
+            # Streams fall back to re-checking the status, so a lost notification only delays them
+            current_app.logger.warning(f"Could not publish status of order {order_id}: {e}")
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_status_changes(session):
+    session.info.pop('order_status_changes', None)
@@ -0,0 +1,135 @@
+import json
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, update
+from .extensions import db
+from .models import OutboxMessage
+
+# --- TRANSACTIONAL OUTBOX ---
+# A request that needs a slow external call (e.g. the M-Pesa STK push) writes
+# an outbox message in its own transaction and returns. The dispatcher process
+# (`flask outbox dispatch --loop`) claims due messages, runs the registered
+# handler outside any request, and records the outcome together with the
+# handler's own writes in one commit.
+#
+# Claiming sets a lease (OUTBOX_LEASE_SECONDS): if a dispatcher dies mid-call
+# the message becomes due again once the lease runs out, so delivery is
+# at-least-once and handlers should tolerate a repeat. A batch is claimed at
+# once but run one message after another, so each lease is renewed just
+# before its handler runs; a message another dispatcher has reclaimed in the
+# meantime (its attempt count moved on) is skipped rather than sent twice.
+
+_handlers = {}
+
+
+class RetryLater(Exception):
+    """Raised by a handler when the call certainly didn't happen and can be retried."""
+
+
+def outbox_handler(kind, on_failure=None):
+    """
+    Registers the handler for a message kind. `on_failure(payload, error)` is
+    called (and committed) when the message fails for good.
+    """
+    def decorator(handler):
+        _handlers[kind] = (handler, on_failure)
+        return handler
+    return decorator
+
+
+def enqueue(kind, payload):
+    """Adds a message to the current transaction; it is dispatched once that commits."""
+    message = OutboxMessage(kind=kind, payload=json.dumps(payload))
+    db.session.add(message)
+    return message
+
+
+def _claim(batch_size, now):
+    """Leases up to batch_size due messages to this dispatcher."""
+    lease = timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+    due = (
+        (OutboxMessage.status.in_(['pending', 'processing'])) & (OutboxMessage.available_at <= now)
+    )
+    candidates = select(OutboxMessage.id).where(due).order_by(OutboxMessage.id).limit(batch_size)
+    rows = db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id.in_(candidates.scalar_subquery()), due)
+        .values(status='processing', available_at=now + lease, attempts=OutboxMessage.attempts + 1)
+        .returning(OutboxMessage.id, OutboxMessage.kind, OutboxMessage.payload, OutboxMessage.attempts)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.session.commit()
+    return sorted(rows, key=lambda row: row.id)
+
+
+def _renew_lease(row, now):
+    """Restarts the lease on a claimed message; False if another dispatcher has claimed it since."""
+    lease = timedelta(seconds=current_app.config['OUTBOX_LEASE_SECONDS'])
+    renewed = db.session.execute(
+        update(OutboxMessage)
+        .where(OutboxMessage.id == row.id, OutboxMessage.status == 'processing',
+               OutboxMessage.attempts == row.attempts)
+        .values(available_at=now + lease)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return bool(renewed)
+
+
+def _finish(message_id, **values):
+    db.session.execute(
+        update(OutboxMessage).where(OutboxMessage.id == message_id).values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def _process(row):
+    handler, on_failure = _handlers.get(row.kind, (None, None))
+    payload = json.loads(row.payload)
+    now = datetime.utcnow()
+    try:
+        if handler is None:
+            raise LookupError(f"No outbox handler registered for '{row.kind}'")
+        handler(payload)
+        _finish(row.id, status='sent', processed_at=now, last_error=None)
+        return 'sent'
+    except RetryLater as e:
+        db.session.rollback()
+        if row.attempts < current_app.config['OUTBOX_MAX_ATTEMPTS']:
+            delay = current_app.config['OUTBOX_RETRY_BACKOFF'] * 2 ** (row.attempts - 1)
+            _finish(row.id, status='pending', available_at=now + timedelta(seconds=delay), last_error=str(e))
+            return 'retry'
+        error = e
+    except Exception as e:
+        db.session.rollback()
+        error = e
+
+    current_app.logger.error(f"Outbox message {row.id} ({row.kind}) failed: {error}")
+    if on_failure:
+        on_failure(payload, error)
+    _finish(row.id, status='failed', processed_at=now, last_error=str(error))
+    return 'failed'
+
+
+def dispatch_pending(batch_size=50):
+    """Runs every due message once. Returns a dict of outcome -> count."""
+    outcomes = {'sent': 0, 'retry': 0, 'failed': 0}
+    while True:
+        rows = _claim(batch_size, datetime.utcnow())
+        if not rows:
+            return outcomes
+        for row in rows:
+            if _renew_lease(row, datetime.utcnow()):
+                outcomes[_process(row)] += 1
+
+
+def run_dispatcher(interval, batch_size=50):
+    """Dispatches, then polls every `interval` seconds until interrupted."""
+    while True:
+        outcomes = dispatch_pending(batch_size)
+        if any(outcomes.values()):
+            current_app.logger.info(f"Outbox dispatch: {outcomes}")
+        db.session.remove()
+        time.sleep(interval)
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from sqlalchemy import func, select, tuple_
+
+# --- KEYSET (CURSOR) PAGINATION ---
+# Instead of OFFSET, each page continues from the sort key of the last row of
+# the previous page: WHERE (key, id) > (:last_key, :last_id). With an index on
+# (key, id) every page costs the same, however deep it is. The cursor handed
+# to clients is an opaque base64 token.
+
+MAX_LIMIT = 100
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    # Only what encode_cursor produces gets through to the database driver
+    if isinstance(value, dict):
+        if set(value) != {'dt'} or not isinstance(value['dt'], str):
+            raise ValueError('Unexpected cursor value')
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError('Unexpected cursor value')
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError('Unexpected cursor value')
+    return value
+
+
+def encode_cursor(sort, values):
+    payload = json.dumps({'s': sort, 'v': [_encode_value(v) for v in values]}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sort, length):
+    """
+    Returns the length (key, id) values stored in cursor, checking it was
+    issued for this sort order and holds only values encode_cursor writes.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        issued_for = payload['s']
+        encoded = payload['v']
+        if not isinstance(encoded, list) or len(encoded) != length:
+            raise ValueError('Unexpected number of cursor values')
+        values = [_decode_value(v) for v in encoded]
+    except (binascii.Error, ValueError, KeyError, TypeError) as e:
+        raise PaginationError('Malformed cursor') from e
+    if issued_for != sort:
+        raise PaginationError('Cursor does not match the requested sort order')
+    return values
+
+
+def parse_sort(sort, allowed, default):
+    """
+    Parses a sort parameter such as "price" or "-price" against the allowed
+    {name: column} mapping. Returns (sort, column, descending).
+    """
+    sort = sort or default
+    descending = sort.startswith('-')
+    name = sort[1:] if descending else sort
+    if name not in allowed:
+        raise PaginationError(f"Unsupported sort key '{name}'. Use one of: {', '.join(sorted(allowed))}")
+    return sort, allowed[name], descending
+
+
+def keyset_page(query, id_column, sort_column, descending, sort, cursor=None, limit=20):
+    """
+    Returns (items, next_cursor) for one page of query ordered by
+    (sort_column, id_column). next_cursor is None on the last page.
+    """
+    limit = max(1, min(limit, MAX_LIMIT))
+    columns = [id_column] if sort_column is id_column else [sort_column, id_column]
+
+    if cursor:
+        last_values = decode_cursor(cursor, sort, len(columns))
+        position = tuple_(*columns) if len(columns) > 1 else columns[0]
+        last = tuple_(*last_values) if len(columns) > 1 else last_values[0]
+        query = query.filter(position < last if descending else position > last)
+
+    ordering = [column.desc() if descending else column.asc() for column in columns]
+    rows = query.order_by(None).order_by(*ordering).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor(sort, [getattr(last_row, column.key) for column in columns])
+    return rows, next_cursor
+
+
+def count_total(query, id_column, mode, cap=1000):
+    """
+    Counts the rows of query according to mode:
+    'exact' runs a full COUNT, 'approx' stops counting at cap, anything else skips it.
+    Returns (total, is_exact) or (None, False).
+    """
+    if mode == 'exact':
+        return query.order_by(None).count(), True
+    if mode == 'approx':
+        capped = query.order_by(None).with_entities(id_column).limit(cap + 1).subquery()
+        total = query.session.execute(select(func.count()).select_from(capped)).scalar()
+        return min(total, cap), total <= cap
+    return None, False
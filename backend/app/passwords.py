@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from .extensions import bcrypt
+from .metrics import PASSWORD_HASHES_SHED
+from .profiling import phase
+
+# --- PASSWORD HASHING ---
+# bcrypt is deliberately slow (~250ms of CPU at cost 12). Hashes and checks
+# run on a small per-worker thread pool (bcrypt releases the GIL while it
+# works), so at most PASSWORD_HASH_WORKERS of them burn CPU at once and the
+# worker's other request threads keep serving products and checkout. At most
+# PASSWORD_HASH_QUEUE more may wait; beyond that, or if a job waits longer
+# than PASSWORD_HASH_TIMEOUT, the request is shed with HashingOverloaded
+# instead of piling up.
+#
+# The cost comes from BCRYPT_LOG_ROUNDS. Hashes made at another cost are
+# rehashed at the configured one on the user's next successful login.
+
+
+class HashingOverloaded(Exception):
+    """The hashing pool is saturated; the client should retry later."""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many password operations in progress')
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    def __init__(self, workers, max_queue, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        # Jobs running plus waiting
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.shed = 0
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count_shed()
+            raise HashingOverloaded(retry_after=1)
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            # Includes the wait for a pool thread
+            with phase('bcrypt'):
+                result = future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # Drop it if it hasn't started; a running hash finishes in the background
+            future.cancel()
+            self._count_shed()
+            raise HashingOverloaded(retry_after=max(1, round(self.timeout)))
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def _count_shed(self):
+        PASSWORD_HASHES_SHED.inc()
+        with self._lock:
+            self.shed += 1
+
+    def hash(self, password):
+        return self._run(bcrypt.generate_password_hash, password).decode('utf-8')
+
+    def check(self, password_hash, password):
+        return self._run(bcrypt.check_password_hash, password_hash, password)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {'completed': self.completed, 'shed': self.shed}
+
+
+_create_lock = threading.Lock()
+
+
+def get_password_hasher():
+    """Returns this worker's PasswordHasher for the current app, creating it on first use."""
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        # Concurrent first requests must not each start a pool (doubling the bound)
+        with _create_lock:
+            hasher = current_app.extensions.get('password_hasher')
+            if hasher is None:
+                config = current_app.config
+                hasher = current_app.extensions['password_hasher'] = PasswordHasher(
+                    config['PASSWORD_HASH_WORKERS'], config['PASSWORD_HASH_QUEUE'], config['PASSWORD_HASH_TIMEOUT'],
+                )
+    return hasher
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def needs_rehash(password_hash):
+    """True if the hash was made with another cost than BCRYPT_LOG_ROUNDS."""
+    # Modular crypt format: $2b$<cost>$<salt + hash>
+    try:
+        return int(password_hash.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+    except (IndexError, ValueError):
+        return True
+
+
+def verify_password(user, password):
+    """
+    Checks a user's password and, if it matches but was hashed at another
+    cost, replaces the stored hash (the caller commits).
+    """
+    if not user.password or not get_password_hasher().check(user.password, password):
+        return False
+    if needs_rehash(user.password):
+        try:
+            user.password = hash_password(password)
+        except HashingOverloaded:
+            pass  # Upgrade it on a later login
+    return True
@@ -1,33 +1,93 @@
+import threading
+import time
 import requests
 from flask import current_app
 import certifi # Import the certifi library
+from app.http_clients import TokenCache, CircuitBreaker, CircuitOpenError, OperationMetrics, build_session
+from app.metrics import gateway_timer
+from app.profiling import phase
+
+# One PayPalService per app (see get_paypal_service): the access token, the
+# connection pool, the circuit breaker and the metrics are shared by all
+# requests the worker serves.
 
 class PayPalService:
     def __init__(self):
-        self.client_id = current_app.config['PAYPAL_CLIENT_ID']
-        self.client_secret = current_app.config['PAYPAL_CLIENT_SECRET']
-        self.base_url = current_app.config['PAYPAL_API_BASE']
+        config = current_app.config
+        self.client_id = config['PAYPAL_CLIENT_ID']
+        self.client_secret = config['PAYPAL_CLIENT_SECRET']
+        self.base_url = config['PAYPAL_API_BASE']
+        self.timeout = (config['PAYPAL_CONNECT_TIMEOUT'], config['PAYPAL_READ_TIMEOUT'])
 
-    def get_access_token(self):
-        url = f"{self.base_url}/v1/oauth2/token"
+        self.session = build_session(pool_size=config['PAYPAL_POOL_SIZE'])
+        # --- SECURE FIX ---
+        # Explicitly use certifi's certificate bundle for SSL verification.
+        self.session.verify = certifi.where()
+        self.token_cache = TokenCache(refresh_margin=300)
+        self.breaker = CircuitBreaker(
+            'PayPal',
+            failure_threshold=config['PAYPAL_BREAKER_THRESHOLD'],
+            reset_timeout=config['PAYPAL_BREAKER_RESET_TIMEOUT'],
+        )
+        self.metrics = OperationMetrics()
+
+    def _call(self, operation, method, path, **kwargs):
+        """
+        Sends one API request through the circuit breaker and records its
+        latency and outcome. Connection errors, timeouts and 5xx responses
+        count as breaker failures; 4xx are the caller's problem, not PayPal's.
+        """
+        start = time.perf_counter()
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            self.metrics.record(operation, 0, 'rejected')
+            raise
+
+        try:
+            with phase('paypal'), gateway_timer('paypal', operation):
+                response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            self.metrics.record(operation, time.perf_counter() - start, 'error')
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        self.metrics.record(operation, time.perf_counter() - start, 'error' if response.status_code >= 400 else 'ok')
+        return response
+
+    def fetch_access_token(self):
+        """Requests a new token; returns (token, seconds until it expires)."""
         headers = {'Accept': 'application/json', 'Accept-Language': 'en_US'}
         data = {'grant_type': 'client_credentials'}
         auth = (self.client_id, self.client_secret)
-        
-        # --- SECURE FIX ---
-        # Explicitly use certifi's certificate bundle for SSL verification.
-        response = requests.post(url, headers=headers, data=data, auth=auth, verify=certifi.where())
-        
+        response = self._call('get_access_token', 'POST', '/v1/oauth2/token', headers=headers, data=data, auth=auth)
         response.raise_for_status()
-        return response.json()['access_token']
+        body = response.json()
+        return body['access_token'], int(body.get('expires_in', 32400))
+
+    def get_access_token(self):
+        return self.token_cache.get(self.fetch_access_token)
+
+    def _api_post(self, operation, path, headers=None, **kwargs):
+        """POSTs with the cached token, fetching a new one once if it was rejected."""
+        for attempt in range(2):
+            request_headers = {
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.get_access_token()}',
+                **(headers or {}),
+            }
+            response = self._call(operation, 'POST', path, headers=request_headers, **kwargs)
+            if response.status_code == 401 and attempt == 0:
+                self.token_cache.invalidate()
+                continue
+            response.raise_for_status()
+            return response.json()
 
     def create_order(self, total_amount):
-        access_token = self.get_access_token()
-        url = f"{self.base_url}/v2/checkout/orders"
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {access_token}'
-        }
         payload = {
             "intent": "CAPTURE",
             "purchase_units": [{
@@ -37,23 +97,29 @@ class PayPalService:
                 }
             }]
         }
+        return self._api_post('create_order', '/v2/checkout/orders', json=payload)
 
-        # --- SECURE FIX ---
-        response = requests.post(url, headers=headers, json=payload, verify=certifi.where())
+    def capture_payment(self, paypal_order_id):
+        # The request id makes a repeated capture of the same order a no-op on PayPal's side
+        return self._api_post(
+            'capture_payment', f"/v2/checkout/orders/{paypal_order_id}/capture",
+            headers={'PayPal-Request-Id': f"capture-{paypal_order_id}"},
+        )
 
-        response.raise_for_status()
-        return response.json()
+    def stats(self):
+        return {'circuit': self.breaker.state, 'operations': self.metrics.snapshot()}
 
-    def capture_payment(self, paypal_order_id):
-        access_token = self.get_access_token()
-        url = f"{self.base_url}/v2/checkout/orders/{paypal_order_id}/capture"
-        headers = {
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {access_token}'
-        }
 
-        # --- SECURE FIX ---
-        response = requests.post(url, headers=headers, verify=certifi.where())
-        
-        response.raise_for_status()
-        return response.json()
\ No newline at end of file
+_create_lock = threading.Lock()
+
+
+def get_paypal_service():
+    """Returns this worker's PayPalService for the current app, creating it on first use."""
+    service = current_app.extensions.get('paypal')
+    if service is None:
+        # Concurrent first requests must share one session, token cache and breaker
+        with _create_lock:
+            service = current_app.extensions.get('paypal')
+            if service is None:
+                service = current_app.extensions['paypal'] = PayPalService()
+    return service
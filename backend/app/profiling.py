@@ -0,0 +1,147 @@
+import json
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+# --- REQUEST PROFILING ---
+# Opt-in (PROFILING_ENABLED) per-request timings. Each request gets a
+# Profile that collects time per phase:
+# - db: every SQL statement, from SQLAlchemy's cursor events
+# - serialize, bcrypt, pdf, mpesa, paypal: code wrapped in phase(name)
+#   (compiled schema dumps, the password pool, receipt rendering and the
+#   gateway HTTP calls)
+# The phases go out as a Server-Timing header (visible in the browser's
+# network panel) and, with the statement count, as one JSON log line per
+# request. A statement run PROFILING_N_PLUS_ONE_THRESHOLD or more times with
+# different parameters is reported as a likely N+1 (a lazy load in a loop).
+#
+# Outside a profiled request (workers, CLI, profiling off) phase() is a no-op.
+
+SERVER_TIMING_DESCRIPTIONS = {
+    'db': 'SQL',
+    'serialize': 'Serialization',
+    'bcrypt': 'Password hashing',
+    'pdf': 'PDF rendering',
+    'mpesa': 'M-Pesa API',
+    'paypal': 'PayPal API',
+}
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        # phase -> [seconds, count]
+        self.phases = {}
+        # statement -> [executions, distinct parameter sets]
+        self.statements = {}
+
+    def add(self, name, seconds):
+        entry = self.phases.get(name)
+        if entry is None:
+            entry = self.phases[name] = [0.0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_statement(self, statement, parameters):
+        entry = self.statements.get(statement)
+        if entry is None:
+            entry = self.statements[statement] = [0, set()]
+        entry[0] += 1
+        entry[1].add(repr(parameters))
+
+    def query_count(self):
+        return sum(count for count, _ in self.statements.values())
+
+    def n_plus_one(self, threshold):
+        """Statements run at least threshold times with different parameters, most repeated first."""
+        repeated = [
+            (statement, count) for statement, (count, parameters) in self.statements.items()
+            if count >= threshold and len(parameters) > 1
+        ]
+        return sorted(repeated, key=lambda item: -item[1])
+
+    def server_timing(self, total):
+        entries = []
+        for name, (seconds, count) in self.phases.items():
+            description = SERVER_TIMING_DESCRIPTIONS.get(name, name)
+            entries.append(f'{name};desc="{description} ({count})";dur={seconds * 1000:.1f}')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def current_profile():
+    return g.get('profile') if has_request_context() else None
+
+
+@contextmanager
+def phase(name):
+    """Adds the time spent in the block to the current request's profile, if it is being profiled."""
+    profile = current_profile()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, time.perf_counter() - start)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_profile() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile()
+    started = getattr(context, '_profile_started', None)
+    if profile is None or started is None:
+        return
+    profile.add('db', time.perf_counter() - started)
+    profile.add_statement(statement, parameters)
+
+
+def _start_profile():
+    g.profile = Profile()
+
+
+def _finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    total = time.perf_counter() - profile.started
+    response.headers['Server-Timing'] = profile.server_timing(total)
+
+    config = current_app.config
+    suspects = profile.n_plus_one(config['PROFILING_N_PLUS_ONE_THRESHOLD'])
+    record = {
+        'event': 'request_profile',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'total_ms': round(total * 1000, 1),
+        'queries': profile.query_count(),
+        'phases': {name: {'ms': round(seconds * 1000, 1), 'count': count}
+                   for name, (seconds, count) in profile.phases.items()},
+    }
+    if suspects:
+        record['n_plus_one'] = [{'statement': ' '.join(statement.split()), 'count': count}
+                                for statement, count in suspects]
+    if suspects or total * 1000 >= config['PROFILING_SLOW_REQUEST_MS']:
+        current_app.logger.warning(json.dumps(record))
+    else:
+        current_app.logger.info(json.dumps(record))
+    return response
+
+
+def init_profiling(app, db):
+    if not app.config['PROFILING_ENABLED']:
+        return
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start_profile)
+    app.after_request(_finish_profile)
@@ -0,0 +1,49 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- QUERY BUDGETS ---
+# Views declare how many SQL statements they may issue per request. When
+# QUERY_BUDGET_ENFORCED is on (it is by default under TESTING), every statement
+# is counted and a request that goes over its view's budget raises, so an N+1
+# regression fails the test that exercises it instead of slipping through.
+# `flask queries check-plans` (app/query_plans.py) runs the hot endpoints with
+# budgets enforced, so CI catches one there too.
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(max_queries):
+    """Declares the maximum number of SQL statements the decorated view may issue."""
+    def decorator(view):
+        view._query_budget = max_queries
+        return view
+    return decorator
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_count' in g:
+        g.query_count += 1
+
+
+def _start_counting():
+    g.query_count = 0
+
+
+def _check_budget(response):
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, '_query_budget', None)
+    count = g.get('query_count', 0)
+    response.headers['X-Query-Count'] = str(count)
+    if budget is not None and count > budget:
+        raise QueryBudgetExceeded(f"{request.endpoint} issued {count} SQL statements; its budget is {budget}")
+    return response
+
+
+def init_query_budget(app):
+    if app.config.get('QUERY_BUDGET_ENFORCED') or app.testing:
+        app.before_request(_start_counting)
+        app.after_request(_check_budget)
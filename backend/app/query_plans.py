@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
+from .query_budget import QueryBudgetExceeded
+
+# --- QUERY PLAN CHECKS ---
+# Runs the hot endpoints against a throwaway database, records every SELECT,
+# UPDATE and DELETE they issue, and asks the database for each one's plan
+# (EXPLAIN QUERY PLAN on SQLite, EXPLAIN with seq scans disabled on
+# Postgres). A statement that still reads a whole table is reported, unless
+# the scenario expects it (e.g. the unfiltered catalog listing). Every
+# request must get its expected status, or the check fails too (an endpoint
+# that errors out would otherwise just stop issuing the queries under test),
+# and so does a view that goes over its query budget (app/query_budget.py).
+# Run by `flask queries check-plans`, which exits non-zero on any report, so a
+# dropped index or a query that stops using one fails CI.
+
+_SQLITE_SCAN = re.compile(r'^SCAN (\w+)$')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+class Scenario:
+    def __init__(self, name, run, allowed_scans=()):
+        self.name = name
+        self.run = run
+        self.allowed_scans = set(allowed_scans)
+
+
+def _seed(db):
+    from .models import Shoe, ShoeSize
+    for i in range(1, 21):
+        shoe = Shoe(id=i, name=f"Plan Shoe {i}", brand=('Nike', 'Vans', 'Puma')[i % 3],
+                    description='A shoe for query plan checks', price=1000.0 + i * 100,
+                    details='-', image=f"/static/images/{i}.jpeg", rating=3 + i % 3)
+        shoe.size_inventory = [ShoeSize(size=str(size), stock=50) for size in range(6, 12)]
+        db.session.add(shoe)
+    db.session.commit()
+
+
+class ScenarioFailed(Exception):
+    """A scenario's request got an unexpected response, so its queries weren't all exercised."""
+
+
+def _call(client, method, path, expected=(200,), **kwargs):
+    response = client.open(path, method=method, **kwargs)
+    if response.status_code not in expected:
+        raise ScenarioFailed(
+            f"{method} {path} answered {response.status_code} (expected {'/'.join(map(str, expected))}): "
+            f"{response.get_data(as_text=True)[:200]}"
+        )
+    return response
+
+
+def _login(client, email):
+    _call(client, 'POST', '/api/auth/register', expected=(201,), json={'email': email, 'password': 'plan-check'})
+    response = _call(client, 'POST', '/api/auth/login', json={'email': email, 'password': 'plan-check'})
+    return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+
+def _auth(client, state):
+    state['headers'] = _login(client, 'plans@example.com')
+
+
+def _catalog(client, state):
+    _call(client, 'GET', '/api/shoes')
+    _call(client, 'GET', '/api/shoes?cursor=&sort=-price')
+
+
+def _catalog_lookups(client, state):
+    _call(client, 'GET', '/api/shoes?ids=3,1,2')
+    _call(client, 'GET', '/api/shoes/1')
+    _call(client, 'GET', '/api/shoes/search?brand=Nike&min_price=1200&max_price=2500&cursor=&sort=price')
+    _call(client, 'GET', '/api/shoes/search?size=9&cursor=')
+    _call(client, 'GET', '/api/shoes/search?q=plan&brand=Nike')
+
+
+def _facets(client, state):
+    _call(client, 'GET', '/api/shoes/search?q=plan&facets=1&size=9&brand=Nike&min_price=1&max_price=5000&min_rating=3')
+
+
+def _facets_after_write(client, state):
+    from .extensions import db
+    from .models import Shoe
+    db.session.get(Shoe, 1).price += 1
+    db.session.commit()
+    _facets(client, state)
+
+
+def _cart(client, state):
+    for _ in range(2):
+        _call(client, 'POST', '/api/cart/', expected=(200, 201),
+              json={'shoe_id': 1, 'size': '9', 'quantity': 1}, headers=state['headers'])
+    _call(client, 'POST', '/api/cart/', expected=(201,),
+          json={'shoe_id': 2, 'size': '8', 'quantity': 1}, headers=state['headers'])
+    _call(client, 'GET', '/api/cart/', headers=state['headers'])
+
+
+def _checkout(client, state):
+    response = _call(client, 'POST', '/api/orders/checkout', expected=(202,),
+                     json={'phone_number': '0712345678'}, headers=state['headers'])
+    state['order_id'] = response.get_json()['order_id']
+
+
+def _orders(client, state):
+    _call(client, 'GET', '/api/orders/', headers=state['headers'])
+    _call(client, 'GET', '/api/orders/?cursor=&sort=-created_at', headers=state['headers'])
+    _call(client, 'GET', f"/api/orders/{state['order_id']}", headers=state['headers'])
+
+
+def _mpesa_callback(client, state):
+    from .extensions import db
+    from .models import Order, MpesaCallback
+    from .mpesa_callbacks import apply_callback
+    db.session.get(Order, state['order_id']).checkout_request_id = 'ws_CO_PLANCHECK'
+    db.session.commit()
+    _call(client, 'POST', '/api/orders/callback', data=json.dumps({'Body': {'stkCallback': {
+        'CheckoutRequestID': 'ws_CO_PLANCHECK', 'ResultCode': 0, 'ResultDesc': 'OK',
+        'CallbackMetadata': {'Item': [
+            {'Name': 'Amount', 'Value': 1}, {'Name': 'MpesaReceiptNumber', 'Value': 'PLAN123'},
+            {'Name': 'TransactionDate', 'Value': 20260101120000}, {'Name': 'PhoneNumber', 'Value': 254712345678},
+        ]},
+    }}}), content_type='application/json')
+    callback = db.session.query(MpesaCallback).filter_by(checkout_request_id='ws_CO_PLANCHECK').one()
+    if apply_callback(callback.id) != 'completed':
+        raise ScenarioFailed('The stored callback did not complete the order')
+    db.session.commit()
+
+
+def _receipt(client, state):
+    _call(client, 'GET', f"/api/orders/{state['order_id']}/receipt", headers=state['headers'])
+
+
+def _newsletter(client, state):
+    _call(client, 'POST', '/api/newsletter/subscribe', json={'email': 'plans@example.com'})
+
+
+def _workers(client, state):
+    from .inventory import sweep_expired_reservations
+    from .reconciliation import reconciliation_backlog
+    sweep_expired_reservations()
+    reconciliation_backlog()
+
+
+SCENARIOS = [
+    Scenario('register + login', _auth),
+    # Unfiltered listings read the whole catalog by design
+    Scenario('catalog listing', _catalog, allowed_scans={'shoe'}),
+    Scenario('catalog lookups and filters', _catalog_lookups),
+    # The first faceted search builds the facet index from the whole catalog
+    Scenario('facet index build', _facets, allowed_scans={'shoe', 'shoe_size'}),
+    Scenario('facets after a catalog write', _facets_after_write),
+    Scenario('cart', _cart),
+    Scenario('checkout', _checkout),
+    Scenario('order history and status', _orders),
+    Scenario('M-Pesa callback', _mpesa_callback),
+    Scenario('receipt download', _receipt),
+    Scenario('newsletter subscribe', _newsletter),
+    Scenario('sweeper and reconciler', _workers),
+]
+
+
+@contextmanager
+def _recording(engine):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+
+def full_scans(connection, statement, parameters):
+    """Names of the tables the statement reads in full."""
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        return {match.group(1) for row in rows if (match := _SQLITE_SCAN.match(row[-1]))}
+    if connection.dialect.name == 'postgresql':
+        # Tiny tables would be scanned anyway; ask whether an index *could* serve it
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+        return {match.group(1) for row in rows if (match := _POSTGRES_SCAN.search(row[0]))}
+    raise NotImplementedError(f"No plan check for {connection.dialect.name}")
+
+
+def check_query_plans(database_url=None):
+    """
+    Runs every scenario against a fresh database (a temporary SQLite file, or
+    the empty scratch database at database_url) and returns
+    (results, problems, failures): statement counts per scenario, a list of
+    (scenario, table, statement) for each unexpected full table scan, and a
+    list of (scenario, error) for a scenario that failed. Later scenarios
+    build on earlier ones, so the run stops at the first failure.
+    """
+    from . import create_app
+    from .extensions import db
+    from config import Config
+
+    tmp_dir = tempfile.TemporaryDirectory()
+
+    class PlanCheckConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url or f"sqlite:///{os.path.join(tmp_dir.name, 'plans.db')}"
+        DATABASE_REPLICA_URL = None
+        CATALOG_CACHE_ENABLED = False
+        RATE_LIMIT_ENABLED = False
+        BCRYPT_LOG_ROUNDS = 4
+        RECEIPT_DIR = os.path.join(tmp_dir.name, 'receipts')
+        # A view going over its @query_budget fails the check, with its message
+        QUERY_BUDGET_ENFORCED = True
+        PROPAGATE_EXCEPTIONS = True
+
+    app = create_app(PlanCheckConfig)
+    results, problems, failures = [], [], []
+    with app.app_context():
+        db.create_all()
+        _seed(db)
+        client = app.test_client()
+        state = {}
+        for scenario in SCENARIOS:
+            with _recording(db.engine) as statements:
+                try:
+                    scenario.run(client, state)
+                except (ScenarioFailed, QueryBudgetExceeded) as e:
+                    failures.append((scenario.name, str(e)))
+            db.session.remove()
+            if failures:
+                break
+            with db.engine.connect() as connection:
+                for statement, parameters in statements:
+                    for table in sorted(full_scans(connection, statement, parameters) - scenario.allowed_scans):
+                        problems.append((scenario.name, table, statement))
+                connection.rollback()
+            results.append((scenario.name, len(statements)))
+        db.session.remove()
+        if database_url:
+            db.drop_all()
+        db.engine.dispose()
+    tmp_dir.cleanup()
+    return results, problems, failures
@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from .metrics import RATE_LIMIT_REJECTIONS
+
+# --- RATE LIMITING ---
+# Token buckets per client IP and, for authenticated requests, per user, for
+# the endpoints listed in RATE_LIMITS. Keys are an endpoint ('auth_bp.login')
+# or a whole blueprint ('newsletter_bp'); the endpoint's entry wins. Values
+# are '<requests>/<second|minute|hour|day>': that many requests may come in a
+# burst, and the bucket refills at the same rate. A request is admitted only
+# if every bucket it counts against (IP, user) has room; rejected requests
+# get 429 with Retry-After, aren't charged, and are counted in the
+# rate_limit_rejections metric per limit and client kind.
+#
+# The buckets are kept as GCRA "theoretical arrival times" (one float per
+# key), which behaves like a token bucket but updates with a single write.
+# MemoryStore keeps them per worker without locks; RedisStore
+# (RATE_LIMIT_STORAGE_URL=redis://...) shares them across workers.
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(spec):
+    """'10/minute' -> (seconds between requests, burst seconds)."""
+    count, _, period = spec.partition('/')
+    count = int(count)
+    seconds = PERIODS[period.strip().rstrip('s')]
+    return seconds / count, seconds
+
+
+class MemoryStore:
+    """
+    Per-worker buckets without a lock: each check is a few dict reads and
+    writes. Two threads racing on the same key can both be admitted (a lost
+    update lets one extra request through), which is fine for a rate limit.
+    Keys are kept in order of last admission, so when there are more than
+    max_keys the least recently used one is evicted (likely a full bucket
+    anyway) without scanning.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self._tats = {}
+        self.max_keys = max_keys
+
+    def hit(self, keys, interval, burst):
+        """
+        Charges one request to every bucket if all of them have room. Returns
+        the seconds each one would have to wait (all 0 = admitted); nothing
+        is charged if any is over.
+        """
+        now = time.monotonic()
+        new_tats = [max(self._tats.get(key, now), now) + interval for key in keys]
+        waits = [max(new_tat - now - burst, 0) for new_tat in new_tats]
+        if any(waits):
+            return waits
+        for key, new_tat in zip(keys, new_tats):
+            # Re-inserted to move it to the end of the eviction order
+            self._tats.pop(key, None)
+            self._tats[key] = new_tat
+        if len(self._tats) > self.max_keys:
+            self._evict_oldest()
+        return waits
+
+    def _evict_oldest(self):
+        try:
+            del self._tats[next(iter(self._tats))]
+        except (RuntimeError, StopIteration, KeyError):
+            pass  # Another thread changed the dict meanwhile; the next admission retries
+
+
+class RedisStore:
+    """Buckets shared by all workers, updated atomically in a Lua script (needs the `redis` package)."""
+
+    SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local interval, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local new_tats, waits, over = {}, {}, false
+    for i, key in ipairs(KEYS) do
+        local tat = math.max(tonumber(redis.call('GET', key) or now), now)
+        new_tats[i] = tat + interval
+        local wait = math.max(new_tats[i] - now - burst, 0)
+        waits[i] = tostring(wait)
+        if wait > 0 then over = true end
+    end
+    if not over then
+        for i, key in ipairs(KEYS) do
+            redis.call('SET', key, tostring(new_tats[i]), 'PX', math.ceil((new_tats[i] - now) * 1000))
+        end
+    end
+    return waits
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORAGE_URL points at Redis but the 'redis' package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self._script = self.client.register_script(self.SCRIPT)
+
+    def hit(self, keys, interval, burst):
+        return [float(wait) for wait in self._script(keys=[f"ratelimit:{key}" for key in keys], args=[interval, burst])]
+
+
+class RateLimiter:
+    def __init__(self, limits, store):
+        self.limits = {key: parse_limit(spec) for key, spec in limits.items()}
+        self.store = store
+
+    def limit_for(self, endpoint, blueprint):
+        """Returns (bucket name, interval, burst) of the limit covering the endpoint, or None."""
+        for name in (endpoint, blueprint):
+            if name in self.limits:
+                return (name, *self.limits[name])
+        return None
+
+    def check(self, name, interval, burst, clients):
+        """
+        Returns the seconds until the most limited client may retry, or 0 if
+        all are admitted. A rejected request is charged to none of the
+        clients' buckets.
+        """
+        waits = self.store.hit([f"{name}:{client}" for client in clients], interval, burst)
+        for client, wait in zip(clients, waits):
+            if wait:
+                RATE_LIMIT_REJECTIONS.labels(name, client.partition(':')[0]).inc()
+        return max(waits, default=0)
+
+
+_create_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Returns this worker's RateLimiter for the current app, creating it on first use."""
+    limiter = current_app.extensions.get('rate_limiter')
+    if limiter is None:
+        # Concurrent first requests must not each build one
+        with _create_lock:
+            limiter = current_app.extensions.get('rate_limiter')
+            if limiter is None:
+                url = current_app.config['RATE_LIMIT_STORAGE_URL']
+                store = RedisStore(url) if url else MemoryStore()
+                limiter = current_app.extensions['rate_limiter'] = RateLimiter(current_app.config['RATE_LIMITS'], store)
+    return limiter
+
+
+def _clients():
+    clients = [f"ip:{request.remote_addr}"]
+    # The identity only counts when the token is valid; the view still enforces @jwt_required
+    try:
+        if verify_jwt_in_request(optional=True):
+            clients.append(f"user:{get_jwt_identity()}")
+    except Exception:
+        pass
+    return clients
+
+
+def _enforce_rate_limit():
+    if request.method == 'OPTIONS' or request.endpoint is None:
+        return None
+    limiter = get_rate_limiter()
+    limit = limiter.limit_for(request.endpoint, request.blueprint)
+    if limit is None:
+        return None
+
+    try:
+        retry_after = limiter.check(*limit, _clients())
+    except Exception as e:
+        # A broken shared store must not take the endpoints down with it
+        current_app.logger.warning(f"Rate limit check failed, allowing request: {e}")
+        return None
+    if not retry_after:
+        return None
+
+    response = jsonify({'error': 'Too many requests, please slow down'})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(math.ceil(retry_after))
+    return response
+
+
+def init_rate_limit(app):
+    if app.config['RATE_LIMIT_ENABLED']:
+        app.before_request(_enforce_rate_limit)
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import threading
+from datetime import timezone
+from flask import current_app
+from fpdf import FPDF
+from sqlalchemy import select
+from .extensions import db
+from .models import Order
+from .loaders import order_details
+from .outbox import enqueue, outbox_handler
+from .metrics import RECEIPT_RENDERS
+from .profiling import phase
+
+# --- PDF RECEIPTS ---
+# A completed order's receipt never changes, so it is rendered once (queued
+# through the outbox when the order completes) and stored under RECEIPT_DIR,
+# named by the SHA-256 of its bytes. The order keeps the hash, which doubles
+# as the download's ETag. A missing file is simply rendered again: the PDF's
+# creation date is pinned to the order date, so the bytes and hash are stable.
+
+
+class PDF(FPDF):
+    def header(self):
+        self.set_font('helvetica', 'B', 16)
+        self.cell(0, 10, 'Shoe Haven Receipt', 0, 1, 'C')
+        self.ln(10)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('helvetica', 'I', 8)
+        self.cell(0, 10, f'Page {self.page_no()}', 0, 0, 'C')
+
+def receipt_data(order):
+    """The plain data a receipt shows, detached from the session (so it can go to another process)."""
+    data = {
+        'id': order.id,
+        'created_at': order.created_at,
+        'total_amount': order.total_amount,
+        'paid_via': None,
+        'items': [
+            (item.cart.shoe.name, item.cart.size, item.cart.quantity, item.cart.shoe.price * item.cart.quantity)
+            for item in order.items
+        ],
+    }
+    if order.payment:
+        data['paid_via'] = [f"Paid Via: M-Pesa ({order.payment.phone_number})",
+                            f"M-Pesa Code: {order.payment.mpesa_code}"]
+    elif order.paypal_order_id:
+        data['paid_via'] = [f"Paid Via: PayPal (Order {order.paypal_order_id})"]
+    return data
+
+def render_receipt(data):
+    pdf = PDF()
+    pdf.set_creation_date(data['created_at'].replace(tzinfo=timezone.utc))
+    pdf.add_page()
+    pdf.set_font('helvetica', '', 12)
+    
+    # Order Details
+    pdf.cell(0, 8, f"Order ID: {data['id']}", 0, 1)
+    pdf.cell(0, 8, f"Order Date: {data['created_at'].strftime('%Y-%m-%d %H:%M:%S')}", 0, 1)
+    for line in data['paid_via'] or []:
+        pdf.cell(0, 8, line, 0, 1)
+    pdf.ln(10)
+
+    # Table Header
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.cell(100, 10, 'Item', 1, 0, 'C')
+    pdf.cell(20, 10, 'Size', 1, 0, 'C')
+    pdf.cell(20, 10, 'Qty', 1, 0, 'C')
+    pdf.cell(30, 10, 'Price', 1, 1, 'C')
+    pdf.set_font('helvetica', '', 12)
+
+    # Table Rows
+    for name, size, quantity, price in data['items']:
+        pdf.cell(100, 10, name, 1)
+        pdf.cell(20, 10, str(size), 1, 0, 'C')
+        pdf.cell(20, 10, str(quantity), 1, 0, 'C')
+        pdf.cell(30, 10, f"KES {price}", 1, 1, 'R')
+    
+    # Total
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.cell(140, 10, 'Total', 1, 0, 'R')
+    pdf.cell(30, 10, f"KES {data['total_amount']}", 1, 1, 'R')
+    
+    # fpdf2 returns the document as a bytearray
+    return bytes(pdf.output())
+
+def generate_receipt_pdf(order):
+    RECEIPT_RENDERS.inc()
+    with phase('pdf'):
+        return render_receipt(receipt_data(order))
+
+
+def receipt_path(sha256):
+    """Where the receipt with this hash lives; sharded by the first two hex digits."""
+    return os.path.join(current_app.config['RECEIPT_DIR'], sha256[:2], f"{sha256}.pdf")
+
+
+def store_receipt(pdf_data):
+    """Writes the PDF (atomically, if not already there) and returns its hash."""
+    sha256 = hashlib.sha256(pdf_data).hexdigest()
+    path = receipt_path(sha256)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # The request path and the outbox worker may render the same receipt at once
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_data)
+        os.replace(tmp_path, path)
+    return sha256
+
+
+def ensure_receipt(order):
+    """
+    Returns the path of the order's stored receipt, rendering and storing it
+    first if it doesn't exist yet. Sets order.receipt_sha256; doesn't commit.
+    """
+    if order.receipt_sha256:
+        path = receipt_path(order.receipt_sha256)
+        if os.path.exists(path):
+            return path
+
+    order = db.session.execute(
+        select(Order).options(*order_details()).where(Order.id == order.id)
+        .execution_options(populate_existing=True)
+    ).scalar_one()
+    order.receipt_sha256 = store_receipt(generate_receipt_pdf(order))
+    return receipt_path(order.receipt_sha256)
+
+
+def receipt_cache_headers(response):
+    """Receipts are per-customer and immutable: cache privately, for a year."""
+    response.cache_control.no_cache = None
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['RECEIPT_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
+
+
+def queue_receipt(order_id):
+    """Has the outbox dispatcher render the receipt of a just-completed order."""
+    enqueue('generate_receipt', {'order_id': order_id})
+
+
+@outbox_handler('generate_receipt')
+def generate_receipt(payload):
+    order = db.session.get(Order, payload['order_id'])
+    if order is not None and order.status == 'completed':
+        ensure_receipt(order)
@@ -0,0 +1,149 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import exists, func, insert, select, update
+import requests
+from .extensions import db
+from .models import Order, Payment, MpesaCallback
+from .inventory import commit_reservations, release_reservations
+from .http_clients import RateLimiter
+from .metrics import RECONCILE_BACKLOG, RECONCILE_BATCH_DURATION, RECONCILED_ORDERS
+from .order_events import record_status_change
+from .receipts import queue_receipt
+
+# --- PENDING ORDER RECONCILIATION ---
+# Orders whose M-Pesa callback never arrived stay pending. The reconciler
+# walks the stale ones (pending for RECONCILE_AFTER_SECONDS, STK push sent,
+# no callback stored) in id-ordered batches, asks Safaricom for each outcome
+# with a bounded thread pool behind a shared rate limit, and applies a whole
+# batch in one transaction. Orders that changed meanwhile (e.g. a late
+# callback) are left alone: every status change is conditional on 'pending'.
+# Each run's backlog, batch durations and outcomes are exported on /metrics.
+
+# STK query result codes that mean the customer will never pay this push
+# (cancelled, timed out, insufficient funds, wrong PIN, unreachable, ...)
+FAILED_RESULT_CODES = {'1', '1001', '1019', '1025', '1032', '1037', '2001', '9999'}
+
+
+def _stale_orders(now):
+    cutoff = now - timedelta(seconds=current_app.config['RECONCILE_AFTER_SECONDS'])
+    has_callback = exists().where(MpesaCallback.checkout_request_id == Order.checkout_request_id)
+    return (
+        select(Order.id, Order.checkout_request_id, Order.total_amount)
+        .where(Order.status == 'pending', Order.checkout_request_id.isnot(None),
+               Order.created_at < cutoff, ~has_callback)
+    )
+
+
+def reconciliation_backlog(now=None):
+    """Number of stale pending orders waiting to be reconciled."""
+    stale = _stale_orders(now or datetime.utcnow()).subquery()
+    return db.session.execute(select(func.count()).select_from(stale)).scalar()
+
+
+def _query(mpesa, limiter, checkout_request_id):
+    """Returns 'paid', 'failed' or 'unknown' (still processing / query failed)."""
+    limiter.acquire()
+    try:
+        result = mpesa.query_stk_status(checkout_request_id)
+    except requests.RequestException:
+        return 'unknown'
+    code = str(result.get('ResultCode', ''))
+    if code == '0':
+        return 'paid'
+    if code in FAILED_RESULT_CODES:
+        return 'failed'
+    return 'unknown'
+
+
+def _settle(rows, outcomes, now):
+    """Applies one batch of query outcomes in a single transaction."""
+    paid = [row.id for row, outcome in zip(rows, outcomes) if outcome == 'paid']
+    failed = [row.id for row, outcome in zip(rows, outcomes) if outcome == 'failed']
+    settled = cancelled = []
+
+    if paid:
+        settled = db.session.execute(
+            update(Order).where(Order.id.in_(paid), Order.status == 'pending')
+            .values(status='completed').returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if settled:
+            record_status_change(db.session, settled, 'completed')
+            by_id = {row.id: row for row in rows}
+            # The STK query doesn't return the M-Pesa receipt number, so the
+            # CheckoutRequestID stands in for it on reconciled payments
+            db.session.execute(insert(Payment), [
+                {'order_id': order_id, 'mpesa_code': by_id[order_id].checkout_request_id[:50],
+                 'amount': by_id[order_id].total_amount, 'phone_number': '', 'transaction_date': now}
+                for order_id in settled
+            ])
+            for order_id in settled:
+                commit_reservations(order_id)
+                queue_receipt(order_id)
+
+    if failed:
+        cancelled = db.session.execute(
+            update(Order).where(Order.id.in_(failed), Order.status == 'pending')
+            .values(status='cancelled').returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        if cancelled:
+            record_status_change(db.session, cancelled, 'cancelled')
+            release_reservations(cancelled)
+
+    db.session.commit()
+    return len(settled), len(cancelled)
+
+
+def reconcile_pending_orders(now=None):
+    """
+    Runs one reconciliation pass over all stale pending orders. Returns a
+    report with the backlog at the start, the outcome counts and the duration.
+    """
+    from .api.orders import mpesa
+
+    config = current_app.config
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    report = {'backlog': reconciliation_backlog(now), 'queried': 0, 'settled': 0, 'cancelled': 0, 'unresolved': 0}
+    RECONCILE_BACKLOG.set(report['backlog'])
+    limiter = RateLimiter(config['RECONCILE_RATE'])
+
+    last_id = 0
+    with ThreadPoolExecutor(max_workers=config['RECONCILE_CONCURRENCY']) as pool:
+        while True:
+            rows = db.session.execute(
+                _stale_orders(now).where(Order.id > last_id).order_by(Order.id).limit(config['RECONCILE_BATCH_SIZE'])
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            # Release the read transaction while the queries run
+            db.session.commit()
+
+            with RECONCILE_BATCH_DURATION.time():
+                outcomes = list(pool.map(lambda row: _query(mpesa, limiter, row.checkout_request_id), rows))
+                settled, cancelled = _settle(rows, outcomes, now)
+            unresolved = len(rows) - settled - cancelled
+            report['queried'] += len(rows)
+            report['settled'] += settled
+            report['cancelled'] += cancelled
+            report['unresolved'] += unresolved
+            RECONCILED_ORDERS.labels('settled').inc(settled)
+            RECONCILED_ORDERS.labels('cancelled').inc(cancelled)
+            RECONCILED_ORDERS.labels('unresolved').inc(unresolved)
+
+    report['duration_seconds'] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def run_reconciler(interval):
+    """Reconciles every `interval` seconds until interrupted, logging each run's report."""
+    while True:
+        report = reconcile_pending_orders()
+        if report['backlog']:
+            current_app.logger.info(f"Reconciliation: {report}")
+        db.session.remove()
+        time.sleep(interval)
@@ -17,11 +17,16 @@ class ShoeSchema(ma.SQLAlchemyAutoSchema):
         model = Shoe
         load_instance = True
     
-    # Custom field to split the sizes string into a list
+    # Sizes and per-size stock come from the ShoeSize inventory rows
     sizes = ma.Method("get_sizes_list")
+    size_stock = ma.Method("get_size_stock")
+    stock = ma.Integer(dump_only=True)
 
     def get_sizes_list(self, obj):
-        return obj.sizes.split(',') if obj.sizes else []
+        return [entry.size for entry in obj.size_inventory]
+
+    def get_size_stock(self, obj):
+        return {entry.size: entry.stock for entry in obj.size_inventory}
 
 # Schema for serializing cart items (output)
 class CartItemSchema(ma.SQLAlchemyAutoSchema):
@@ -53,4 +58,5 @@ class OrderSchema(ma.SQLAlchemyAutoSchema):
     payment = ma.Nested(PaymentSchema)
     class Meta:
         model = Order
-        load_instance = True
\ No newline at end of file
+        load_instance = True
+        exclude = ('receipt_sha256',)
\ No newline at end of file
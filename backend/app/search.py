@@ -0,0 +1,122 @@
+import re
+from sqlalchemy import DDL, Index, event, func, literal_column, table, column, text
+from .extensions import db
+from .models import Shoe
+
+# --- FULL-TEXT SEARCH INDEX ---
+# SQLite uses an FTS5 table that mirrors shoe.name/description and is kept in
+# sync by triggers. Postgres uses a GIN index over a tsvector expression, which
+# the database maintains by itself on every INSERT/UPDATE.
+
+FTS_TABLE = 'shoe_fts'
+TS_CONFIG = literal_column("'english'")
+
+# Only word characters are passed to the search engines, so user input can
+# never inject FTS5 / tsquery operators.
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='shoe', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS shoe_fts_ai AFTER INSERT ON shoe BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shoe_fts_ad AFTER DELETE ON shoe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS shoe_fts_au AFTER UPDATE OF name, description ON shoe BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+_SQLITE_DROP_DDL = [
+    'DROP TRIGGER IF EXISTS shoe_fts_ai',
+    'DROP TRIGGER IF EXISTS shoe_fts_ad',
+    'DROP TRIGGER IF EXISTS shoe_fts_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+for statement in _SQLITE_DDL:
+    event.listen(Shoe.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+for statement in _SQLITE_DROP_DDL:
+    event.listen(Shoe.__table__, 'before_drop', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def search_vector():
+    """The tsvector expression covered by the Postgres GIN index."""
+    return func.to_tsvector(TS_CONFIG, Shoe.name + ' ' + Shoe.description)
+
+# Created by db.create_all() on Postgres only; SQLite has no to_tsvector().
+Index('ix_shoe_search_vector', search_vector(), postgresql_using='gin').ddl_if(dialect='postgresql')
+
+
+def tokenize(query_str):
+    """Splits a raw search string into lowercase word tokens."""
+    return [token.lower() for token in _TOKEN_RE.findall(query_str or '')]
+
+
+def apply_search(query, query_str):
+    """
+    Restricts a Shoe query to rows matching every token (as a prefix) of
+    query_str and orders them by relevance. Returns the query unchanged if
+    there is nothing searchable in query_str.
+    """
+    tokens = tokenize(query_str)
+    if not tokens:
+        return query
+
+    dialect = db.session.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        fts = table(FTS_TABLE, column('rowid'))
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # The unary + keeps SQLite from looking matches up by rowid, so the FTS
+        # index always drives the join; otherwise an index on another filter
+        # (e.g. ix_shoe_brand_price) can go first and re-run the MATCH per row.
+        return (
+            query.join(fts, literal_column(f'+{FTS_TABLE}.rowid') == Shoe.id)
+            .filter(text(f'{FTS_TABLE} MATCH :fts_query').bindparams(fts_query=match))
+            .order_by(text(f'bm25({FTS_TABLE})'), Shoe.id)
+        )
+
+    if dialect == 'postgresql':
+        ts_query = func.to_tsquery(TS_CONFIG, ' & '.join(f'{token}:*' for token in tokens))
+        vector = search_vector()
+        return (
+            query.filter(vector.op('@@')(ts_query))
+            .order_by(func.ts_rank(vector, ts_query).desc(), Shoe.id)
+        )
+
+    # Any other backend falls back to the old substring scan.
+    for token in tokens:
+        query = query.filter(db.or_(
+            Shoe.name.ilike(f'%{token}%'),
+            Shoe.description.ilike(f'%{token}%')
+        ))
+    return query
+
+
+def matching_ids(query_str):
+    """
+    Returns the set of shoe ids matching query_str using only the search index,
+    or None if there is nothing searchable in it.
+    """
+    if not tokenize(query_str):
+        return None
+    query = apply_search(db.session.query(Shoe.id), query_str).order_by(None)
+    return {shoe_id for shoe_id, in query}
+
+
+def rebuild_search_index():
+    """Re-indexes every shoe. Only needed on SQLite after bulk raw-SQL loads."""
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        db.session.commit()
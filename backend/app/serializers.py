@@ -0,0 +1,111 @@
+import json
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import fields, missing
+from .profiling import phase
+
+# --- PRECOMPILED SERIALIZERS ---
+# Marshmallow dispatches every field of every object through several layers of
+# method calls. For the hot read endpoints we compile each schema once into a
+# plain Python function (generated source, one attribute read and one
+# conversion per field) that produces exactly the dict schema.dump() would.
+# Field types without a fast path fall back to the marshmallow field itself,
+# so unusual fields keep their exact behaviour.
+
+# Field classes whose serialization is a None check plus one conversion
+_FAST_CONVERTERS = {
+    fields.Integer: 'int',
+    fields.Float: 'float',
+    fields.String: 'str',
+    fields.Boolean: 'bool',
+}
+
+
+class CompiledSchema:
+    """Drop-in for schema.dump() backed by a generated function."""
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.many = schema.many
+        self._dump_one = _compile(schema)
+
+    def dump(self, obj, many=None):
+        many = self.many if many is None else many
+        with phase('serialize'):
+            if many:
+                dump_one = self._dump_one
+                return [dump_one(item) for item in obj]
+            return self._dump_one(obj)
+
+
+def compile_schema(schema):
+    return CompiledSchema(schema)
+
+
+def _is_plain_attribute(name):
+    return name.isidentifier() and '.' not in name
+
+
+def _compile(schema):
+    namespace = {'_missing': missing, '_get_attribute': schema.get_attribute}
+    lines = ['def dump_one(obj):', '    out = {}']
+
+    for index, (field_name, field) in enumerate(schema.dump_fields.items()):
+        key = field.data_key if field.data_key is not None else field_name
+        attribute = field.attribute or field_name
+        converter = _FAST_CONVERTERS.get(type(field))
+        plain = _is_plain_attribute(attribute) and field.dump_default is missing
+
+        if isinstance(field, fields.Method) and field.serialize_method_name:
+            namespace[f'_method{index}'] = getattr(schema, field.serialize_method_name)
+            lines.append(f'    out[{key!r}] = _method{index}(obj)')
+
+        elif type(field) is fields.Nested and plain:
+            nested = field.schema
+            namespace[f'_nested{index}'] = CompiledSchema(nested)._dump_one
+            lines.append(f'    value = obj.{attribute}')
+            if nested.many or field.many:
+                lines.append(f'    out[{key!r}] = None if value is None else [_nested{index}(item) for item in value]')
+            else:
+                lines.append(f'    out[{key!r}] = None if value is None else _nested{index}(value)')
+
+        elif converter and plain and not getattr(field, 'as_string', False):
+            lines.append(f'    value = obj.{attribute}')
+            lines.append(f'    out[{key!r}] = None if value is None else {converter}(value)')
+
+        elif type(field) is fields.DateTime and plain and field.format in (None, 'iso'):
+            lines.append(f'    value = obj.{attribute}')
+            lines.append(f'    out[{key!r}] = None if value is None else value.isoformat()')
+
+        else:
+            # Anything else goes through marshmallow's own field logic
+            namespace[f'_field{index}'] = field
+            lines.append(f'    value = _field{index}.serialize({field_name!r}, obj, accessor=_get_attribute)')
+            lines.append('    if value is not _missing:')
+            lines.append(f'        out[{key!r}] = value')
+
+    lines.append('    return out')
+    exec(compile('\n'.join(lines), f'<compiled {type(schema).__name__}>', 'exec'), namespace)
+    return namespace['dump_one']
+
+
+# --- JSON RESPONSES ---
+# Same output as flask.jsonify with the default provider (sorted keys, compact
+# separators, ASCII escaping, trailing newline), but through one reusable
+# C-accelerated encoder instead of building a new one per call.
+
+_encoder = json.JSONEncoder(
+    sort_keys=True, separators=(',', ':'), ensure_ascii=True, default=DefaultJSONProvider.default
+)
+
+
+def json_response(data, status=200):
+    provider = current_app.json
+    pretty = provider.compact is False or (provider.compact is None and current_app.debug)
+    if pretty or not provider.sort_keys or not provider.ensure_ascii:
+        # Non-default JSON settings: let Flask produce its own output
+        response = provider.response(data)
+        response.status_code = status
+        return response
+    body = _encoder.encode(data) + '\n'
+    return current_app.response_class(body, status=status, mimetype=provider.mimetype)
@@ -0,0 +1,214 @@
+"""
+Local stand-ins for the Safaricom (Daraja) and PayPal APIs, for load tests.
+
+Each simulator is a threaded HTTP server on 127.0.0.1 with configurable
+latency (a base delay plus random jitter) and failure injection (a share of
+requests answered with a 503 like the real gateways send when overloaded).
+
+SafaricomSimulator answers oauth, stkpush, stkpushquery and
+transactionstatus. After an accepted STK push it POSTs the STK callback to
+the app, as Safaricom does once the customer has entered their PIN: after
+callback_delay seconds, to callback_base plus the path of the request's
+CallBackURL (the app requires an https CallBackURL; the simulator only keeps
+its path). A share of the pushes (decline_rate) end with ResultCode 1032,
+cancelled by the customer.
+
+PayPalSimulator answers the OAuth token, create order and capture APIs.
+
+    safaricom = SafaricomSimulator(latency_ms=50, callback_base='http://127.0.0.1:5000').start()
+    ...
+    safaricom.stop()
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    simulator = None
+
+    def _handle(self, method):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        try:
+            body = json.loads(raw) if raw and self.headers.get('Content-Type', '').startswith('application/json') else {}
+        except ValueError:
+            body = {}
+        status, reply = self.simulator.dispatch(method, urlparse(self.path).path, body)
+        data = json.dumps(reply).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self, *args):
+        pass
+
+
+class GatewaySimulator:
+    """Base class: subclasses implement route(method, path, body) -> (status, body) or None."""
+
+    name = 'gateway'
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, failure_rate=0.0, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self.server = None
+        self.url = None
+
+    def start(self):
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {'simulator': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def _draw(self):
+        with self._lock:
+            return self.rng.random(), self.rng.random()
+
+    def dispatch(self, method, path, body):
+        delay_draw, failure_draw = self._draw()
+        time.sleep(self.latency + self.jitter * delay_draw)
+        result = self.route(method, path, body)
+        if result is None:
+            self._count(f"{method} {path} (unknown)")
+            return 404, {'error': f"No simulated route for {method} {path}"}
+        operation, status, reply = result
+        if failure_draw < self.failure_rate:
+            self._count(f"{operation} (failed)")
+            return self.failure_reply()
+        self._count(operation)
+        return status, reply
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def failure_reply(self):
+        return 503, {'error': 'Service unavailable (simulated)'}
+
+    def route(self, method, path, body):
+        raise NotImplementedError
+
+
+class SafaricomSimulator(GatewaySimulator):
+    name = 'safaricom'
+
+    def __init__(self, callback_base=None, callback_delay=0.5, decline_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.callback_base = callback_base
+        self.callback_delay = callback_delay
+        self.decline_rate = decline_rate
+        # CheckoutRequestID -> ResultCode of the (simulated) customer's answer
+        self.results = {}
+        self._callbacks = requests.Session()
+
+    def failure_reply(self):
+        return 503, {'requestId': uuid.uuid4().hex, 'errorCode': '503.001.01', 'errorMessage': 'Service Unavailable'}
+
+    def route(self, method, path, body):
+        if method == 'GET' and path == '/oauth/v1/generate':
+            return 'oauth', 200, {'access_token': f"sim-{uuid.uuid4().hex}", 'expires_in': '3599'}
+        if method != 'POST':
+            return None
+        if path == '/mpesa/stkpush/v1/processrequest':
+            return 'stkpush', 200, self._stk_push(body)
+        if path == '/mpesa/stkpushquery/v1/query':
+            result_code = self.results.get(body.get('CheckoutRequestID'))
+            if result_code is None:
+                return 'stkpushquery', 500, {'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}
+            return 'stkpushquery', 200, {
+                'ResponseCode': '0', 'ResponseDescription': 'The service request has been accepted successsfully',
+                'CheckoutRequestID': body['CheckoutRequestID'], 'ResultCode': str(result_code),
+                'ResultDesc': 'The service request is processed successfully.' if result_code == 0 else 'Request cancelled by user',
+            }
+        if path == '/mpesa/transactionstatus/v1/query':
+            return 'transactionstatus', 200, {
+                'OriginatorConversationID': uuid.uuid4().hex, 'ConversationID': f"AG_{uuid.uuid4().hex[:20]}",
+                'ResponseCode': '0', 'ResponseDescription': 'Accept the service request successfully.',
+            }
+        return None
+
+    def _stk_push(self, body):
+        checkout_request_id = f"ws_CO_{uuid.uuid4().hex[:24]}"
+        with self._lock:
+            declined = self.rng.random() < self.decline_rate
+        result_code = 1032 if declined else 0
+        self.results[checkout_request_id] = result_code
+        if self.callback_base and body.get('CallBackURL'):
+            callback_url = self.callback_base + urlparse(body['CallBackURL']).path
+            timer = threading.Timer(self.callback_delay, self._send_callback,
+                                    (callback_url, checkout_request_id, result_code, body))
+            timer.daemon = True
+            timer.start()
+        return {
+            'MerchantRequestID': uuid.uuid4().hex[:20], 'CheckoutRequestID': checkout_request_id,
+            'ResponseCode': '0', 'ResponseDescription': 'Success. Request accepted for processing',
+            'CustomerMessage': 'Success. Request accepted for processing',
+        }
+
+    def _send_callback(self, url, checkout_request_id, result_code, request_body):
+        stk_callback = {
+            'MerchantRequestID': uuid.uuid4().hex[:20], 'CheckoutRequestID': checkout_request_id,
+            'ResultCode': result_code,
+            'ResultDesc': 'The service request is processed successfully.' if result_code == 0 else 'Request cancelled by user',
+        }
+        if result_code == 0:
+            stk_callback['CallbackMetadata'] = {'Item': [
+                {'Name': 'Amount', 'Value': float(request_body.get('Amount', 1))},
+                {'Name': 'MpesaReceiptNumber', 'Value': f"SIM{uuid.uuid4().hex[:7].upper()}"},
+                {'Name': 'TransactionDate', 'Value': int(datetime.now().strftime('%Y%m%d%H%M%S'))},
+                {'Name': 'PhoneNumber', 'Value': int(request_body.get('PhoneNumber', 254700000000))},
+            ]}
+        try:
+            self._callbacks.post(url, json={'Body': {'stkCallback': stk_callback}}, timeout=30)
+            self._count('callback sent')
+        except requests.RequestException:
+            self._count('callback failed')
+
+
+class PayPalSimulator(GatewaySimulator):
+    name = 'paypal'
+
+    def failure_reply(self):
+        return 503, {'name': 'SERVICE_UNAVAILABLE', 'message': 'Service Unavailable (simulated)'}
+
+    def route(self, method, path, body):
+        if method != 'POST':
+            return None
+        if path == '/v1/oauth2/token':
+            return 'oauth2/token', 200, {'access_token': f"sim-{uuid.uuid4().hex}", 'token_type': 'Bearer', 'expires_in': 32400}
+        if path == '/v2/checkout/orders':
+            return 'create_order', 201, {'id': uuid.uuid4().hex[:17].upper(), 'status': 'CREATED'}
+        if path.startswith('/v2/checkout/orders/') and path.endswith('/capture'):
+            order_id = path.split('/')[4]
+            return 'capture', 201, {'id': order_id, 'status': 'COMPLETED'}
+        return None
@@ -0,0 +1,394 @@
+"""
+End-to-end load test of the shopping journey against create_app(), with
+local simulators standing in for Safaricom and PayPal
+(benchmarks/gateway_simulators.py).
+
+The app runs on a threaded local server over a seeded catalog, with an
+outbox dispatcher thread (as the `outbox` worker would). Each virtual user
+registers and logs in, then repeats: browse /api/shoes, search, open a shoe,
+add it to the cart and check out, either with M-Pesa (the dispatcher sends
+the STK push, the simulator posts the callback, the user polls the order
+until it is paid) or with PayPal (create + capture); then downloads the
+receipt.
+
+Reports count, errors, throughput and p50/p95/p99 per endpoint, plus the
+time from checkout until the order shows as paid.
+
+Baselines: --save-baseline writes the results to
+benchmarks/baselines/load_suite.json; --check compares a run against it
+and exits non-zero when an endpoint's p95 grew by more than --tolerance, its
+error rate rose, or throughput fell by more than --tolerance. Latencies
+depend on the machine, so record the baseline on the machine (or CI runner
+type) that runs the check, with the same settings.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_suite
+    python -m benchmarks.load_suite --users 16 --duration 60 --mpesa-latency 80 --failure-rate 0.02
+    python -m benchmarks.load_suite --save-baseline
+    python -m benchmarks.load_suite --check
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import requests
+from werkzeug.serving import make_server
+
+from benchmarks.gateway_simulators import PayPalSimulator, SafaricomSimulator
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'load_suite.json')
+PASSWORD = 'load-suite-password'
+PHONE = '0712345678'
+# The settings a baseline is only comparable under
+BASELINE_SETTINGS = ('shoes', 'users', 'duration', 'warmup', 'think_ms', 'paypal_share', 'mpesa_latency',
+                     'paypal_latency', 'jitter', 'failure_rate', 'decline_rate', 'callback_delay', 'seed')
+
+# Requests are reported by route, not by URL
+_ID_SEGMENT = re.compile(r'/(\d+|[A-Z0-9]{17})(?=/|$)')
+
+
+def route_name(method, url):
+    path = url.split('//', 1)[-1].split('/', 1)[-1].split('?', 1)[0]
+    path = _ID_SEGMENT.sub(lambda m: '/<id>' if m.group(1).isdigit() else '/<paypal_id>', '/' + path)
+    return f"{method} {path}"
+
+
+class Recorder:
+    """Latencies and errors per route; requests finishing before `start` (warm-up) are dropped."""
+
+    def __init__(self):
+        self.start = None
+        self.end = None
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.journeys = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def measuring(self):
+        return self.start is not None and self.end is None
+
+    def record(self, name, elapsed_ms, ok):
+        if not self.measuring():
+            return
+        with self._lock:
+            self.latencies[name].append(elapsed_ms)
+            if not ok:
+                self.errors[name] += 1
+
+    def record_journey(self, name, elapsed_ms):
+        if self.measuring():
+            with self._lock:
+                self.journeys[name].append(elapsed_ms)
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def summarize(recorder):
+    seconds = recorder.end - recorder.start
+    endpoints = {}
+    for name, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        endpoints[name] = {
+            'count': len(values),
+            'errors': recorder.errors[name],
+            'error_rate': round(recorder.errors[name] / len(values), 4),
+            'rps': round(len(values) / seconds, 2),
+            'p50': round(percentile(values, 0.50), 1),
+            'p95': round(percentile(values, 0.95), 1),
+            'p99': round(percentile(values, 0.99), 1),
+        }
+    journeys = {}
+    for name, values in sorted(recorder.journeys.items()):
+        values = sorted(values)
+        journeys[name] = {'count': len(values), 'p50': round(percentile(values, 0.50), 1),
+                          'p95': round(percentile(values, 0.95), 1), 'p99': round(percentile(values, 0.99), 1)}
+    total = sum(endpoint['count'] for endpoint in endpoints.values())
+    return {'seconds': round(seconds, 1), 'total_rps': round(total / seconds, 2),
+            'endpoints': endpoints, 'journeys': journeys}
+
+
+class VirtualUser:
+    def __init__(self, index, base_url, recorder, args, stop):
+        self.index = index
+        self.base_url = base_url
+        self.recorder = recorder
+        self.args = args
+        self.stop = stop
+        self.rng = random.Random(args.seed * 1000 + index)
+        self.session = requests.Session()
+
+    def call(self, method, path, expected=(200,), **kwargs):
+        url = f"{self.base_url}{path}"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, timeout=60, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(route_name(method, url), (time.perf_counter() - start) * 1000, False)
+            return None
+        self.recorder.record(route_name(method, url), (time.perf_counter() - start) * 1000,
+                             response.status_code in expected)
+        return response
+
+    def think(self):
+        if self.args.think_ms:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.args.think_ms / 1000)
+
+    def login(self):
+        email = f"load{self.index}@example.com"
+        self.call('POST', '/api/auth/register', expected=(201,), json={'email': email, 'password': PASSWORD})
+        response = self.call('POST', '/api/auth/login', json={'email': email, 'password': PASSWORD})
+        self.session.headers['Authorization'] = f"Bearer {response.json()['access_token']}"
+
+    def run(self):
+        from benchmarks.search_benchmark import BRANDS, QUERIES
+        self.login()
+        while not self.stop.is_set():
+            self.call('GET', f"/api/shoes?page={self.rng.randint(1, 50)}")
+            self.think()
+            self.call('GET', '/api/shoes/search', params={'q': self.rng.choice(QUERIES), 'brand': self.rng.choice(BRANDS)})
+            self.think()
+            shoe_id = self.rng.randint(1, self.args.shoes)
+            self.call('GET', f"/api/shoes/{shoe_id}")
+            self.think()
+            self.call('POST', '/api/cart/', expected=(200, 201),
+                      json={'shoe_id': shoe_id, 'size': str(self.rng.randint(6, 11)), 'quantity': 1})
+            self.think()
+            if self.rng.random() < self.args.paypal_share:
+                order_id = self.pay_with_paypal()
+            else:
+                order_id = self.pay_with_mpesa()
+            if order_id is not None:
+                self.call('GET', f"/api/orders/{order_id}/receipt")
+            self.think()
+
+    def pay_with_mpesa(self):
+        response = self.call('POST', '/api/orders/checkout', expected=(202,), json={'phone_number': PHONE})
+        if response is None or response.status_code != 202:
+            return None
+        order_id = response.json()['order_id']
+        started = time.perf_counter()
+        deadline = time.monotonic() + self.args.payment_timeout
+        while time.monotonic() < deadline and not self.stop.is_set():
+            time.sleep(self.args.poll_interval)
+            response = self.call('GET', f"/api/orders/{order_id}")
+            status = response.json().get('status') if response is not None and response.ok else None
+            if status == 'completed':
+                self.recorder.record_journey('M-Pesa checkout -> paid', (time.perf_counter() - started) * 1000)
+                return order_id
+            if status not in ('pending', None):
+                self.recorder.record_journey(f"M-Pesa checkout -> {status}", (time.perf_counter() - started) * 1000)
+                return None
+        if not self.stop.is_set():
+            self.recorder.record_journey('M-Pesa checkout -> timed out', (time.perf_counter() - started) * 1000)
+        return None
+
+    def pay_with_paypal(self):
+        started = time.perf_counter()
+        response = self.call('POST', '/api/orders/paypal/create')
+        if response is None or not response.ok:
+            return None
+        paypal_order_id = response.json()['orderID']
+        response = self.call('POST', f"/api/orders/paypal/{paypal_order_id}/capture")
+        if response is None or not response.ok:
+            return None
+        self.recorder.record_journey('PayPal create -> captured', (time.perf_counter() - started) * 1000)
+        return response.json()['order_id']
+
+
+def dispatcher_loop(app, stop, interval):
+    """The outbox worker: sends STK pushes, applies callbacks, renders receipts."""
+    from app.extensions import db
+    from app.outbox import dispatch_pending
+    with app.app_context():
+        while not stop.is_set():
+            outcomes = dispatch_pending()
+            db.session.remove()
+            if not any(outcomes.values()):
+                stop.wait(interval)
+
+
+def build_app(tmp_dir, paypal_url):
+    from app import create_app
+    from config import Config
+
+    class LoadConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(tmp_dir, 'load.db')}"
+        DATABASE_REPLICA_URL = None
+        RECEIPT_DIR = os.path.join(tmp_dir, 'receipts')
+        # Every virtual user comes from 127.0.0.1
+        RATE_LIMIT_ENABLED = False
+        # Keep bcrypt from dominating the login step; it has its own benchmark
+        BCRYPT_LOG_ROUNDS = 4
+        PAYPAL_API_BASE = paypal_url
+        PAYPAL_CLIENT_ID = 'load-suite'
+        PAYPAL_CLIENT_SECRET = 'load-suite'
+        OUTBOX_RETRY_BACKOFF = 0.5
+
+    return create_app(LoadConfig)
+
+
+def seed(app, shoes):
+    from app.extensions import db
+    from app.models import ShoeSize
+    from benchmarks.search_benchmark import seed as seed_shoes
+    with app.app_context():
+        db.create_all()
+        seed_shoes(shoes)
+        # Enough stock that checkouts measure the code, not sold-out sizes
+        db.session.execute(ShoeSize.__table__.update().values(stock=100_000))
+        db.session.commit()
+
+
+def print_report(summary):
+    print(f"\n{'endpoint':<44} {'count':>7} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, e in summary['endpoints'].items():
+        print(f"{name:<44} {e['count']:>7} {e['errors']:>7} {e['rps']:>8.1f} {e['p50']:>8.1f} {e['p95']:>8.1f} {e['p99']:>8.1f}")
+    print(f"{'total':<44} {sum(e['count'] for e in summary['endpoints'].values()):>7} "
+          f"{sum(e['errors'] for e in summary['endpoints'].values()):>7} {summary['total_rps']:>8.1f}")
+    if summary['journeys']:
+        print(f"\n{'journey':<44} {'count':>7} {'':>7} {'':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for name, j in summary['journeys'].items():
+            print(f"{name:<44} {j['count']:>7} {'':>7} {'':>8} {j['p50']:>8.1f} {j['p95']:>8.1f} {j['p99']:>8.1f}")
+
+
+def compare(summary, baseline, tolerance, slack_ms):
+    """Returns a list of regressions against the baseline."""
+    problems = []
+    for name, base in baseline['endpoints'].items():
+        current = summary['endpoints'].get(name)
+        if current is None:
+            problems.append(f"{name}: not exercised in this run")
+            continue
+        # A few ms of slack so near-zero latencies don't fail on noise
+        limit = base['p95'] * (1 + tolerance) + slack_ms
+        if current['p95'] > limit:
+            problems.append(f"{name}: p95 {current['p95']:.1f} ms > {limit:.1f} ms (baseline {base['p95']:.1f} ms)")
+        if current['error_rate'] > base['error_rate'] + 0.01:
+            problems.append(f"{name}: error rate {current['error_rate']:.2%} (baseline {base['error_rate']:.2%})")
+    floor = baseline['total_rps'] * (1 - tolerance)
+    if summary['total_rps'] < floor:
+        problems.append(f"throughput {summary['total_rps']:.1f} req/s < {floor:.1f} (baseline {baseline['total_rps']:.1f})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shoes', type=int, default=20000, help='Catalog size')
+    parser.add_argument('--users', type=int, default=8, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Seconds of load before measuring')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Mean pause between a user\'s steps')
+    parser.add_argument('--paypal-share', type=float, default=0.25, help='Share of checkouts paid with PayPal')
+    parser.add_argument('--mpesa-latency', type=float, default=50.0, help='Simulated Safaricom latency, ms')
+    parser.add_argument('--paypal-latency', type=float, default=80.0, help='Simulated PayPal latency, ms')
+    parser.add_argument('--jitter', type=float, default=20.0, help='Random extra gateway latency, up to this many ms')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Share of gateway requests failing with 503')
+    parser.add_argument('--decline-rate', type=float, default=0.0, help='Share of STK pushes the customer cancels')
+    parser.add_argument('--callback-delay', type=float, default=0.5, help='Seconds from STK push to callback')
+    parser.add_argument('--poll-interval', type=float, default=0.25, help='Order status polling interval')
+    parser.add_argument('--payment-timeout', type=float, default=30.0)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the baseline')
+    parser.add_argument('--check', action='store_true', help='Exit 1 if this run regressed against the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed relative p95 increase / throughput drop')
+    parser.add_argument('--slack-ms', type=float, default=5.0, help='Allowed absolute p95 increase on top')
+    parser.add_argument('--json', help='Also write the results to this file')
+    args = parser.parse_args()
+
+    # The M-Pesa client reads its credentials from the environment when the app is imported
+    for name, value in {'CONSUMER_KEY': 'load-suite', 'CONSUMER_SECRET': 'load-suite', 'PASS_KEY': 'load-suite',
+                        'BUSINESS_SHORT_CODE': '174379', 'API_ENVIRONMENT': 'sandbox',
+                        'CALLBACK_URL': 'https://shop.example.test/api/orders/callback'}.items():
+        os.environ[name] = value
+    os.environ.pop('MPESA_TOKEN_CACHE_FILE', None)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    safaricom = SafaricomSimulator(latency_ms=args.mpesa_latency, jitter_ms=args.jitter, failure_rate=args.failure_rate,
+                                   decline_rate=args.decline_rate, callback_delay=args.callback_delay, seed=args.seed).start()
+    paypal = PayPalSimulator(latency_ms=args.paypal_latency, jitter_ms=args.jitter, failure_rate=args.failure_rate,
+                             seed=args.seed + 1).start()
+
+    app = build_app(tmp_dir.name, paypal.url)
+    from app.api.orders import mpesa
+    mpesa.api_url = safaricom.url
+    # It logs every STK push payload at DEBUG, and into logs/mpesa.log
+    from app.mpesa_handler import file_handler
+    mpesa_logger = logging.getLogger('app.mpesa_handler')
+    mpesa_logger.setLevel(logging.WARNING)
+    mpesa_logger.removeHandler(file_handler)
+    print(f"Seeding {args.shoes} shoes...")
+    seed(app, args.shoes)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    safaricom.callback_base = base_url
+
+    stop = threading.Event()
+    recorder = Recorder()
+    dispatcher = threading.Thread(target=dispatcher_loop, args=(app, stop, 0.05), daemon=True)
+    dispatcher.start()
+    users = [threading.Thread(target=VirtualUser(i, base_url, recorder, args, stop).run, daemon=True)
+             for i in range(args.users)]
+    print(f"{args.users} users, {args.warmup:.0f}s warm-up + {args.duration:.0f}s measured, "
+          f"M-Pesa {args.mpesa_latency:.0f}ms / PayPal {args.paypal_latency:.0f}ms (+{args.jitter:.0f}ms jitter), "
+          f"{args.failure_rate:.0%} gateway failures")
+    for user in users:
+        user.start()
+    time.sleep(args.warmup)
+    recorder.start = time.perf_counter()
+    time.sleep(args.duration)
+    recorder.end = time.perf_counter()
+    stop.set()
+    for thread in users + [dispatcher]:
+        thread.join(timeout=args.payment_timeout + 60)
+    server.shutdown()
+    safaricom.stop()
+    paypal.stop()
+    tmp_dir.cleanup()
+
+    summary = summarize(recorder)
+    summary['settings'] = {name: getattr(args, name) for name in BASELINE_SETTINGS}
+    summary['gateways'] = {'safaricom': dict(safaricom.counts), 'paypal': dict(paypal.counts)}
+    print_report(summary)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(summary, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != summary['settings']:
+            print(f"\nBaseline was recorded with other settings: {baseline['settings']}")
+            sys.exit(2)
+        problems = compare(summary, baseline, args.tolerance, args.slack_ms)
+        if problems:
+            print('\nRegressions against the baseline:')
+            for problem in problems:
+                print(f"  {problem}")
+            sys.exit(1)
+        print('\nNo regressions against the baseline.')
+
+
+if __name__ == '__main__':
+    main()
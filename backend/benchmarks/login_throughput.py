@@ -0,0 +1,142 @@
+"""
+Measures login throughput and its effect on other traffic under concurrent
+load, with bcrypt running on the bounded hashing pool versus effectively
+unbounded (every request thread hashing at once, as when it ran inline).
+
+The app is served by a threaded local server (like a gthread worker). Login
+clients hammer POST /api/auth/login while browse clients fetch a product;
+the report shows logins/s, shed (503) logins and the latencies of both.
+
+Usage (from the backend directory):
+    python -m benchmarks.login_throughput
+    python -m benchmarks.login_throughput --login-clients 32 --duration 20 --rounds 12
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+from werkzeug.serving import make_server
+
+from app import create_app
+from app.extensions import db, bcrypt
+from app.models import User
+from benchmarks.search_benchmark import seed as seed_shoes
+from config import Config
+
+PASSWORD = 'correct horse battery staple'
+
+
+def build_app(db_path, rounds, workers, queue, timeout=2.0):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        CATALOG_CACHE_ENABLED = False
+        BCRYPT_LOG_ROUNDS = rounds
+        PASSWORD_HASH_WORKERS = workers
+        PASSWORD_HASH_QUEUE = queue
+        PASSWORD_HASH_TIMEOUT = timeout
+
+    return create_app(BenchConfig)
+
+
+def seed(app, users):
+    with app.app_context():
+        db.create_all()
+        seed_shoes(50)
+        password_hash = bcrypt.generate_password_hash(PASSWORD).decode('utf-8')
+        db.session.execute(User.__table__.insert(), [
+            {'email': f"user{i}@example.com", 'password': password_hash} for i in range(users)
+        ])
+        db.session.commit()
+
+
+def client_loop(url, make_request, stop_at, results):
+    session = requests.Session()
+    i = 0
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        response = make_request(session, url, i)
+        results.append((response.status_code, (time.perf_counter() - start) * 1000))
+        i += 1
+        if response.status_code == 503:
+            # Well-behaved clients back off as told
+            time.sleep(float(response.headers.get('Retry-After', 1)))
+
+
+def login_request(users):
+    def request(session, url, i):
+        email = f"user{(threading.get_ident() + i) % users}@example.com"
+        return session.post(f"{url}/api/auth/login", json={'email': email, 'password': PASSWORD})
+    return request
+
+
+def browse_request(session, url, i):
+    return session.get(f"{url}/api/shoes/{i % 50 + 1}")
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float('nan')
+
+
+def run(label, args, workers, queue, timeout, db_path):
+    app = build_app(db_path, args.rounds, workers, queue, timeout)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+
+    logins, browses = [], []
+    stop_at = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client_loop, args=(url, login_request(args.users), stop_at, logins))
+               for _ in range(args.login_clients)]
+    threads += [threading.Thread(target=client_loop, args=(url, browse_request, stop_at, browses))
+                for _ in range(args.browse_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+    # Let hashes still running finish before the next scenario starts
+    app.extensions['password_hasher'].shutdown()
+
+    statuses = Counter(status for status, _ in logins)
+    ok = [ms for status, ms in logins if status == 200]
+    browse_ms = [ms for status, ms in browses if status == 200]
+    print(f"{label:<12} {statuses[200] / args.duration:>9.1f} {statuses[503]:>6} "
+          f"{statistics.median(ok) if ok else float('nan'):>9.0f} {percentile(ok, 0.95):>8.0f} "
+          f"{len(browse_ms) / args.duration:>9.1f} {statistics.median(browse_ms):>9.1f} {percentile(browse_ms, 0.95):>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--browse-clients', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds per scenario')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt cost')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Hashing pool size')
+    parser.add_argument('--queue', type=int, default=8, help='Hashing pool queue depth')
+    parser.add_argument('--timeout', type=float, default=2.0, help='Hashing pool wait timeout')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    db_path = os.path.join(tmp_dir.name, 'bench.db')
+    seed(build_app(db_path, args.rounds, args.workers, args.queue), args.users)
+
+    print(f"{os.cpu_count()} CPUs, {args.login_clients} login clients, {args.browse_clients} browse clients, cost {args.rounds}, "
+          f"{args.duration:.0f}s per scenario")
+    print(f"{'hashing':<12} {'logins/s':>9} {'shed':>6} {'login p50':>9} {'p95 ms':>8} "
+          f"{'browse/s':>9} {'browse p50':>9} {'p95 ms':>8}")
+    # One hashing thread per request thread and no timeout: the old inline behaviour
+    unbounded = args.login_clients + args.browse_clients
+    run('unbounded', args, unbounded, 0, 3600, db_path)
+    run(f"pool of {args.workers}", args, args.workers, args.queue, args.timeout, db_path)
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Measures what the Prometheus instrumentation adds to a request: the cost of
+one latency histogram observation, and the per-request time of cached
+product reads (the cheapest, most frequent requests) with METRICS_ENABLED on
+and off. The two apps take turns in many short rounds (alternating which
+goes first) so drift and noise hit both alike; the medians are compared.
+
+With --uncached the catalog response cache is off, so every request queries
+the database (the typical request, rather than the best case).
+
+With --multiprocess the metrics are written to memory-mapped files in a
+temporary PROMETHEUS_MULTIPROC_DIR, as under gunicorn in production.
+
+Usage (from the backend directory):
+    python -m benchmarks.metrics_overhead
+    python -m benchmarks.metrics_overhead --multiprocess --uncached --rounds 100
+"""
+import os
+import sys
+import tempfile
+
+if '--multiprocess' in sys.argv and not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    # prometheus_client picks its value storage when it is first imported
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='metrics-bench-')
+
+import argparse
+import statistics
+import time
+
+from app import create_app
+from app.extensions import db
+from app.metrics import REQUEST_LATENCY
+from benchmarks.search_benchmark import seed as seed_shoes
+from config import Config
+
+
+def build_app(db_path, metrics_enabled, cache_enabled=True):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{db_path}"
+        METRICS_ENABLED = metrics_enabled
+        CATALOG_CACHE_ENABLED = cache_enabled
+        RATE_LIMIT_ENABLED = False
+
+    return create_app(BenchConfig)
+
+
+def observation_cost(iterations):
+    """Nanoseconds per request-path update (one histogram observation)."""
+    histogram = REQUEST_LATENCY.labels('bench_bp', 'bench_bp.view', 'GET', '200')
+    start = time.perf_counter()
+    for _ in range(iterations):
+        histogram.observe(0.003)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def request_round(client, paths, requests):
+    """Microseconds per request over one round."""
+    start = time.perf_counter()
+    for i in range(requests):
+        client.get(paths[i % len(paths)])
+    return (time.perf_counter() - start) / requests * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shoes', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200, help='Requests per round')
+    parser.add_argument('--rounds', type=int, default=60)
+    parser.add_argument('--iterations', type=int, default=200_000, help='Observations for the micro benchmark')
+    parser.add_argument('--uncached', action='store_true', help='Disable the catalog response cache')
+    parser.add_argument('--multiprocess', action='store_true', help='Use multiprocess (mmap file) storage')
+    args = parser.parse_args()
+
+    storage = f"multiprocess ({os.environ['PROMETHEUS_MULTIPROC_DIR']})" if os.environ.get('PROMETHEUS_MULTIPROC_DIR') else 'in-memory'
+    print(f"Metric storage: {storage}")
+    print(f"Histogram observation: {observation_cost(args.iterations):.0f} ns")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        apps = {name: build_app(db_path, name == 'on', not args.uncached) for name in ('off', 'on')}
+        with apps['off'].app_context():
+            db.create_all()
+            seed_shoes(args.shoes)
+
+        paths = [f"/api/shoes/{i % args.shoes + 1}" for i in range(50)] + ['/api/shoes?ids=1,2,3,4,5']
+        clients = {name: app.test_client() for name, app in apps.items()}
+        for client in clients.values():
+            request_round(client, paths, len(paths))  # Warm the catalog caches
+
+        timings = {'off': [], 'on': []}
+        for i in range(args.rounds):
+            order = ('off', 'on') if i % 2 == 0 else ('on', 'off')
+            for name in order:
+                timings[name].append(request_round(clients[name], paths, args.requests))
+
+    off, on = statistics.median(timings['off']), statistics.median(timings['on'])
+    print(f"{'metrics':<8} {'us/request (median of rounds)':>30}")
+    print(f"{'off':<8} {off:>30.1f}")
+    print(f"{'on':<8} {on:>30.1f}")
+    print(f"Overhead: {on - off:+.1f} us/request ({(on - off) / off * 100:+.1f}%)")
+
+
+if __name__ == '__main__':
+    main()
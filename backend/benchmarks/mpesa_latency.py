@@ -0,0 +1,160 @@
+"""
+Measures the per-checkout cost of the M-Pesa calls against a local HTTPS
+stub of the Safaricom API: the old pattern (a fresh connection and a token
+fetch before every STK push) versus MpesaHandler's cached token and pooled
+keep-alive session.
+
+The stub adds --rtt milliseconds to every request to stand in for the round
+trip to Safaricom; the TLS handshakes are real (self-signed certificate).
+
+Usage (from the backend directory):
+    python -m benchmarks.mpesa_latency
+    python -m benchmarks.mpesa_latency --requests 200 --rtt 40
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+
+def write_self_signed_cert(directory):
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, 'stub.pem')
+    key_path = os.path.join(directory, 'stub.key')
+    with open(cert_path, 'wb') as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+class StubSafaricom(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    rtt = 0.0
+    counts = {'token': 0, 'stk': 0, 'connections': 0}
+
+    def setup(self):
+        super().setup()
+        StubSafaricom.counts['connections'] += 1
+
+    def _reply(self, body):
+        time.sleep(self.rtt)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        StubSafaricom.counts['token'] += 1
+        self._reply({'access_token': 'stub-token', 'expires_in': '3599'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        StubSafaricom.counts['stk'] += 1
+        self._reply({'ResponseCode': '0', 'CheckoutRequestID': f"ws_CO_{StubSafaricom.counts['stk']}",
+                     'ResponseDescription': 'Success. Request accepted for processing'})
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(cert_path, key_path, rtt):
+    StubSafaricom.rtt = rtt
+    server = ThreadingHTTPServer(('localhost', 0), StubSafaricom)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    server.socket = context.wrap_socket(server.socket, server_side=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"https://localhost:{server.server_address[1]}"
+
+
+def legacy_stk_push(handler, phone_number, amount, order_id):
+    """The pre-cache behaviour: a new connection and a new token for every push."""
+    url = f'{handler.api_url}/oauth/v1/generate?grant_type=client_credentials'
+    token = requests.get(url, headers={'Authorization': 'Basic x'}, timeout=10).json()['access_token']
+    password, timestamp = handler.generate_password()
+    response = requests.post(
+        f'{handler.api_url}/mpesa/stkpush/v1/processrequest',
+        json={'BusinessShortCode': handler.short_code, 'Password': password, 'Timestamp': timestamp,
+              'Amount': str(amount), 'PhoneNumber': phone_number, 'AccountReference': f'Order_{order_id}'},
+        headers={'Authorization': f'Bearer {token}'}, timeout=30,
+    )
+    return response.json()
+
+
+def measure(fn, count):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--rtt', type=float, default=20.0, help='Simulated gateway round trip in ms')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+    cert_path, key_path = write_self_signed_cert(tmp_dir.name)
+    os.environ['REQUESTS_CA_BUNDLE'] = cert_path
+    for name, value in {'CONSUMER_KEY': 'key', 'CONSUMER_SECRET': 'secret', 'PASS_KEY': 'pass',
+                        'BUSINESS_SHORT_CODE': '174379', 'API_ENVIRONMENT': 'sandbox',
+                        'CALLBACK_URL': 'https://example.com/api/orders/callback'}.items():
+        os.environ.setdefault(name, value)
+    os.environ.pop('MPESA_TOKEN_CACHE_FILE', None)
+
+    from app.mpesa_handler import MpesaHandler
+    logging.getLogger('app.mpesa_handler').setLevel(logging.INFO)
+    server, url = start_stub(cert_path, key_path, args.rtt / 1000)
+    handler = MpesaHandler()
+    handler.api_url = url
+
+    print(f"{'client':<22} {'median ms':>10} {'p95 ms':>8} {'token calls':>12} {'connections':>12}")
+    for label, fn in (
+        ('fresh conn + token', lambda i: legacy_stk_push(handler, '254712345678', 1, i)),
+        ('pooled + cached', lambda i: handler.initiate_stk_push('254712345678', 1, i, handler.callback_url)),
+    ):
+        StubSafaricom.counts.update(token=0, stk=0, connections=0)
+        median, p95 = measure(fn, args.requests)
+        counts = StubSafaricom.counts
+        print(f"{label:<22} {median:>10.1f} {p95:>8.1f} {counts['token']:>12} {counts['connections']:>12}")
+
+    server.shutdown()
+    tmp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Dumps 1k/10k shoes and orders with marshmallow + jsonify and with the
+precompiled serializers + json_response, checks the bytes match, and
+reports the timings.
+
+Usage (from the backend directory):
+    python -m benchmarks.serialization_benchmark
+    python -m benchmarks.serialization_benchmark --sizes 1000 10000 50000 --repeat 5
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+from sqlalchemy.orm import selectinload
+
+from app import create_app
+from app.extensions import db
+from app.models import User, Shoe, Cart, Order, OrderItem, Payment
+from app.schemas import ShoeSchema, OrderSchema
+from app.serializers import compile_schema, json_response
+from benchmarks.search_benchmark import seed as seed_shoes
+from config import Config
+
+
+def seed_orders(count, shoe_count, seed_value=7):
+    rng = random.Random(seed_value)
+    user = User(email='bench@example.com', password=None)
+    db.session.add(user)
+    db.session.flush()
+
+    carts, orders, items, payments = [], [], [], []
+    start = datetime(2025, 1, 1)
+    for order_id in range(1, count + 1):
+        orders.append({'id': order_id, 'user_id': user.id, 'total_amount': 0.0,
+                       'status': 'completed' if order_id % 2 else 'pending',
+                       'created_at': start + timedelta(minutes=order_id),
+                       'checkout_request_id': f"ws_CO_{order_id}"})
+        for _ in range(2):
+            cart_id = len(carts) + 1
+            carts.append({'id': cart_id, 'user_id': user.id, 'shoe_id': rng.randint(1, shoe_count),
+                          'size': str(rng.randint(6, 11)), 'quantity': rng.randint(1, 3), 'paid': True})
+            items.append({'order_id': order_id, 'cart_id': cart_id})
+        if order_id % 2:
+            payments.append({'order_id': order_id, 'mpesa_code': f"QK{order_id:08d}", 'amount': 1.0,
+                             'phone_number': '254712345678', 'transaction_date': start})
+
+    db.session.execute(Cart.__table__.insert(), carts)
+    db.session.execute(Order.__table__.insert(), orders)
+    db.session.execute(OrderItem.__table__.insert(), items)
+    db.session.execute(Payment.__table__.insert(), payments)
+    db.session.commit()
+
+
+def measure(fn, repeat):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def compare(label, objects, schema, repeat):
+    compiled = compile_schema(schema)
+    old_ms, old_response = measure(lambda: jsonify(schema.dump(objects)), repeat)
+    new_ms, new_response = measure(lambda: json_response(compiled.dump(objects)), repeat)
+    identical = old_response.get_data() == new_response.get_data()
+    print(f"{label:<16} {len(objects):>7} {old_ms:>12.1f} {new_ms:>12.1f} {old_ms / new_ms:>8.1f}x  {'yes' if identical else 'NO'}")
+    return identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    largest = max(args.sizes)
+
+    tmp_dir = tempfile.TemporaryDirectory()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp_dir.name, 'bench.db')
+
+    app = create_app(BenchConfig)
+    all_identical = True
+    with app.app_context(), app.test_request_context():
+        db.create_all()
+        seed_shoes(largest)
+        seed_orders(largest, largest)
+
+        print(f"{'payload':<16} {'objects':>7} {'marshmallow':>12} {'compiled':>12} {'speedup':>9}  identical")
+        for size in sorted(args.sizes):
+            shoes = Shoe.query.order_by(Shoe.id).limit(size).all()
+            orders = (
+                Order.query.order_by(Order.id).limit(size)
+                .options(
+                    selectinload(Order.items).selectinload(OrderItem.cart).selectinload(Cart.shoe),
+                    selectinload(Order.payment),
+                )
+                .all()
+            )
+            all_identical &= compare('ShoeSchema', shoes, ShoeSchema(many=True), args.repeat)
+            all_identical &= compare('OrderSchema', orders, OrderSchema(many=True), args.repeat)
+            db.session.expunge_all()
+
+    tmp_dir.cleanup()
+    if not all_identical:
+        raise SystemExit('Compiled output differs from marshmallow output')
+
+
+if __name__ == '__main__':
+    main()
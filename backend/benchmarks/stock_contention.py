@@ -0,0 +1,140 @@
+"""
+Stress test for stock reservations: many threads, each checking out its own
+cart, race for the last few units of one size. Checks that exactly the
+available units are sold, stock never goes negative and every sold unit has
+a reservation, then reports throughput.
+
+Runs against a temporary SQLite file by default; pass --database-url to use
+PostgreSQL, where the conditional UPDATEs really run concurrently.
+
+Usage (from the backend directory):
+    python -m benchmarks.stock_contention
+    python -m benchmarks.stock_contention --threads 64 --stock 5 --rounds 10
+    python -m benchmarks.stock_contention --database-url postgresql://localhost/shoes_bench
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import create_app
+from app.extensions import db
+from app.inventory import InsufficientStock, reserve_stock
+from app.loaders import cart_for_checkout
+from app.models import User, Shoe, ShoeSize, Cart, Order, StockReservation
+from config import Config
+
+SIZE = '9'
+
+
+def seed(threads, stock):
+    shoe = Shoe(name='Contended', brand='Bench', description='-', price=100.0,
+                details='-', image='-', rating=4.0)
+    shoe.size_inventory = [ShoeSize(size=SIZE, stock=stock)]
+    db.session.add(shoe)
+    users = [User(email=f"racer{i}@example.com", password=None) for i in range(threads)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all(Cart(user_id=user.id, shoe_id=shoe.id, size=SIZE, quantity=1) for user in users)
+    db.session.commit()
+    return shoe.id, [user.id for user in users]
+
+
+def checkout(app, user_id, barrier, outcomes, retries=20):
+    with app.app_context():
+        barrier.wait()
+        for attempt in range(retries):
+            try:
+                cart_items = Cart.query.options(cart_for_checkout()).filter_by(user_id=user_id, paid=False).all()
+                order = Order(user_id=user_id, total_amount=100.0, status='pending')
+                db.session.add(order)
+                db.session.flush()
+                reserve_stock(order, cart_items)
+                for item in cart_items:
+                    item.paid = True
+                db.session.commit()
+                outcomes['sold'] += 1
+                return
+            except InsufficientStock:
+                db.session.rollback()
+                outcomes['sold_out'] += 1
+                return
+            except OperationalError:
+                # SQLite "database is locked": back off and retry like a client would
+                db.session.rollback()
+                outcomes['retries'] += 1
+                time.sleep(random.uniform(0, 0.005 * (attempt + 1)))
+            finally:
+                db.session.remove()
+        outcomes['gave_up'] += 1
+
+
+def run_round(app, threads, stock):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        shoe_id, user_ids = seed(threads, stock)
+
+    outcomes = Counter()
+    barrier = threading.Barrier(threads)
+    workers = [threading.Thread(target=checkout, args=(app, user_id, barrier, outcomes)) for user_id in user_ids]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        left = db.session.execute(select(ShoeSize.stock).where(ShoeSize.shoe_id == shoe_id)).scalar()
+        reserved = db.session.execute(select(func.coalesce(func.sum(StockReservation.quantity), 0))).scalar()
+        db.session.remove()
+
+    problems = []
+    if left < 0:
+        problems.append(f"stock went negative ({left})")
+    if outcomes['sold'] != min(stock, threads - outcomes['gave_up']):
+        problems.append(f"sold {outcomes['sold']} of {stock} units")
+    if outcomes['sold'] + left != stock:
+        problems.append(f"sold {outcomes['sold']} + left {left} != {stock}")
+    if reserved != outcomes['sold']:
+        problems.append(f"{reserved} units reserved for {outcomes['sold']} sales")
+    return outcomes, elapsed, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--stock', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--database-url', default=None)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.TemporaryDirectory()
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.database_url or 'sqlite:///' + os.path.join(tmp_dir.name, 'bench.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {} if args.database_url else {'connect_args': {'timeout': 30}}
+
+    app = create_app(BenchConfig)
+    print(f"{'round':>5} {'sold':>5} {'sold out':>9} {'retries':>8} {'gave up':>8} {'ms':>8}  result")
+    failed = False
+    for round_no in range(1, args.rounds + 1):
+        outcomes, elapsed, problems = run_round(app, args.threads, args.stock)
+        failed |= bool(problems)
+        print(f"{round_no:>5} {outcomes['sold']:>5} {outcomes['sold_out']:>9} {outcomes['retries']:>8} "
+              f"{outcomes['gave_up']:>8} {elapsed * 1000:>8.1f}  {'; '.join(problems) or 'ok'}")
+
+    tmp_dir.cleanup()
+    if failed:
+        raise SystemExit('Stock invariants violated')
+
+
+if __name__ == '__main__':
+    main()
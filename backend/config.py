@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,13 +12,18 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # Configure SQLite. The database file will be in the 'instance' folder.
-    SQLALCHEMY_DATABASE_URI = "sqlite:///" + os.path.join(BASE_DIR, "shoes.db")
+    # DATABASE_URL (e.g. postgresql://...) overrides it.
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', "sqlite:///" + os.path.join(BASE_DIR, "shoes.db"))
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT', 587))
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS', 'true').lower() in ['true', 'on', '1']
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    # Mail worker (flask mail send): claim lease, retry limit and base backoff in seconds
+    MAIL_LEASE_SECONDS = int(os.environ.get('MAIL_LEASE_SECONDS', 300))
+    MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 6))
+    MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF', 30))
     NEWSLETTER_RECIPIENT = os.environ.get('NEWSLETTER_RECIPIENT')
 
 
@@ -28,4 +34,143 @@ class Config:
 
     PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID')
     PAYPAL_CLIENT_SECRET = os.environ.get('PAYPAL_CLIENT_SECRET')
-    PAYPAL_API_BASE = os.environ.get('PAYPAL_API_BASE')
\ No newline at end of file
+    PAYPAL_API_BASE = os.environ.get('PAYPAL_API_BASE')
+    # Seconds to wait for a connection / for a response, consecutive failures
+    # (errors, timeouts, 5xx) before the circuit opens, and how long it stays open
+    PAYPAL_CONNECT_TIMEOUT = float(os.environ.get('PAYPAL_CONNECT_TIMEOUT', 5))
+    PAYPAL_READ_TIMEOUT = float(os.environ.get('PAYPAL_READ_TIMEOUT', 20))
+    PAYPAL_POOL_SIZE = int(os.environ.get('PAYPAL_POOL_SIZE', 10))
+    PAYPAL_BREAKER_THRESHOLD = int(os.environ.get('PAYPAL_BREAKER_THRESHOLD', 5))
+    PAYPAL_BREAKER_RESET_TIMEOUT = float(os.environ.get('PAYPAL_BREAKER_RESET_TIMEOUT', 30))
+
+    # --- Faceted search ---
+    # Upper bounds of the price buckets (the last bucket is open-ended) and the
+    # minimum ratings of the "N+ stars" bands.
+    FACET_PRICE_BUCKETS = [50, 100, 150, 200]
+    FACET_RATING_BANDS = [4.5, 4.0, 3.5, 3.0]
+
+    # --- Pagination ---
+    # total=approx stops counting matching rows at this many
+    APPROX_COUNT_CAP = 1000
+    # Maximum number of ids accepted by /api/shoes?ids=...
+    BATCH_LOOKUP_MAX_IDS = 100
+
+    # --- Catalog response cache ---
+    # Per-worker LRU of serialized product responses. The catalog version is
+    # re-read from the database at most every CATALOG_VERSION_POLL_INTERVAL
+    # seconds, which bounds how stale another worker's write can appear.
+    CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 512))
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+    CATALOG_VERSION_POLL_INTERVAL = float(os.environ.get('CATALOG_VERSION_POLL_INTERVAL', 1.0))
+
+    # --- Query budgets ---
+    # Raise when a view issues more SQL statements than its @query_budget allows.
+    # Always on when TESTING; opt in elsewhere (e.g. staging) with this flag.
+    QUERY_BUDGET_ENFORCED = os.environ.get('QUERY_BUDGET_ENFORCED', 'false').lower() in ['true', 'on', '1']
+
+    # --- Request profiling ---
+    # Time SQL, serialization, bcrypt, PDF rendering and gateway calls per
+    # request; report them in a Server-Timing header and a JSON log line.
+    # Requests slower than PROFILING_SLOW_REQUEST_MS, or that repeat one
+    # statement PROFILING_N_PLUS_ONE_THRESHOLD+ times, are logged as warnings.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'false').lower() in ['true', 'on', '1']
+    PROFILING_SLOW_REQUEST_MS = float(os.environ.get('PROFILING_SLOW_REQUEST_MS', 500))
+    PROFILING_N_PLUS_ONE_THRESHOLD = int(os.environ.get('PROFILING_N_PLUS_ONE_THRESHOLD', 5))
+
+    # --- Metrics ---
+    # Prometheus metrics at /metrics, behind METRICS_TOKEN as a bearer token.
+    # Required in production: without it /metrics answers 401 except on a
+    # debug/testing server. Across processes: see PROMETHEUS_MULTIPROC_DIR in app/metrics.py.
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ['true', 'on', '1']
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # --- Stock reservations ---
+    # Seconds a pending order holds its stock before the sweeper releases it
+    STOCK_RESERVATION_TTL = int(os.environ.get('STOCK_RESERVATION_TTL', 900))
+
+    # --- Outbox dispatcher ---
+    # A claimed message is retried by another dispatcher after the lease runs
+    # out; retryable failures back off exponentially from OUTBOX_RETRY_BACKOFF.
+    OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', 120))
+    OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+    OUTBOX_RETRY_BACKOFF = float(os.environ.get('OUTBOX_RETRY_BACKOFF', 2.0))
+
+    # --- M-Pesa reconciliation ---
+    # Pending orders older than RECONCILE_AFTER_SECONDS without a callback are
+    # looked up with the STK query API, at most RECONCILE_RATE queries per second
+    # from RECONCILE_CONCURRENCY threads, RECONCILE_BATCH_SIZE orders per commit.
+    RECONCILE_AFTER_SECONDS = int(os.environ.get('RECONCILE_AFTER_SECONDS', 300))
+    RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', 100))
+    RECONCILE_CONCURRENCY = int(os.environ.get('RECONCILE_CONCURRENCY', 4))
+    RECONCILE_RATE = float(os.environ.get('RECONCILE_RATE', 5))
+
+    # --- Receipts ---
+    # Rendered PDF receipts, stored by content hash. With USE_X_SENDFILE the
+    # front web server (nginx/Apache) streams the file instead of the worker.
+    RECEIPT_DIR = os.environ.get('RECEIPT_DIR', os.path.join(BASE_DIR, 'instance', 'receipts'))
+    RECEIPT_MAX_AGE = int(os.environ.get('RECEIPT_MAX_AGE', 31536000))
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() in ['true', 'on', '1']
+
+    # --- Order status stream ---
+    # GET /api/orders/<id>/events. Status changes reach the streams of every
+    # process through the order_event table, polled every
+    # ORDER_EVENTS_POLL_SECONDS; ORDER_EVENTS_URL=redis://... pushes them over
+    # Redis instead, and ORDER_EVENTS_URL=local keeps them in-process. Streams
+    # also re-check the database every ORDER_EVENTS_RECHECK_SECONDS, end after
+    # ORDER_EVENTS_STREAM_SECONDS, and the client reconnects.
+    # Capacity: each open stream holds one server thread for its whole life,
+    # so a process serves at most ORDER_EVENTS_MAX_STREAMS of them and answers
+    # 503 beyond that (the page then fetches the order instead). Keep it well
+    # below the gunicorn --threads in the procfile (16), or customers waiting
+    # on payment would starve every other request.
+    ORDER_EVENTS_URL = os.environ.get('ORDER_EVENTS_URL', '')
+    ORDER_EVENTS_POLL_SECONDS = float(os.environ.get('ORDER_EVENTS_POLL_SECONDS', 1))
+    ORDER_EVENTS_MAX_STREAMS = int(os.environ.get('ORDER_EVENTS_MAX_STREAMS', 4))
+    ORDER_EVENTS_RECHECK_SECONDS = float(os.environ.get('ORDER_EVENTS_RECHECK_SECONDS', 5))
+    ORDER_EVENTS_STREAM_SECONDS = float(os.environ.get('ORDER_EVENTS_STREAM_SECONDS', 60))
+
+    # --- Password hashing ---
+    # bcrypt cost; hashes at another cost are upgraded on the next login
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Concurrent bcrypt jobs per worker, jobs allowed to wait, and how long
+    # one may wait before the request is shed with 503
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 8))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 2))
+
+    # --- Rate limiting ---
+    # Token buckets per client IP and per user: '<requests>/<second|minute|hour|day>'
+    # keyed by endpoint or blueprint (see app/rate_limit.py). RATE_LIMITS (JSON)
+    # replaces the defaults; RATE_LIMIT_STORAGE_URL (redis://...) shares the
+    # buckets across workers instead of keeping them per worker.
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RATE_LIMIT_STORAGE_URL = os.environ.get('RATE_LIMIT_STORAGE_URL', '')
+    RATE_LIMITS = json.loads(os.environ.get('RATE_LIMITS', 'null')) or {
+        'auth_bp.login': '10/minute',
+        'auth_bp.register': '5/minute',
+        'orders_bp.checkout': '10/minute',
+        'orders_bp.create_paypal_order': '10/minute',
+        'orders_bp.capture_paypal_payment': '10/minute',
+        'newsletter_bp': '3/minute',
+    }
+    # Number of proxies in front of the app (e.g. 1 on Render) whose
+    # X-Forwarded-For is trusted for the client IP
+    PROXY_FIX_X_FOR = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+
+    # --- Database engines ---
+    # See app/database.py. DATABASE_REPLICA_URL adds a read replica that the
+    # catalog and order GET endpoints read from.
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+    # SQLite
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Postgres (per worker process)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ['true', 'on', '1']
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
@@ -0,0 +1,9 @@
+# Loaded by gunicorn from the working directory (see procfile).
+import os
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges from the shared metrics directory
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
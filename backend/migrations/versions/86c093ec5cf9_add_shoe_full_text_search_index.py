@@ -0,0 +1,62 @@
+"""Add shoe full-text search index
+
+Revision ID: 86c093ec5cf9
+Revises: 9fce5dad2f4c
+Create Date: 2026-10-18 09:12:41.503112
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '86c093ec5cf9'
+down_revision = '9fce5dad2f4c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        op.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS shoe_fts USING fts5(
+            name, description,
+            content='shoe', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS shoe_fts_ai AFTER INSERT ON shoe BEGIN
+            INSERT INTO shoe_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS shoe_fts_ad AFTER DELETE ON shoe BEGIN
+            INSERT INTO shoe_fts(shoe_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END""")
+        op.execute("""CREATE TRIGGER IF NOT EXISTS shoe_fts_au AFTER UPDATE OF name, description ON shoe BEGIN
+            INSERT INTO shoe_fts(shoe_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO shoe_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END""")
+        # Index the rows that already exist
+        op.execute("INSERT INTO shoe_fts(shoe_fts) VALUES ('rebuild')")
+
+    elif dialect == 'postgresql':
+        op.execute(
+            "CREATE INDEX IF NOT EXISTS ix_shoe_search_vector ON shoe "
+            "USING gin (to_tsvector('english', name || ' ' || description))"
+        )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        op.execute('DROP TRIGGER IF EXISTS shoe_fts_ai')
+        op.execute('DROP TRIGGER IF EXISTS shoe_fts_ad')
+        op.execute('DROP TRIGGER IF EXISTS shoe_fts_au')
+        op.execute('DROP TABLE IF EXISTS shoe_fts')
+
+    elif dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_shoe_search_vector')
@@ -0,0 +1,125 @@
+"""Add shoe_size inventory table
+
+Revision ID: b69cc50a106c
+Revises: 86c093ec5cf9
+Create Date: 2026-10-18 10:03:27.881950
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b69cc50a106c'
+down_revision = '86c093ec5cf9'
+branch_labels = None
+depends_on = None
+
+
+shoe_table = sa.table(
+    'shoe',
+    sa.column('id', sa.Integer),
+    sa.column('sizes', sa.String),
+    sa.column('stock', sa.Integer),
+)
+shoe_size_table = sa.table(
+    'shoe_size',
+    sa.column('shoe_id', sa.Integer),
+    sa.column('size', sa.String),
+    sa.column('stock', sa.Integer),
+)
+
+# Batch mode rebuilds the shoe table on SQLite, which drops its triggers
+SQLITE_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS shoe_fts_ai AFTER INSERT ON shoe BEGIN
+        INSERT INTO shoe_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shoe_fts_ad AFTER DELETE ON shoe BEGIN
+        INSERT INTO shoe_fts(shoe_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS shoe_fts_au AFTER UPDATE OF name, description ON shoe BEGIN
+        INSERT INTO shoe_fts(shoe_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO shoe_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+
+def recreate_fts_triggers():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_FTS_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    op.create_table('shoe_size',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('shoe_id', sa.Integer(), nullable=False),
+    sa.Column('size', sa.String(length=10), nullable=False),
+    sa.Column('stock', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['shoe_id'], ['shoe.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('shoe_id', 'size', name='uq_shoe_size_shoe_id_size')
+    )
+    with op.batch_alter_table('shoe_size', schema=None) as batch_op:
+        batch_op.create_index('ix_shoe_size_size_shoe_id', ['size', 'shoe_id'], unique=False)
+
+    # Backfill from the comma-separated sizes string, spreading each shoe's
+    # total stock evenly across its sizes (remainder goes to the first ones).
+    connection = op.get_bind()
+    rows = []
+    for shoe_id, sizes, stock in connection.execute(sa.select(shoe_table.c.id, shoe_table.c.sizes, shoe_table.c.stock)):
+        size_list = []
+        for size in (sizes or '').split(','):
+            size = size.strip()
+            if size and size not in size_list:
+                size_list.append(size)
+        if not size_list:
+            continue
+        base, remainder = divmod(stock or 0, len(size_list))
+        for i, size in enumerate(size_list):
+            rows.append({'shoe_id': shoe_id, 'size': size, 'stock': base + (1 if i < remainder else 0)})
+    if rows:
+        op.bulk_insert(shoe_size_table, rows)
+
+    with op.batch_alter_table('shoe', schema=None) as batch_op:
+        batch_op.drop_column('sizes')
+        batch_op.drop_column('stock')
+
+    recreate_fts_triggers()
+
+
+def downgrade():
+    with op.batch_alter_table('shoe', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sizes', sa.String(length=100), nullable=False, server_default=''))
+        batch_op.add_column(sa.Column('stock', sa.Integer(), nullable=False, server_default='0'))
+
+    connection = op.get_bind()
+    inventory = {}
+    for shoe_id, size, stock in connection.execute(
+        sa.select(shoe_size_table.c.shoe_id, shoe_size_table.c.size, shoe_size_table.c.stock)
+        .order_by(sa.text('id'))
+    ):
+        sizes, total = inventory.get(shoe_id, ([], 0))
+        sizes.append(size)
+        inventory[shoe_id] = (sizes, total + stock)
+    for shoe_id, (sizes, total) in inventory.items():
+        connection.execute(
+            shoe_table.update()
+            .where(shoe_table.c.id == shoe_id)
+            .values(sizes=','.join(sizes), stock=total)
+        )
+
+    with op.batch_alter_table('shoe', schema=None) as batch_op:
+        batch_op.alter_column('sizes', server_default=None)
+        batch_op.alter_column('stock', server_default=None)
+
+    with op.batch_alter_table('shoe_size', schema=None) as batch_op:
+        batch_op.drop_index('ix_shoe_size_size_shoe_id')
+
+    op.drop_table('shoe_size')
+
+    recreate_fts_triggers()
@@ -1,7 +1,12 @@
 import json
 from app import create_app
 from app.extensions import db
-from app.models import Shoe
+from app.models import Shoe, ShoeSize
+
+def split_stock(total, sizes):
+    """Spreads a total stock count evenly over sizes, giving any remainder to the first ones."""
+    base, remainder = divmod(total, len(sizes))
+    return [(size, base + (1 if i < remainder else 0)) for i, size in enumerate(sizes)]
 
 def populate_database():
     app = create_app()
@@ -17,9 +22,6 @@ def populate_database():
             shoes_data = data['shoes']
 
         for shoe_data in shoes_data:
-            # Convert sizes list to a comma-separated string
-            sizes_str = ",".join(map(str, shoe_data['sizes']))
-            
             shoe = Shoe(
                 id=shoe_data['id'],
                 name=shoe_data['name'],
@@ -27,11 +29,14 @@ def populate_database():
                 description=shoe_data['description'],
                 price=shoe_data['price'],
                 details=shoe_data['details'],
-                sizes=sizes_str,
                 image=shoe_data['image'],
-                rating=shoe_data['rating'],
-                stock=shoe_data['stock']
+                rating=shoe_data['rating']
             )
+            # Stock is tracked per size, so spread the shoe's total across its sizes
+            shoe.size_inventory = [
+                ShoeSize(size=str(size), stock=stock)
+                for size, stock in split_stock(shoe_data['stock'], shoe_data['sizes'])
+            ]
             db.session.add(shoe)
         
         print("Committing shoe data to the database...")
@@ -1,7 +1,7 @@
 import axios from 'axios';
 
 // The base URL of our Flask backend
-const API_URL = 'https://shoe-store-api-lpwu.onrender.com/api';
+export const API_URL = 'https://shoe-store-api-lpwu.onrender.com/api';
 
 const apiService = axios.create({
   baseURL: API_URL,
@@ -22,4 +22,39 @@ apiService.interceptors.request.use(
   }
 );
 
+// Follows an order's status over Server-Sent Events. fetch is used instead of
+// EventSource because EventSource can't send the Authorization header.
+// Calls onStatus with each status; resolves when the server closes the stream.
+// When the server has no stream to spare (503), waits as long as it asks and
+// reports the status from a plain fetch of the order instead.
+export const streamOrderStatus = async (orderId, onStatus, signal) => {
+  const response = await fetch(`${API_URL}/orders/${orderId}/events`, {
+    headers: { Authorization: `Bearer ${localStorage.getItem('token')}` },
+    signal,
+  });
+  if (response.status === 503) {
+    const { retry_after: retryAfter = 5 } = await response.json();
+    await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+    const order = await apiService.get(`/orders/${orderId}`, { signal });
+    onStatus(order.data.status);
+    return;
+  }
+  if (!response.ok) throw new Error(`Order status stream failed (${response.status})`);
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+    const events = buffer.split('\n\n');
+    buffer = events.pop();
+    for (const event of events) {
+      const data = event.split('\n').find((line) => line.startsWith('data: '));
+      if (data) onStatus(JSON.parse(data.slice(6)).status);
+    }
+  }
+};
+
 export default apiService;
\ No newline at end of file
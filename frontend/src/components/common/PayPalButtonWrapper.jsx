@@ -34,7 +34,8 @@ const PayPalButtonWrapper = ({ currency, showSpinner }) => {
     try {
       // Ask our backend to "capture" the payment now that the user has approved it
       const response = await apiService.post(`/orders/paypal/${data.orderID}/capture`);
-      toast.success("Payment successful!");
+      // 202: PayPal's answer was lost; the order page follows it until it's confirmed
+      toast.success(response.status === 202 ? "Payment received, confirming..." : "Payment successful!");
       // Redirect to the order status page with our internal order ID
       navigate(`/order-status/${response.data.order_id}`);
     } catch (error) {
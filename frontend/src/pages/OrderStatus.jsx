@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import apiService from '../api/apiService';
+import apiService, { streamOrderStatus } from '../api/apiService';
 import { FiCheckCircle, FiXCircle, FiLoader } from 'react-icons/fi';
 
 const OrderStatus = () => {
@@ -9,25 +9,34 @@ const OrderStatus = () => {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    const checkStatus = async () => {
+    const controller = new AbortController();
+    let status = 'pending';
+
+    const follow = async () => {
       try {
         const response = await apiService.get(`/orders/${orderId}`);
         setOrder(response.data);
-        if (response.data.status === 'pending') {
-          // If status is still pending, check again after 5 seconds
-          setTimeout(checkStatus, 5000);
-        } else {
-          setLoading(false);
+        status = response.data.status;
+        // While the payment is pending, wait for the server to push the
+        // change instead of polling; reconnect when a stream times out
+        while (status === 'pending' && !controller.signal.aborted) {
+          await streamOrderStatus(orderId, (next) => { status = next; }, controller.signal);
+        }
+        if (controller.signal.aborted) return;
+        if (status !== response.data.status) {
+          const final = await apiService.get(`/orders/${orderId}`);
+          setOrder(final.data);
         }
+        setLoading(false);
       } catch (error) {
-        console.error('Failed to fetch order status', error);
+        if (controller.signal.aborted) return;
+        console.error('Failed to follow order status', error);
         setLoading(false);
       }
     };
-    
-    // Initial check
-    checkStatus();
 
+    follow();
+    return () => controller.abort();
   }, [orderId]);
 
   const renderStatus = () => {